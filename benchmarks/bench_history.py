@@ -0,0 +1,43 @@
+from dataclasses import replace
+import pytest
+from firewall_ui.policy.history import RuleHistory
+from benchmarks.bench_pipeline import run
+
+# Versions recorded before the measured operations
+VERSIONS = 50
+
+
+@pytest.fixture
+def history(rules):
+    """VERSIONS versions of rules, each changing one rule of the one before"""
+    history = RuleHistory()
+    current = list(rules)
+    history.record(current)
+    step = max(1, len(rules) // VERSIONS)
+    for number in range(1, VERSIONS):
+        position = number * step % len(current)
+        current[position] = replace(current[position], description=f"version {number}")
+        history.record(current)
+    return history, current
+
+
+@pytest.mark.benchmark(group="history record")
+def bench_record(benchmark, history, count):
+    history, current = history
+    run(benchmark, lambda: history.record(current), count)
+
+
+@pytest.mark.benchmark(group="history diff")
+@pytest.mark.parametrize("versions", ["adjacent", "first_to_last"])
+def bench_diff(benchmark, history, count, versions):
+    history, _ = history
+    latest = history.latest.number
+    old = latest - 1 if versions == "adjacent" else 1
+    delta = run(benchmark, lambda: history.diff(old, latest), count)
+    assert delta.size == latest - old
+
+
+@pytest.mark.benchmark(group="history rollback")
+def bench_rules(benchmark, history, count):
+    history, _ = history
+    assert len(run(benchmark, lambda: history.rules(1), count)) == count
@@ -0,0 +1,114 @@
+import json
+from dataclasses import replace
+import pytest
+from PyQt6.QtWidgets import QApplication
+from firewall_ui.models.validation import validate_many
+from firewall_ui.policy.diff import rule_key
+from firewall_ui.ui.widgets.rule_table import RuleTableWidget
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.kernel_comm import KernelCommunicator
+from firewall_ui.utils.wire_format import encode_rules
+
+app = QApplication.instance() or QApplication([])
+
+
+def run(benchmark, function, count, setup=None):
+    # Fewer rounds for bigger rulesets so every benchmark takes seconds, not minutes
+    rounds = max(1, min(20, 200_000 // count))
+    return benchmark.pedantic(function, setup=setup, rounds=rounds, iterations=1)
+
+
+@pytest.mark.benchmark(group="validate")
+def bench_rule_validate(benchmark, rules, count):
+    def validate_each():
+        for rule in rules:
+            rule.validate()
+    run(benchmark, validate_each, count)
+
+
+@pytest.mark.benchmark(group="validate")
+def bench_validate_many(benchmark, rules, count):
+    report = run(benchmark, lambda: validate_many(rules), count)
+    assert report.ok
+
+
+@pytest.mark.benchmark(group="to_dict")
+def bench_to_dict(benchmark, rules, count):
+    run(benchmark, lambda: [rule.to_dict() for rule in rules], count)
+
+
+@pytest.fixture
+def table(rules):
+    table = RuleTableWidget()
+    table.load_rules([rule.to_dict() for rule in rules])
+    yield table
+    table.deleteLater()
+
+
+@pytest.mark.benchmark(group="table")
+def bench_load_rules(benchmark, table, rules, count):
+    config = [rule.to_dict() for rule in rules]
+    run(benchmark, lambda: table.load_rules(config), count)
+
+
+@pytest.mark.benchmark(group="table")
+def bench_get_all_rules(benchmark, table, count):
+    run(benchmark, table.get_all_rules, count)
+
+
+@pytest.mark.benchmark(group="encode")
+def bench_json_encode(benchmark, rules, count):
+    # What send_config does for modules without binary rule support
+    run(benchmark, lambda: json.dumps([rule.to_dict() for rule in rules]).encode('utf-8'), count)
+
+
+@pytest.mark.benchmark(group="encode")
+def bench_binary_encode(benchmark, rules, count):
+    run(benchmark, lambda: encode_rules(rules), count)
+
+
+@pytest.fixture(params=["binary", "json"])
+def kernel(request):
+    """A fake kernel module and a communicator connected to it"""
+    kernel = FakeKernel()
+    communicator = KernelCommunicator(request.param, socket_factory=kernel.connect)
+    yield kernel, communicator
+    communicator.close()
+    kernel.close()
+
+
+@pytest.mark.benchmark(group="apply")
+def bench_apply(benchmark, kernel, rules, count):
+    """Full push of every rule, with validation of the applied config"""
+    _, communicator = kernel
+
+    def forget_applied_rules():
+        communicator.applied_keys = None
+    result = run(benchmark, lambda: communicator.send_config(rules), count,
+                 setup=forget_applied_rules)
+    assert result == (True, None, None)
+
+
+@pytest.mark.benchmark(group="apply")
+def bench_apply_delta(benchmark, kernel, rules, count):
+    """Push after editing 1% of the rules of an applied config"""
+    fake, communicator = kernel
+    assert communicator.send_config(rules)[0]
+    applied, applied_keys = fake.stored, communicator.applied_keys
+    edited = list(rules)
+    for position in range(0, count, 100):
+        edited[position] = replace(rules[position], destination_port_end=65535)
+
+    def restore_applied_rules():
+        fake.stored, communicator.applied_keys = applied, applied_keys
+    result = run(benchmark, lambda: communicator.send_config(edited), count,
+                 setup=restore_applied_rules)
+    assert result == (True, None, None)
+
+
+@pytest.mark.benchmark(group="get")
+def bench_get_config(benchmark, kernel, rules, count):
+    _, communicator = kernel
+    assert communicator.send_config(rules)[0]
+    config, error = run(benchmark, communicator.get_current_config, count)
+    assert error is None and len(config) == count
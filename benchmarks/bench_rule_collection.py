@@ -0,0 +1,60 @@
+"""
+Measure the cost of collecting rules from RuleTableWidget on "Apply Rules".
+
+Run from the repository root:
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_rule_collection
+"""
+import sys
+import time
+from PyQt6.QtWidgets import QApplication
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.ui.widgets.rule_table import RuleTableWidget
+
+SIZES = [10_000, 100_000]
+REPEATS = 5
+
+
+def make_config(count):
+    return [
+        Rule(
+            id=i + 1,
+            source_address_start=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            source_address_end=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            source_port_start=None,
+            source_port_end=None,
+            destination_address_start=f"2001:db8::{i:x}",
+            destination_address_end=f"2001:db8::{i:x}",
+            destination_port_start=1024 + i % 1000,
+            destination_port_end=2048 + i % 1000,
+            protocol=Protocol.TCP,
+            action=Action.ACCEPT if i % 2 else Action.DROP,
+            direction=Direction.INBOUND
+        ).to_dict()
+        for i in range(count)
+    ]
+
+
+def best_of(func, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    app = QApplication.instance() or QApplication(sys.argv)
+    table = RuleTableWidget()
+    print(f"{'rules':>8} {'load_rules':>12} {'get_all_rules':>14}")
+    for count in SIZES:
+        config = make_config(count)
+        load = best_of(lambda: table.load_rules(config), repeats=1)
+        collect = best_of(table.get_all_rules)
+        print(f"{count:>8} {load * 1000:>10.1f}ms {collect * 1000:>12.2f}ms")
+    return app
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import io
+from dataclasses import replace
+import pytest
+from firewall_ui.models.rule import Protocol
+from firewall_ui.utils.rule_files import FORMATS, iter_rules, validated_batches, write_rules
+from benchmarks.bench_pipeline import run
+
+
+@pytest.fixture
+def exportable(rules):
+    """rules without ports on ANY-protocol rules, which iptables cannot express"""
+    return [replace(rule, source_port_start=None, source_port_end=None,
+                    destination_port_start=None, destination_port_end=None)
+            if rule.protocol == Protocol.ANY else rule for rule in rules]
+
+
+@pytest.mark.benchmark(group="rule file export")
+@pytest.mark.parametrize("file_format", FORMATS)
+def bench_export(benchmark, exportable, file_format, count):
+    run(benchmark, lambda: write_rules(io.StringIO(), exportable, file_format), count)
+
+
+@pytest.mark.benchmark(group="rule file import")
+@pytest.mark.parametrize("file_format", FORMATS)
+def bench_import(benchmark, exportable, file_format, count):
+    text = io.StringIO()
+    write_rules(text, exportable, file_format)
+    text = text.getvalue()
+
+    def read():
+        return sum(len(batch) for batch in validated_batches(
+            iter_rules(io.StringIO(text), file_format)))
+    assert run(benchmark, read, count) == count
@@ -0,0 +1,221 @@
+"""
+GUI cold start, measured in a fresh interpreter against a fake kernel
+module holding count synthetic rules: time to the main window's first
+paint, to the first rules in the table and until every rule is in it and
+editable, fetched from the kernel module or shown from a configuration
+snapshot it confirms.
+Run from the repository root, with the rest of the suite:
+
+    python -m pytest benchmarks -k startup
+
+or on its own, to compare with benchmarks/startup_baseline.json and see
+the slowest imports (python -X importtime):
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --record    # update the baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+RUNS = 10
+DEFAULT_COUNT = 10000
+
+# What main.py imports before the event loop runs
+GUI_IMPORTS = "import PyQt6.QtWidgets, firewall_ui.ui.main_window, firewall_ui.utils.logger"
+
+
+def _environment():
+    return dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+
+
+def serve_fake_kernel(count):
+    """Start a fake kernel module holding count rules; returns (kernel, socket path)"""
+    from benchmarks.synthetic import make_rules
+    from firewall_ui.utils.fake_kernel import FakeKernel
+    from firewall_ui.utils.wire_format import encode_rules
+    kernel = FakeKernel()
+    kernel.stored = encode_rules(make_rules(count))
+    path = os.path.join(tempfile.mkdtemp(), "kernel.sock")
+    kernel.serve(path)
+    return kernel, path
+
+
+def make_snapshot(count):
+    """Write a snapshot of the rules served by serve_fake_kernel(count); returns its path"""
+    from benchmarks.synthetic import make_rules
+    from firewall_ui.utils.rule_digest import MerkleTree
+    from firewall_ui.utils.snapshot_cache import SnapshotCache
+    from firewall_ui.utils.wire_format import encode_rules
+    rules = make_rules(count)
+    cache = SnapshotCache(os.path.join(tempfile.mkdtemp(), "ruleset.snapshot"))
+    cache.save(encode_rules(rules), count, MerkleTree.from_rules(rules).root)
+    return cache.path
+
+
+def time_startup(socket_path, snapshot_path=None):
+    """
+    Start the GUI in a fresh interpreter and return the seconds until its
+    first paint, until the first rules are in its table and until they all
+    are and can be edited. The snapshot cache is off unless snapshot_path
+    is given.
+    """
+    start = time.time()
+    snapshot = ["--snapshot", snapshot_path] if snapshot_path else []
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup",
+                             "--child", socket_path, *snapshot],
+                            cwd=ROOT, env=_environment(), check=True,
+                            capture_output=True, text=True)
+    return tuple(float(time) - start for time in result.stdout.split()[-3:])
+
+
+def time_imports():
+    """Seconds for a fresh interpreter to import the GUI modules"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", GUI_IMPORTS], cwd=ROOT, env=_environment(),
+                   check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(count=15):
+    """Return the count slowest (own microseconds, module) of python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", GUI_IMPORTS],
+                            cwd=ROOT, env=_environment(), check=True,
+                            capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, module = line.split("|")
+        imports.append((int(own.split(":")[1]), module.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def _child(socket_path, snapshot_path):
+    """Start the GUI like main.py does and print when it painted, showed rules and finished loading"""
+    from PyQt6.QtCore import QObject, QEvent
+    from PyQt6.QtWidgets import QApplication
+    from firewall_ui.utils.logger import FirewallLogger
+    FirewallLogger().get_logger().info("Starting Firewall UI application")
+    app = QApplication(sys.argv)
+    from firewall_ui.ui import main_window
+    main_window.RULESET_SNAPSHOT_FILE = snapshot_path
+    # Imported by MainWindow later; patched here to talk to the fake kernel
+    import firewall_ui.utils.kernel_comm as kernel_comm
+    kernel_comm.KERNEL_SOCKET_PATH = socket_path
+    window = main_window.MainWindow()
+    times = {}
+
+    class PaintProbe(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint:
+                times.setdefault("painted", time.time())
+            return False
+
+    def set_rules_loading(loading):
+        set_loading(loading)
+        if not loading:
+            times["loaded"] = time.time()
+            app.quit()
+    set_loading, window.set_rules_loading = window.set_rules_loading, set_rules_loading
+    window.rule_table.loading_progress.connect(lambda rows: times.setdefault("shown", time.time()))
+    probe = PaintProbe()
+    window.installEventFilter(probe)
+    window.show()
+    app.exec()
+    window.close()
+    print(times["painted"], times["shown"], times["loaded"])
+
+
+@pytest.fixture
+def kernel_socket(count):
+    kernel, path = serve_fake_kernel(count)
+    yield path
+    kernel.close()
+
+
+@pytest.mark.benchmark(group="startup: first paint")
+def bench_time_to_first_paint(benchmark, kernel_socket, count):
+    benchmark.pedantic(lambda: time_startup(kernel_socket)[0], rounds=RUNS, iterations=1)
+
+
+@pytest.mark.benchmark(group="startup: rules loaded")
+def bench_time_to_rules_loaded(benchmark, kernel_socket, count):
+    benchmark.pedantic(lambda: time_startup(kernel_socket)[2], rounds=RUNS, iterations=1)
+
+
+@pytest.mark.benchmark(group="startup: rules shown")
+@pytest.mark.parametrize("snapshot", [False, True], ids=["kernel", "snapshot"])
+def bench_time_to_rules_shown(benchmark, kernel_socket, count, snapshot):
+    snapshot_path = make_snapshot(count) if snapshot else None
+    benchmark.pedantic(lambda: time_startup(kernel_socket, snapshot_path)[1],
+                       rounds=RUNS, iterations=1)
+
+
+@pytest.mark.benchmark(group="startup: rules loaded")
+def bench_time_to_rules_loaded_from_snapshot(benchmark, kernel_socket, count):
+    snapshot_path = make_snapshot(count)
+    benchmark.pedantic(lambda: time_startup(kernel_socket, snapshot_path)[2],
+                       rounds=RUNS, iterations=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the GUI cold start")
+    parser.add_argument("--child", metavar="SOCKET", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", metavar="PATH", help=argparse.SUPPRESS)
+    parser.add_argument("--rules", type=int, default=DEFAULT_COUNT,
+                        help=f"rules held by the fake kernel (default {DEFAULT_COUNT})")
+    parser.add_argument("--record", action="store_true",
+                        help=f"save the medians to {os.path.relpath(BASELINE, ROOT)}")
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child, args.snapshot)
+        return
+
+    kernel, path = serve_fake_kernel(args.rules)
+    snapshot_path = make_snapshot(args.rules)
+    try:
+        startups = [time_startup(path) for _ in range(RUNS)]
+        snapshot_startups = [time_startup(path, snapshot_path) for _ in range(RUNS)]
+    finally:
+        kernel.close()
+    current = {
+        "gui_imports": statistics.median(time_imports() for _ in range(RUNS)),
+        "first_paint": statistics.median(painted for painted, _, _ in startups),
+        "rules_shown": statistics.median(shown for _, shown, _ in startups),
+        "rules_shown_snapshot": statistics.median(shown for _, shown, _ in snapshot_startups),
+        f"rules_loaded_{args.rules}": statistics.median(loaded for _, _, loaded in startups),
+        f"rules_loaded_{args.rules}_snapshot":
+            statistics.median(loaded for _, _, loaded in snapshot_startups),
+    }
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+    if args.record:
+        with open(BASELINE, "w") as baseline_file:
+            json.dump({**baseline, **{name: round(seconds, 4)
+                                      for name, seconds in current.items()}},
+                      baseline_file, indent=2)
+            baseline_file.write("\n")
+    for name, seconds in current.items():
+        line = f"{name:29} {seconds * 1000:7.1f} ms"
+        if name in baseline:
+            line += f"   baseline {baseline[name] * 1000:7.1f} ms"
+        print(line)
+    print("\nSlowest imports (excluding their own imports):")
+    for microseconds, module in slowest_imports():
+        print(f"  {microseconds / 1000:7.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+pytest-benchmark suite of the rule pipeline. Run from the repository root:
+
+    python -m pytest benchmarks
+
+Every run is saved under benchmarks/.results; compare against the last
+saved run, failing on a 10% slowdown of the median, with:
+
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:10%
+
+Rule counts default to 1k, 10k and 100k; add 1M with --rules 1000,10000,100000,1000000.
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+from benchmarks.synthetic import make_rules
+
+DEFAULT_COUNTS = "1000,10000,100000"
+_rules = {}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--rules", default=DEFAULT_COUNTS,
+                     help=f"comma separated rule counts to benchmark (default {DEFAULT_COUNTS})")
+
+
+def pytest_generate_tests(metafunc):
+    if "count" in metafunc.fixturenames:
+        counts = [int(count) for count in metafunc.config.getoption("rules").split(",")]
+        metafunc.parametrize("count", counts, ids=[f"{count}_rules" for count in counts])
+
+
+@pytest.fixture
+def rules(count):
+    """The synthetic ruleset of count rules, generated once per session"""
+    if count not in _rules:
+        _rules[count] = make_rules(count)
+    return _rules[count]
@@ -0,0 +1,47 @@
+import random
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+
+PROTOCOLS = list(Protocol)
+ACTIONS = list(Action)
+DIRECTIONS = list(Direction)
+COMMON_PORTS = (22, 53, 80, 443, 8080)
+
+
+def make_rules(count, seed=0):
+    """
+    Return count valid, reproducible rules resembling a real ruleset: /24
+    source ranges with some catch-alls and IPv6 networks, single hosts or
+    port ranges as destinations and a description on every tenth rule.
+    """
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        net = rng.randrange(1 << 16)
+        if rng.random() < 0.1:
+            source_start, source_end = f"2001:db8:{net:x}::", f"2001:db8:{net:x}::ffff"
+        elif rng.random() < 0.05:
+            source_start, source_end = "0.0.0.0", "255.255.255.255"
+        else:
+            source_start, source_end = f"10.{net >> 8}.{net & 255}.0", f"10.{net >> 8}.{net & 255}.255"
+        host = rng.randrange(1 << 16)
+        destination = f"172.{16 | host >> 8 & 15}.{host & 255}.{rng.randrange(1, 255)}"
+        port = rng.choice(COMMON_PORTS) if rng.random() < 0.7 else rng.randrange(1024, 65000)
+        port_end = port if rng.random() < 0.8 else port + rng.randrange(1, 500)
+        source_ports = (1024, 65535) if rng.random() < 0.1 else (None, None)
+        rules.append(Rule(
+            id=i + 1,
+            source_address_start=source_start,
+            source_address_end=source_end,
+            source_port_start=source_ports[0],
+            source_port_end=source_ports[1],
+            destination_address_start=destination,
+            destination_address_end=destination,
+            destination_port_start=port,
+            destination_port_end=port_end,
+            protocol=rng.choice(PROTOCOLS),
+            action=rng.choice(ACTIONS),
+            direction=rng.choice(DIRECTIONS),
+            enabled=rng.random() < 0.95,
+            description=f"rule {i + 1}" if i % 10 == 0 else ""
+        ))
+    return rules
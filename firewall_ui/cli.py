@@ -0,0 +1,288 @@
+"""
+Headless command line interface.
+
+Drives KernelCommunicator directly, without Qt, for scripted use:
+
+    firewall-ui apply rules.json      push rules from a JSON file
+    firewall-ui get                   print the kernel rules as JSON
+    firewall-ui diff rules.json       compare a file with the kernel rules
+    firewall-ui validate rules.json   check a file without contacting the kernel
+
+Rule files are JSON lists of rules in the format of Rule.to_dict(), CSV
+or iptables-save output (see utils/rule_files.py), told apart by their
+suffix or content, or named with --format. get prints JSON unless told
+otherwise. With --json every command prints a single JSON object
+describing the outcome. The exit status is one of the EXIT_* codes below.
+"""
+import argparse
+import json
+import os
+import sys
+from firewall_ui.config.settings import KERNEL_WIRE_FORMAT
+
+# Exit statuses
+EXIT_OK = 0
+EXIT_DIFFERENT = 1        # diff: the file and the kernel rules differ
+EXIT_USAGE = 2            # bad arguments (argparse)
+EXIT_INVALID = 3          # the rule file is unreadable or has invalid rules
+EXIT_UNAVAILABLE = 4      # the kernel module cannot be reached
+EXIT_REJECTED = 5         # the kernel module rejected the rules
+EXIT_NOT_VALIDATED = 6    # rules applied, but the kernel reports different ones
+EXIT_TIMEOUT = 7          # the kernel module did not answer in time
+EXIT_FAILED = 8           # any other communication failure
+
+_ERROR_STATUS = {
+    "Socket not initialized": EXIT_UNAVAILABLE,
+    "Communication timeout": EXIT_TIMEOUT,
+    "Kernel rejected configuration": EXIT_REJECTED,
+}
+
+
+class CommandError(Exception):
+    """Ends a command with an error message and exit status"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def read_rules(args):
+    """Return the RuleReader of args.file ("-" for stdin), in args.format"""
+    from firewall_ui.utils.rule_files import RuleReader, RuleFileError
+    try:
+        return RuleReader(args.file, args.format)
+    except RuleFileError as e:
+        raise CommandError(str(e), EXIT_INVALID)
+
+
+def load_rules(args):
+    """Read and validate every rule of args.file"""
+    from firewall_ui.utils.rule_files import RuleFileError
+    with read_rules(args) as reader:
+        try:
+            return reader.read_all()
+        except RuleFileError as e:
+            raise CommandError(f"{args.file}: {e}", EXIT_INVALID)
+
+
+def communication_error(error):
+    return CommandError(error, _ERROR_STATUS.get(error, EXIT_FAILED))
+
+
+def unix_socket_factory(path):
+    import socket
+
+    def connect():
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return connect
+
+
+def connect(args):
+    from firewall_ui.utils.kernel_comm import KernelCommunicator
+    factory = unix_socket_factory(args.socket) if args.socket else None
+    communicator = KernelCommunicator(args.wire_format, socket_factory=factory)
+    if not communicator.session.connected:
+        communicator.close()
+        raise CommandError("Kernel module unavailable", EXIT_UNAVAILABLE)
+    return communicator
+
+
+def fetch_rules(communicator):
+    from firewall_ui.models.rule import Rule
+    config, error = communicator.get_current_config()
+    if error:
+        raise communication_error(error)
+    return [Rule.from_dict(rule) for rule in config]
+
+
+def command_apply(args):
+    rules = load_rules(args)
+    result = {"rules": len(rules)}
+    if args.optimize:
+        from firewall_ui.policy.optimizer import optimize
+        optimized = optimize(rules)
+        result["optimization"] = optimized.summary()
+        rules = optimized.rules
+    communicator = connect(args)
+    try:
+        success, error, validation_error = communicator.send_config(rules)
+    finally:
+        communicator.close()
+    if not success:
+        raise communication_error(error)
+    result["applied"] = len(rules)
+    if validation_error:
+        result["validation_error"] = validation_error
+        return EXIT_NOT_VALIDATED, result, f"Applied, but validation failed: {validation_error}"
+    return EXIT_OK, result, f"Applied {len(rules)} rules"
+
+
+def command_get(args):
+    from firewall_ui.utils.rule_files import detect_format
+    communicator = connect(args)
+    try:
+        config, error = communicator.get_current_config()
+    finally:
+        communicator.close()
+    if error:
+        raise communication_error(error)
+    if args.output:
+        file_format = args.format or detect_format(args.output) or "json"
+        write_rule_file(args.output, config, file_format)
+        return EXIT_OK, {"rules": len(config), "output": args.output}, \
+            f"Wrote {len(config)} rules to {args.output}"
+    if args.json or not args.format or args.format == "json":
+        return EXIT_OK, {"rules": config}, json.dumps(config, indent=2)
+    return EXIT_OK, {"rules": len(config)}, format_rules(config, args.format)
+
+
+def format_rules(config, file_format):
+    from io import StringIO
+    from firewall_ui.models.rule import Rule
+    from firewall_ui.utils.rule_files import write_rules, RuleFileError
+    text = StringIO()
+    try:
+        write_rules(text, (Rule.from_dict(rule) for rule in config), file_format)
+    except RuleFileError as e:
+        raise CommandError(str(e), EXIT_INVALID)
+    return text.getvalue().rstrip("\n")
+
+
+def write_rule_file(path, config, file_format):
+    """Write config to path through a temporary file, so errors leave no partial file"""
+    from firewall_ui.models.rule import Rule
+    from firewall_ui.utils.rule_files import write_rules, RuleFileError
+    temporary = f"{path}.tmp"
+    try:
+        with open(temporary, "w", encoding="utf-8", newline="") as rule_file:
+            write_rules(rule_file, (Rule.from_dict(rule) for rule in config), file_format)
+        os.replace(temporary, path)
+    except (OSError, RuleFileError) as e:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise CommandError(f"Cannot write rules to {path}: {e}",
+                           EXIT_INVALID if isinstance(e, RuleFileError) else EXIT_FAILED)
+
+
+def command_diff(args):
+    from firewall_ui.policy.diff import MAX_DIFF_WINDOW, diff_rules, rule_key
+    rules = load_rules(args)
+    communicator = connect(args)
+    try:
+        applied = fetch_rules(communicator)
+    finally:
+        communicator.close()
+    window = MAX_DIFF_WINDOW if args.window is None else args.window
+    delta = diff_rules([rule_key(rule) for rule in applied], [rule_key(rule) for rule in rules],
+                       max_window=window)
+    result = {"kernel_rules": len(applied), "file_rules": len(rules)}
+    if delta is None:
+        # Diffing is quadratic in the changed span, so a large one is only reported
+        result["window_exceeded"] = True
+        return EXIT_DIFFERENT, result, \
+            f"More than {window} rules in a row differ; raise --window to list the changes"
+    result.update(inserted=len(delta.inserts), deleted=len(delta.deletes),
+                  moved=len(delta.moves), updated=len(delta.updates))
+    if delta.empty:
+        return EXIT_OK, result, "No differences"
+    return EXIT_DIFFERENT, result, delta.summary()
+
+
+def command_validate(args):
+    from firewall_ui.utils.rule_files import RuleFileError
+    # Batch by batch, so a file of any size is checked in bounded memory
+    with read_rules(args) as reader:
+        try:
+            for _ in reader:
+                pass
+        except RuleFileError as e:
+            raise CommandError(f"{args.file}: {e}", EXIT_INVALID)
+    return EXIT_OK, {"rules": reader.count, "format": reader.format}, \
+        f"{reader.count} rules are valid"
+
+
+def count(text):
+    """argparse type of a non-negative integer"""
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative: {text}")
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="firewall-ui",
+        description="Manage the firewall kernel module rules without the GUI")
+    parser.add_argument("--json", action="store_true",
+                        help="print the outcome as a single JSON object")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="AF_UNIX socket of a user-space kernel stand-in (see fake_kernel)")
+    parser.add_argument("--wire-format", choices=["auto", "binary", "json"],
+                        default=KERNEL_WIRE_FORMAT,
+                        help="rule encoding used with the kernel module")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log progress to stderr")
+    parser.add_argument("--format", choices=["json", "csv", "iptables"],
+                        help="rule file format (default: from the file suffix or content)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    apply_parser = commands.add_parser("apply", help="push the rules in FILE to the kernel")
+    apply_parser.add_argument("file", metavar="FILE", help='rule file, or "-" for stdin')
+    apply_parser.add_argument("--optimize", action="store_true",
+                              help="merge ranges and drop never-matching rules first")
+    apply_parser.set_defaults(handler=command_apply)
+
+    get_parser = commands.add_parser("get", help="print the kernel rules as JSON")
+    get_parser.add_argument("-o", "--output", metavar="FILE",
+                            help="write them to FILE instead, in the format of its suffix")
+    get_parser.set_defaults(handler=command_get)
+
+    diff_parser = commands.add_parser("diff", help="compare FILE with the kernel rules")
+    diff_parser.add_argument("file", metavar="FILE", help='rule file, or "-" for stdin')
+    diff_parser.add_argument("--window", metavar="N", type=count,
+                             help="longest run of changed rules to compare in detail "
+                                  "(default: the limit kernel deltas use)")
+    diff_parser.set_defaults(handler=command_diff)
+
+    validate_parser = commands.add_parser("validate", help="check FILE without the kernel")
+    validate_parser.add_argument("file", metavar="FILE", help='rule file, or "-" for stdin')
+    validate_parser.set_defaults(handler=command_validate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command != "validate":
+        from firewall_ui.utils.logger import FirewallLogger
+        # Log files are written as usual, but errors are reported below, once
+        FirewallLogger().console_handler.setLevel("INFO" if args.verbose else "CRITICAL")
+
+    try:
+        status, result, message = args.handler(args)
+    except CommandError as e:
+        status, result, message = e.status, {"error": str(e)}, str(e)
+    except KeyboardInterrupt:
+        return 130
+
+    try:
+        if args.json:
+            print(json.dumps({"status": status, **result}))
+        elif status in (EXIT_OK, EXIT_DIFFERENT):
+            print(message)
+        else:
+            print(f"firewall-ui: {message}", file=sys.stderr)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Output piped into head and the like; the outcome still counts
+        sys.stdout = None
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,39 @@
 # Logging
 LOG_FILE = "logs/firewall.log"
 LOG_LEVEL = "DEBUG"
+# Compact binary log of timed kernel operations, queried with
+# python -m firewall_ui.utils.event_log; None disables it
+EVENT_LOG_FILE = "logs/events.bin"
+# Kernel communication metrics, rewritten every few seconds for a local
+# scraper: Prometheus text format, or JSON if the name ends in .json.
+# None disables the file; the Metrics tab works either way
+METRICS_FILE = "logs/metrics.prom"
 
 # Kernel communication
 NETLINK_GROUP = 17  # Example group number, adjust as needed
+# Rule encoding: "auto" negotiates binary with the kernel module and falls
+# back to JSON, "binary" or "json" force one of them
+KERNEL_WIRE_FORMAT = "auto"
+# AF_UNIX socket of a user-space stand-in for the kernel module (see
+# utils/fake_kernel.py) to use instead of netlink, or None
+KERNEL_SOCKET_PATH = None
+
+# Snapshot of the kernel configuration, shown at startup while the kernel
+# module confirms its digest instead of sending every rule; None disables it
+RULESET_SNAPSHOT_FILE = "cache/ruleset.snapshot"
+
+# Rulesets applied or loaded this session kept for the History tab
+HISTORY_LIMIT = 1000
+
+# Merge ranges and drop never-matching rules before sending them to the kernel
+OPTIMIZE_RULES_ON_APPLY = False
 
 # UI settings
 WINDOW_TITLE = "Firewall Rules Manager"
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
+# Most recent log records kept by the Logs tab
+LOG_VIEW_CAPACITY = 20000
 
 # Rule table columns
 RULE_TABLE_COLUMNS = [
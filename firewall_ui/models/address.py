@@ -0,0 +1,44 @@
+from functools import lru_cache
+import ipaddress
+# The C module alone: socket.py would bring selectors and enum into every
+# import of the rule models, such as the CLI's validate command
+from _socket import AF_INET, AF_INET6, inet_pton, inet_ntop
+
+# IPv4 addresses are keyed as IPv4-mapped IPv6 addresses (::ffff:a.b.c.d) so
+# that both families can be compared as integers in one 128-bit space
+IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_address(address):
+    """
+    Parse an IP address string into (version, integer value).
+
+    Raises ValueError for anything that is not an IPv4 or IPv6 address.
+    """
+    if isinstance(address, str):
+        try:
+            return 4, int.from_bytes(inet_pton(AF_INET, address), 'big')
+        except OSError:
+            pass
+    parsed = ipaddress.ip_address(address)
+    return parsed.version, int(parsed)
+
+
+def address_key(address):
+    """Return the 128-bit comparison key of an IP address string"""
+    version, value = parse_address(address)
+    return IPV4_MAPPED_PREFIX | value if version == 4 else value
+
+
+def format_address(version, value):
+    if version == 4:
+        return inet_ntop(AF_INET, value.to_bytes(4, 'big'))
+    return inet_ntop(AF_INET6, value.to_bytes(16, 'big'))
+
+
+def key_to_address(key):
+    """Format a 128-bit comparison key back into an address string"""
+    if key >> 32 == 0xFFFF:
+        return format_address(4, key & 0xFFFFFFFF)
+    return format_address(6, key)
@@ -1,7 +1,7 @@
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Optional
 from enum import Enum
-import ipaddress
+from firewall_ui.models.validation import validate_many
 
 class Protocol(Enum):
     TCP = "TCP"
@@ -16,6 +16,12 @@ class Direction(Enum):
     INBOUND = "INBOUND"
     OUTBOUND = "OUTBOUND"
 
+# Value -> member lookups; calling the Enum class is several times slower
+# and from_dict runs once per rule when loading a configuration
+_PROTOCOLS = {p.value: p for p in Protocol}
+_ACTIONS = {a.value: a for a in Action}
+_DIRECTIONS = {d.value: d for d in Direction}
+
 @dataclass
 class Rule:
     """
@@ -38,45 +44,42 @@ class Rule:
 
     def validate(self):
         """Validate rule fields including ranges"""
-        try:
-            # Validate IP address ranges
-            src_start = ipaddress.ip_address(self.source_address_start)
-            src_end = ipaddress.ip_address(self.source_address_end)
-            dst_start = ipaddress.ip_address(self.destination_address_start)
-            dst_end = ipaddress.ip_address(self.destination_address_end)
-            
-            # Ensure start IPs are less than or equal to end IPs
-            if src_start > src_end:
-                raise ValueError("Source IP start must be less than or equal to end")
-            if dst_start > dst_end:
-                raise ValueError("Destination IP start must be less than or equal to end")
-            
-            # Validate port ranges
-            if self.source_port_start is not None and self.source_port_end is not None:
-                if not (0 <= self.source_port_start <= 65535 and 0 <= self.source_port_end <= 65535):
-                    raise ValueError("Port numbers must be between 0 and 65535")
-                if self.source_port_start > self.source_port_end:
-                    raise ValueError("Source port start must be less than or equal to end")
-                    
-            if self.destination_port_start is not None and self.destination_port_end is not None:
-                if not (0 <= self.destination_port_start <= 65535 and 0 <= self.destination_port_end <= 65535):
-                    raise ValueError("Port numbers must be between 0 and 65535")
-                if self.destination_port_start > self.destination_port_end:
-                    raise ValueError("Destination port start must be less than or equal to end")
-                
-            return True
-        except Exception as e:
-            raise ValueError(f"Invalid rule: {str(e)}")
+        error = validate_many([self]).first_error()
+        if error:
+            raise ValueError(f"Invalid rule: {error[1]}")
+        return True
 
     def to_dict(self):
         """Convert rule to dictionary for JSON serialization"""
-        data = asdict(self)
+        # Every field is a scalar, so a shallow copy equals asdict(self)
+        # without its recursive deep copy
+        data = self.__dict__.copy()
         # Convert enums to strings
         data['protocol'] = self.protocol.value if isinstance(self.protocol, Enum) else self.protocol
         data['action'] = self.action.value if isinstance(self.action, Enum) else self.action
         data['direction'] = self.direction.value if isinstance(self.direction, Enum) else self.direction
         return data
 
+    @staticmethod
+    def from_dict(data):
+        """Create a Rule instance from a dictionary produced by to_dict"""
+        return Rule(
+            id=data.get('id', 0),
+            source_address_start=data.get('source_address_start'),
+            source_address_end=data.get('source_address_end'),
+            source_port_start=data.get('source_port_start'),
+            source_port_end=data.get('source_port_end'),
+            destination_address_start=data.get('destination_address_start'),
+            destination_address_end=data.get('destination_address_end'),
+            destination_port_start=data.get('destination_port_start'),
+            destination_port_end=data.get('destination_port_end'),
+            protocol=_PROTOCOLS.get(data['protocol']) or Protocol(data['protocol']),
+            action=_ACTIONS.get(data['action']) or Action(data['action']),
+            direction=_DIRECTIONS.get(data['direction']) or Direction(data['direction']),
+            enabled=data.get('enabled', True),
+            description=data.get('description', '')
+        )
+
     @staticmethod
     def from_single_values(
         id: int,
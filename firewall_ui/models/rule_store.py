@@ -0,0 +1,102 @@
+from dataclasses import replace
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+
+
+class RuleStore:
+    """
+    Ordered store of typed Rule objects.
+
+    Rule IDs mirror the 1-based position of the rule in the store. Inserts,
+    removals and moves only record the first row whose ID may be stale; IDs
+    are refreshed when rules are read back, so editing a large ruleset does
+    not renumber every rule on each change.
+
+    Rules are never changed in place: a rule whose ID or enum fields need
+    fixing is stored as a copy, so rules handed in or read back earlier
+    keep their values.
+    """
+
+    def __init__(self, rules=()):
+        self._rules = []
+        self._stale_from = 0
+        self.extend(rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self._rules)
+        return self._numbered(row)
+
+    def __iter__(self):
+        return iter(self.rules())
+
+    def rules(self):
+        """Return the stored rules in order with up-to-date IDs"""
+        self._sync_ids()
+        return list(self._rules)
+
+    def append(self, rule):
+        self._rules.append(self._check(rule))
+        row = len(self._rules) - 1
+        self._numbered(row)
+        return row
+
+    def extend(self, rules):
+        start = len(self._rules)
+        self._rules.extend(self._check(rule) for rule in rules)
+        self._mark_stale(start)
+
+    def insert(self, row, rule):
+        self._rules.insert(row, self._check(rule))
+        self._mark_stale(row)
+
+    def replace(self, row, rule):
+        self._rules[row] = self._check(rule)
+        self._numbered(row)
+
+    def remove(self, row):
+        rule = self._rules.pop(row)
+        self._mark_stale(row)
+        return rule
+
+    def swap(self, row1, row2):
+        rules = self._rules
+        rules[row1], rules[row2] = rules[row2], rules[row1]
+        self._numbered(row1)
+        self._numbered(row2)
+
+    def clear(self):
+        self._rules = []
+        self._stale_from = 0
+
+    def _mark_stale(self, row):
+        self._stale_from = min(self._stale_from, row)
+
+    def _numbered(self, row):
+        """Return the rule at row, stored as a copy first if its ID is stale"""
+        rule = self._rules[row]
+        if rule.id != row + 1:
+            # A shallow copy through __dict__; replace() runs __init__ and
+            # is several times slower when a large ruleset is renumbered
+            numbered = object.__new__(type(rule))
+            numbered.__dict__ = {**rule.__dict__, 'id': row + 1}
+            rule = self._rules[row] = numbered
+        return rule
+
+    def _sync_ids(self):
+        for row in range(self._stale_from, len(self._rules)):
+            self._numbered(row)
+        self._stale_from = len(self._rules)
+
+    @staticmethod
+    def _check(rule):
+        """Reject non-Rule objects; return a copy with enum fields given as strings coerced"""
+        if not isinstance(rule, Rule):
+            raise TypeError(f"Expected Rule, got {type(rule).__name__}")
+        if (isinstance(rule.protocol, Protocol) and isinstance(rule.action, Action)
+                and isinstance(rule.direction, Direction)):
+            return rule
+        return replace(rule, protocol=Protocol(rule.protocol), action=Action(rule.action),
+                       direction=Direction(rule.direction))
@@ -0,0 +1,374 @@
+from array import array
+import socket
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.models.address import (IPV4_MAPPED_PREFIX, parse_address,
+                                        address_key, format_address)
+from firewall_ui.models.validation import PORT_MIN, PORT_MAX
+
+# Enum <-> uint8 codes, in declaration order
+PROTOCOLS = list(Protocol)
+ACTIONS = list(Action)
+DIRECTIONS = list(Direction)
+PROTOCOL_CODES = {member: code for code, member in enumerate(PROTOCOLS)}
+ACTION_CODES = {member: code for code, member in enumerate(ACTIONS)}
+DIRECTION_CODES = {member: code for code, member in enumerate(DIRECTIONS)}
+PROTOCOL_ANY = PROTOCOL_CODES[Protocol.ANY]
+
+# The same codes keyed by enum value, for to_dict() input
+_PROTOCOL_VALUE_CODES = {member.value: code for member, code in PROTOCOL_CODES.items()}
+_ACTION_VALUE_CODES = {member.value: code for member, code in ACTION_CODES.items()}
+_DIRECTION_VALUE_CODES = {member.value: code for member, code in DIRECTION_CODES.items()}
+
+# Bits of the per-rule flags column
+FLAG_ENABLED = 0x01
+FLAG_NO_SOURCE_PORT_START = 0x02
+FLAG_NO_SOURCE_PORT_END = 0x04
+FLAG_NO_DESTINATION_PORT_START = 0x08
+FLAG_NO_DESTINATION_PORT_END = 0x10
+
+_UINT64_MASK = (1 << 64) - 1
+
+
+def _code(member_codes, value_codes, value, enum_class):
+    """Return the uint8 code of an enum member or of its string value"""
+    code = member_codes.get(value)
+    if code is None:
+        code = value_codes.get(value)
+    if code is None:
+        raise ValueError(f"{value!r} is not a valid {enum_class.__name__}")
+    return code
+
+
+class AddressColumn:
+    """
+    Column of IP addresses.
+
+    Values are kept in a uint32 array while every address is IPv4. The first
+    IPv6 address widens the column to two uint64 halves per address plus a
+    one-byte family marker, so IPv4-only rulesets pay 4 bytes per address.
+    """
+
+    def __init__(self):
+        self._v4 = array('I')
+        self._hi = None
+        self._lo = None
+        self._v6 = None
+
+    def __len__(self):
+        return len(self._v4) if self._lo is None else len(self._lo)
+
+    @property
+    def wide(self):
+        return self._lo is not None
+
+    def append(self, address):
+        self.append_parsed(*parse_address(address))
+
+    def append_parsed(self, version, value):
+        if self._lo is None:
+            if version == 4:
+                self._v4.append(value)
+                return
+            self._widen()
+        key = IPV4_MAPPED_PREFIX | value if version == 4 else value
+        self._hi.append(key >> 64)
+        self._lo.append(key & _UINT64_MASK)
+        self._v6.append(version == 6)
+
+    def key(self, row):
+        if self._lo is None:
+            return IPV4_MAPPED_PREFIX | self._v4[row]
+        return self._hi[row] << 64 | self._lo[row]
+
+    def keys(self):
+        """Return the 128-bit comparison keys of all addresses"""
+        if self._lo is None:
+            return [IPV4_MAPPED_PREFIX | value for value in self._v4]
+        return [hi << 64 | lo for hi, lo in zip(self._hi, self._lo)]
+
+    def versions(self):
+        """Return the IP version (4 or 6) of all addresses"""
+        if self._lo is None:
+            return [4] * len(self._v4)
+        return [6 if v6 else 4 for v6 in self._v6]
+
+    def parsed(self, row):
+        """Return (version, integer value) of the address at row"""
+        if self._lo is None:
+            return 4, self._v4[row]
+        key = self._hi[row] << 64 | self._lo[row]
+        if self._v6[row]:
+            return 6, key
+        return 4, key & 0xFFFFFFFF
+
+    def address(self, row):
+        return format_address(*self.parsed(row))
+
+    def addresses(self, start=0, stop=None):
+        """Return the addresses of rows start to stop (all by default) as strings"""
+        if self._lo is None:
+            ntop = socket.inet_ntop
+            family = socket.AF_INET
+            return [ntop(family, value.to_bytes(4, 'big')) for value in self._v4[start:stop]]
+        return [self.address(row) for row in range(len(self))[start:stop]]
+
+    def arrays(self):
+        """Return the backing arrays: (v4,) while narrow, else (hi, lo, v6)"""
+        if self._lo is None:
+            return (self._v4,)
+        return self._hi, self._lo, self._v6
+
+    @classmethod
+    def from_arrays(cls, v4=None, hi=None, lo=None, v6=None):
+        """Build a column around arrays in the layout returned by arrays()"""
+        column = cls()
+        if lo is None:
+            column._v4 = v4 if v4 is not None else array('I')
+        else:
+            column._hi, column._lo, column._v6 = hi, lo, v6
+        return column
+
+    def nbytes(self):
+        if self._lo is None:
+            return len(self._v4) * self._v4.itemsize
+        return (len(self._hi) * self._hi.itemsize + len(self._lo) * self._lo.itemsize
+                + len(self._v6))
+
+    def _widen(self):
+        self._hi = array('Q', bytes(8 * len(self._v4)))
+        self._lo = array('Q', (IPV4_MAPPED_PREFIX | value for value in self._v4))
+        self._v6 = bytearray(len(self._v4))
+        self._v4 = array('I')
+
+
+class RuleSet:
+    """
+    Column-oriented container of firewall rules.
+
+    Each field is stored in a typed array: address bounds in AddressColumn
+    (uint32, or 128-bit when IPv6 is present), port bounds as uint16, enum
+    fields as uint8 codes and the enabled/"no port" markers in a flags byte.
+    Descriptions are kept sparsely since most rules have none. A ruleset
+    takes a small fraction of the memory of the equivalent list of Rule
+    objects and converts back to Rule or to_dict() form on demand.
+    """
+
+    def __init__(self, rules=()):
+        self.ids = array('I')
+        self.source_start = AddressColumn()
+        self.source_end = AddressColumn()
+        self.destination_start = AddressColumn()
+        self.destination_end = AddressColumn()
+        self.source_port_start = array('H')
+        self.source_port_end = array('H')
+        self.destination_port_start = array('H')
+        self.destination_port_end = array('H')
+        self.protocols = array('B')
+        self.actions = array('B')
+        self.directions = array('B')
+        self.flags = array('B')
+        self.descriptions = {}
+        self.extend(rules)
+
+    @classmethod
+    def from_rules(cls, rules):
+        return cls(rules)
+
+    @classmethod
+    def from_dicts(cls, dicts):
+        ruleset = cls()
+        for data in dicts:
+            ruleset.append_dict(data)
+        return ruleset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("RuleSet index out of range")
+        return Rule.from_dict(self.rule_dict(row))
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def extend(self, rules):
+        for rule in rules:
+            self.append(rule)
+
+    def append(self, rule):
+        self._append(
+            rule.id,
+            rule.source_address_start, rule.source_address_end,
+            rule.source_port_start, rule.source_port_end,
+            rule.destination_address_start, rule.destination_address_end,
+            rule.destination_port_start, rule.destination_port_end,
+            _code(PROTOCOL_CODES, _PROTOCOL_VALUE_CODES, rule.protocol, Protocol),
+            _code(ACTION_CODES, _ACTION_VALUE_CODES, rule.action, Action),
+            _code(DIRECTION_CODES, _DIRECTION_VALUE_CODES, rule.direction, Direction),
+            rule.enabled, rule.description
+        )
+
+    def append_dict(self, data):
+        self._append(
+            data.get('id', 0),
+            data.get('source_address_start'), data.get('source_address_end'),
+            data.get('source_port_start'), data.get('source_port_end'),
+            data.get('destination_address_start'), data.get('destination_address_end'),
+            data.get('destination_port_start'), data.get('destination_port_end'),
+            _code(PROTOCOL_CODES, _PROTOCOL_VALUE_CODES, data['protocol'], Protocol),
+            _code(ACTION_CODES, _ACTION_VALUE_CODES, data['action'], Action),
+            _code(DIRECTION_CODES, _DIRECTION_VALUE_CODES, data['direction'], Direction),
+            data.get('enabled', True), data.get('description', '')
+        )
+
+    def _append(self, rule_id, src_start, src_end, sport_start, sport_end,
+                dst_start, dst_end, dport_start, dport_end,
+                protocol, action, direction, enabled, description):
+        # Parse everything before touching the columns so that a bad value
+        # cannot leave them with different lengths
+        addresses = [parse_address(src_start), parse_address(src_end),
+                     parse_address(dst_start), parse_address(dst_end)]
+        flags = FLAG_ENABLED if enabled else 0
+        ports = []
+        for port, missing_flag in ((sport_start, FLAG_NO_SOURCE_PORT_START),
+                                   (sport_end, FLAG_NO_SOURCE_PORT_END),
+                                   (dport_start, FLAG_NO_DESTINATION_PORT_START),
+                                   (dport_end, FLAG_NO_DESTINATION_PORT_END)):
+            if port is None:
+                flags |= missing_flag
+                port = 0
+            elif not PORT_MIN <= port <= PORT_MAX:
+                raise ValueError("Port numbers must be between 0 and 65535")
+            ports.append(port)
+
+        row = len(self.ids)
+        self.ids.append(rule_id)
+        self.source_start.append_parsed(*addresses[0])
+        self.source_end.append_parsed(*addresses[1])
+        self.destination_start.append_parsed(*addresses[2])
+        self.destination_end.append_parsed(*addresses[3])
+        self.source_port_start.append(ports[0])
+        self.source_port_end.append(ports[1])
+        self.destination_port_start.append(ports[2])
+        self.destination_port_end.append(ports[3])
+        self.protocols.append(protocol)
+        self.actions.append(action)
+        self.directions.append(direction)
+        self.flags.append(flags)
+        if description:
+            self.descriptions[row] = description
+
+    def rule_dict(self, row):
+        """Return the rule at row in Rule.to_dict() form"""
+        flags = self.flags[row]
+        return {
+            'id': self.ids[row],
+            'source_address_start': self.source_start.address(row),
+            'source_address_end': self.source_end.address(row),
+            'source_port_start': (None if flags & FLAG_NO_SOURCE_PORT_START
+                                  else self.source_port_start[row]),
+            'source_port_end': (None if flags & FLAG_NO_SOURCE_PORT_END
+                                else self.source_port_end[row]),
+            'destination_address_start': self.destination_start.address(row),
+            'destination_address_end': self.destination_end.address(row),
+            'destination_port_start': (None if flags & FLAG_NO_DESTINATION_PORT_START
+                                       else self.destination_port_start[row]),
+            'destination_port_end': (None if flags & FLAG_NO_DESTINATION_PORT_END
+                                     else self.destination_port_end[row]),
+            'protocol': PROTOCOLS[self.protocols[row]].value,
+            'action': ACTIONS[self.actions[row]].value,
+            'direction': DIRECTIONS[self.directions[row]].value,
+            'enabled': bool(flags & FLAG_ENABLED),
+            'description': self.descriptions.get(row, ''),
+        }
+
+    def to_dicts(self, start=0, stop=None):
+        """
+        Return the rules at rows start to stop (every rule by default) in
+        Rule.to_dict() form, converting column by column.
+        """
+        protocols = [member.value for member in PROTOCOLS]
+        actions = [member.value for member in ACTIONS]
+        directions = [member.value for member in DIRECTIONS]
+        descriptions = self.descriptions
+        rows = slice(start, stop)
+        columns = zip(
+            range(len(self))[rows], self.ids[rows], self.flags[rows],
+            self.source_start.addresses(start, stop), self.source_end.addresses(start, stop),
+            self.source_port_start[rows], self.source_port_end[rows],
+            self.destination_start.addresses(start, stop),
+            self.destination_end.addresses(start, stop),
+            self.destination_port_start[rows], self.destination_port_end[rows],
+            self.protocols[rows], self.actions[rows], self.directions[rows])
+        return [
+            {
+                'id': rule_id,
+                'source_address_start': src_start,
+                'source_address_end': src_end,
+                'source_port_start': None if flags & FLAG_NO_SOURCE_PORT_START else sport_start,
+                'source_port_end': None if flags & FLAG_NO_SOURCE_PORT_END else sport_end,
+                'destination_address_start': dst_start,
+                'destination_address_end': dst_end,
+                'destination_port_start': (None if flags & FLAG_NO_DESTINATION_PORT_START
+                                           else dport_start),
+                'destination_port_end': None if flags & FLAG_NO_DESTINATION_PORT_END else dport_end,
+                'protocol': protocols[protocol],
+                'action': actions[action],
+                'direction': directions[direction],
+                'enabled': bool(flags & FLAG_ENABLED),
+                'description': descriptions.get(row, ''),
+            }
+            for (row, rule_id, flags, src_start, src_end, sport_start, sport_end,
+                 dst_start, dst_end, dport_start, dport_end,
+                 protocol, action, direction) in columns
+        ]
+
+    def to_rules(self, start=0, stop=None):
+        return [Rule.from_dict(data) for data in self.to_dicts(start, stop)]
+
+    def enabled(self, row):
+        return bool(self.flags[row] & FLAG_ENABLED)
+
+    def port_bounds(self):
+        """
+        Return the effective (low, high) port bounds of every rule as four
+        lists: source low, source high, destination low, destination high.
+
+        A range with a missing start or end matches any port.
+        """
+        source_low, source_high = self._port_bounds(
+            self.source_port_start, self.source_port_end,
+            FLAG_NO_SOURCE_PORT_START | FLAG_NO_SOURCE_PORT_END)
+        destination_low, destination_high = self._port_bounds(
+            self.destination_port_start, self.destination_port_end,
+            FLAG_NO_DESTINATION_PORT_START | FLAG_NO_DESTINATION_PORT_END)
+        return source_low, source_high, destination_low, destination_high
+
+    def _port_bounds(self, starts, ends, missing_mask):
+        low = []
+        high = []
+        for start, end, flags in zip(starts, ends, self.flags):
+            if flags & missing_mask:
+                low.append(PORT_MIN)
+                high.append(PORT_MAX)
+            else:
+                low.append(start)
+                high.append(end)
+        return low, high
+
+    def nbytes(self):
+        """Approximate memory used by the column storage in bytes"""
+        total = sum(len(column) * column.itemsize for column in (
+            self.ids, self.source_port_start, self.source_port_end,
+            self.destination_port_start, self.destination_port_end,
+            self.protocols, self.actions, self.directions, self.flags))
+        total += sum(column.nbytes() for column in (
+            self.source_start, self.source_end,
+            self.destination_start, self.destination_end))
+        # Sparse descriptions: dict slot plus the string itself
+        total += sum(100 + len(text) for text in self.descriptions.values())
+        return total
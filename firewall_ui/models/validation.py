@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+from firewall_ui.models.address import parse_address
+
+PORT_MIN = 0
+PORT_MAX = 65535
+
+
+@dataclass
+class ValidationReport:
+    """
+    Result of validating a list of rules.
+
+    errors maps the position of each invalid rule in the input to the list
+    of problems found with it, in the order Rule.validate checks them.
+    """
+    total: int
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def invalid_count(self):
+        return len(self.errors)
+
+    def first_error(self):
+        """Return (index, message) of the first problem, or None"""
+        if not self.errors:
+            return None
+        index = min(self.errors)
+        return index, self.errors[index][0]
+
+    def summary(self, limit=10):
+        """Human readable description of the first `limit` invalid rules"""
+        lines = [f"{self.invalid_count} of {self.total} rules are invalid"]
+        for index in sorted(self.errors)[:limit]:
+            lines.append(f"Rule {index + 1}: {'; '.join(self.errors[index])}")
+        if self.invalid_count > limit:
+            lines.append(f"... and {self.invalid_count - limit} more")
+        return "\n".join(lines)
+
+
+def validate_many(rules):
+    """
+    Validate a list of rules in one pass per field instead of rule by rule.
+
+    Every distinct address string is parsed once, then the start/end
+    ordering and port bounds are checked column by column. All problems are
+    collected into a ValidationReport; nothing is raised.
+    """
+    rules = list(rules)
+    errors = {}
+
+    def add_error(index, message):
+        errors.setdefault(index, []).append(message)
+
+    # Parse each distinct address once
+    parsed = {}
+    address_columns = []
+    for attribute in ('source_address_start', 'source_address_end',
+                      'destination_address_start', 'destination_address_end'):
+        column = [getattr(rule, attribute) for rule in rules]
+        for address in column:
+            if address not in parsed:
+                parsed[address] = _parse(address)
+        address_columns.append([parsed[address] for address in column])
+
+    for column in address_columns:
+        for index, value in enumerate(column):
+            if isinstance(value, str):
+                add_error(index, value)
+
+    src_start, src_end, dst_start, dst_end = address_columns
+    _check_address_order(src_start, src_end, "Source", add_error)
+    _check_address_order(dst_start, dst_end, "Destination", add_error)
+
+    _check_ports([rule.source_port_start for rule in rules],
+                 [rule.source_port_end for rule in rules], "Source", add_error)
+    _check_ports([rule.destination_port_start for rule in rules],
+                 [rule.destination_port_end for rule in rules], "Destination", add_error)
+
+    return ValidationReport(total=len(rules), errors=errors)
+
+
+def _parse(address):
+    """Return (version, value) for a valid address, or the error message"""
+    try:
+        return parse_address(address)
+    except (ValueError, TypeError) as e:
+        return str(e)
+
+
+def _check_address_order(starts, ends, label, add_error):
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        if isinstance(start, str) or isinstance(end, str):
+            continue
+        if start[0] != end[0]:
+            add_error(index, f"{label} IP start and end must be of the same IP version")
+        elif start[1] > end[1]:
+            add_error(index, f"{label} IP start must be less than or equal to end")
+
+
+def _check_ports(starts, ends, label, add_error):
+    for index, (start, end) in enumerate(zip(starts, ends)):
+        if start is None or end is None:
+            continue
+        if not isinstance(start, int) or not isinstance(end, int):
+            add_error(index, "Port numbers must be integers")
+        elif not (PORT_MIN <= start <= PORT_MAX and PORT_MIN <= end <= PORT_MAX):
+            add_error(index, "Port numbers must be between 0 and 65535")
+        elif start > end:
+            add_error(index, f"{label} port start must be less than or equal to end")
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from operator import attrgetter, itemgetter
+from firewall_ui.policy.space import (BoxIndex, DIMENSIONS, DIMENSION_NAMES,
+                                      as_ruleset, group_boxes, rule_boxes)
+
+SHADOWED = "shadowed"
+REDUNDANT = "redundant"
+MERGEABLE = "mergeable"
+
+
+@dataclass
+class Finding:
+    """
+    A finding about the rule at position `rule` in the ordered rule list.
+
+    `other` is the position of the rule involved: the earlier rule that
+    covers it for shadowed/redundant findings, or the merge partner.
+    """
+    kind: str
+    rule: int
+    other: int
+    detail: str
+
+
+@dataclass
+class AnalysisReport:
+    total: int
+    findings: list = field(default_factory=list)
+
+    def of_kind(self, kind):
+        return [finding for finding in self.findings if finding.kind == kind]
+
+    @property
+    def shadowed(self):
+        return self.of_kind(SHADOWED)
+
+    @property
+    def redundant(self):
+        return self.of_kind(REDUNDANT)
+
+    @property
+    def mergeable(self):
+        return self.of_kind(MERGEABLE)
+
+    def dead_rules(self):
+        """Positions of rules that can never match a packet"""
+        return {finding.rule for finding in self.findings
+                if finding.kind in (SHADOWED, REDUNDANT)}
+
+    def summary(self):
+        return (f"{len(self.shadowed)} shadowed, {len(self.redundant)} redundant and "
+                f"{len(self.mergeable)} mergeable rules out of {self.total}")
+
+
+def analyze(rules):
+    """
+    Find shadowed, redundant and mergeable rules in an ordered rule list.
+
+    A rule is shadowed when an earlier rule with a different action matches
+    every packet it matches, and redundant when that earlier rule has the
+    same action. Either way it never fires. Two live rules are mergeable when
+    they agree on everything but one range, those ranges touch or overlap,
+    and no rule between them would see a different verdict after the merge.
+
+    Rules must be valid (see validate_many). Disabled rules are ignored.
+    """
+    ruleset = as_ruleset(rules)
+    report = AnalysisReport(total=len(ruleset))
+
+    for group in group_boxes(rule_boxes(ruleset)):
+        index = BoxIndex(group)
+        dead = set()
+        for box in group:
+            covering = find_covering(index, box)
+            if covering is None:
+                continue
+            dead.add(box.index)
+            if covering.action == box.action:
+                report.findings.append(Finding(
+                    REDUNDANT, box.index, covering.index,
+                    f"Already matched by rule {covering.index + 1} with the same action"))
+            else:
+                report.findings.append(Finding(
+                    SHADOWED, box.index, covering.index,
+                    f"Never matches: rule {covering.index + 1} matches all of its packets first"))
+
+        live = [box for box in group if box.index not in dead]
+        for earlier, later, dimension in merge_candidates(live, BoxIndex(live)):
+            report.findings.append(Finding(
+                MERGEABLE, later.index, earlier.index,
+                f"Can be merged into rule {earlier.index + 1}: "
+                f"{DIMENSION_NAMES[dimension]} ranges are contiguous"))
+
+    report.findings.sort(key=attrgetter('rule', 'other'))
+    return report
+
+
+def find_covering(index, box):
+    """Return the earliest box in index that covers box and precedes it, or None"""
+    return min((candidate for candidate in index.containing(box)
+                if candidate.index < box.index),
+               key=attrgetter('index'), default=None)
+
+
+def merge_candidates(boxes, index):
+    """
+    Return (earlier, later, dimension) for every pair of boxes that can be
+    replaced by a single box at the earlier position without changing the
+    verdict of any packet. index must contain every live box of the same
+    direction and family.
+    """
+    pairs = []
+    for dimension, (low_field, high_field) in enumerate(DIMENSIONS):
+        other_fields = [position for fields in DIMENSIONS if fields != (low_field, high_field)
+                        for position in fields]
+        # protocol, action, family and the bounds of the other three dimensions
+        group_key = itemgetter(2, 3, 4, *other_fields)
+        groups = defaultdict(list)
+        for box in boxes:
+            groups[group_key(box)].append(box)
+
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=itemgetter(low_field, high_field))
+            # Sweep by range start, pairing each box with the one reaching
+            # furthest so far
+            reach = members[0]
+            for box in members[1:]:
+                if box[low_field] <= reach[high_field] + 1:
+                    earlier, later = sorted((reach, box), key=attrgetter('index'))
+                    if merge_is_safe(index, earlier, later):
+                        pairs.append((earlier, later, dimension))
+                if box[high_field] > reach[high_field]:
+                    reach = box
+    return pairs
+
+
+def merge_is_safe(index, earlier, later):
+    """
+    Moving later's packets up to earlier's position only changes a verdict
+    if a rule in between sees some of them with a different action.
+    """
+    for other in index.overlapping(later):
+        if earlier.index < other.index < later.index and other.action != later.action:
+            return False
+    return True
@@ -0,0 +1,150 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass, field, fields
+from difflib import SequenceMatcher
+from operator import attrgetter
+from firewall_ui.models.rule import Rule
+
+# Every Rule field except id, which only mirrors the rule's position.
+# rule_key(rule) returns them as a hashable tuple.
+CONTENT_FIELDS = tuple(f.name for f in fields(Rule) if f.name != 'id')
+rule_key = attrgetter(*CONTENT_FIELDS)
+
+# Changed regions longer than this are cheaper to push in full than to diff
+MAX_DIFF_WINDOW = 20000
+
+
+@dataclass
+class RuleDelta:
+    """
+    Changes turning a base rule list into a new one.
+
+    deletes are base positions, updates are (base position, new position)
+    pairs of rules whose content changed, moves are (base position, new
+    position) pairs of unchanged rules and inserts are new positions.
+    Applying it fills the moved and inserted positions of the new list and
+    then the remaining positions, in order, with the surviving base rules
+    (see apply_delta).
+    """
+    base_length: int
+    length: int
+    deletes: list = field(default_factory=list)
+    updates: list = field(default_factory=list)
+    moves: list = field(default_factory=list)
+    inserts: list = field(default_factory=list)
+
+    @property
+    def size(self):
+        return len(self.deletes) + len(self.updates) + len(self.moves) + len(self.inserts)
+
+    @property
+    def empty(self):
+        return self.size == 0 and self.base_length == self.length
+
+    def summary(self):
+        return (f"{len(self.inserts)} inserted, {len(self.deletes)} deleted, "
+                f"{len(self.moves)} moved, {len(self.updates)} updated")
+
+
+def diff_rules(old_keys, new_keys, max_window=MAX_DIFF_WINDOW):
+    """
+    Compute a small RuleDelta from old_keys to new_keys, both lists of
+    rule_key() tuples.
+
+    The common prefix and suffix are skipped in linear time and only the
+    changed window in between is diffed. Returns None if that window is
+    longer than max_window rules.
+    """
+    old_length = len(old_keys)
+    new_length = len(new_keys)
+    limit = min(old_length, new_length)
+    prefix = 0
+    while prefix < limit and old_keys[prefix] == new_keys[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < limit - prefix
+           and old_keys[old_length - 1 - suffix] == new_keys[new_length - 1 - suffix]):
+        suffix += 1
+
+    old_window = old_keys[prefix:old_length - suffix]
+    new_window = new_keys[prefix:new_length - suffix]
+    if max(len(old_window), len(new_window)) > max_window:
+        return None
+    return delta_from_regions(old_keys, new_keys,
+                              changed_regions(old_window, new_window, prefix, prefix),
+                              old_length, new_length)
+
+
+def changed_regions(old_keys, new_keys, old_start=0, new_start=0):
+    """
+    Return the (old start, old end, new start, new end) ranges in which
+    old_keys and new_keys differ, shifted to start at old_start and
+    new_start.
+    """
+    return [(old_start + i1, old_start + i2, new_start + j1, new_start + j2)
+            for tag, i1, i2, j1, j2
+            in SequenceMatcher(None, old_keys, new_keys, autojunk=False).get_opcodes()
+            if tag != 'equal']
+
+
+def delta_from_regions(old_keys, new_keys, regions, old_length, new_length):
+    """
+    Build the RuleDelta of the changed regions, in position order, between
+    rule lists of old_length and new_length rules. old_keys and new_keys
+    map at least every position inside the regions to its rule_key().
+    """
+    delta = RuleDelta(old_length, new_length)
+
+    # A rule removed in one place and added unchanged in another was moved
+    removed = defaultdict(deque)
+    for i1, i2, _, _ in regions:
+        for position in range(i1, i2):
+            removed[old_keys[position]].append(position)
+    moved_from = set()
+    moved_to = set()
+    for _, _, j1, j2 in regions:
+        for position in range(j1, j2):
+            candidates = removed.get(new_keys[position])
+            if candidates:
+                source = candidates.popleft()
+                delta.moves.append((source, position))
+                moved_from.add(source)
+                moved_to.add(position)
+
+    # What is left of each region is changed in place, then deleted or inserted
+    for i1, i2, j1, j2 in regions:
+        old_positions = [p for p in range(i1, i2) if p not in moved_from]
+        new_positions = [p for p in range(j1, j2) if p not in moved_to]
+        paired = min(len(old_positions), len(new_positions))
+        delta.updates.extend(zip(old_positions[:paired], new_positions[:paired]))
+        delta.deletes.extend(old_positions[paired:])
+        delta.inserts.extend(new_positions[paired:])
+    return delta
+
+
+def apply_delta(base, delta, values):
+    """
+    Apply delta to the base list. values maps every updated and inserted
+    new position to its rule. Returns the new list.
+    """
+    if len(base) != delta.base_length:
+        raise ValueError(f"Delta expects {delta.base_length} base rules, got {len(base)}")
+    empty = object()
+    result = [empty] * delta.length
+    for source, target in delta.moves:
+        result[target] = base[source]
+    for target in delta.inserts:
+        result[target] = values[target]
+    updated = dict(delta.updates)
+    gone = set(delta.deletes)
+    gone.update(source for source, _ in delta.moves)
+
+    survivors = (values[updated[position]] if position in updated else base[position]
+                 for position in range(len(base)) if position not in gone)
+    for position, rule in enumerate(result):
+        if rule is empty:
+            result[position] = next(survivors, empty)
+            if result[position] is empty:
+                raise ValueError("Delta leaves positions unfilled")
+    if next(survivors, empty) is not empty:
+        raise ValueError("Delta leaves base rules unplaced")
+    return result
@@ -0,0 +1,104 @@
+from itertools import product
+from firewall_ui.models.address import IPV4_MAPPED_PREFIX
+from firewall_ui.models.ruleset import PROTOCOL_CODES, DIRECTION_CODES, PROTOCOL_ANY
+from firewall_ui.policy.space import DIMENSIONS, PACKET_FAMILIES, rule_boxes
+
+ADDRESS_MAX = (1 << 128) - 1
+PORT_MAX = 65535
+DEFAULT_MAX_PACKETS = 2_000_000
+
+
+def first_match(boxes, direction, protocol, family, point):
+    """
+    Reference first-match evaluation: return the first box matching a packet.
+
+    protocol is a protocol code; a packet that is neither TCP nor UDP is
+    represented by the ANY code and only matches ANY rules. family is the
+    packet's (source, destination) IP versions and point holds its (source
+    address key, source port, destination address key, destination port).
+    """
+    source, source_port, destination, destination_port = point
+    for box in boxes:
+        if (box.direction == direction
+                and box.family == family
+                and (box.protocol == protocol or box.protocol == PROTOCOL_ANY)
+                and box.source_low <= source <= box.source_high
+                and box.source_port_low <= source_port <= box.source_port_high
+                and box.destination_low <= destination <= box.destination_high
+                and box.destination_port_low <= destination_port <= box.destination_port_high):
+            return box
+    return None
+
+
+def representative_points(boxes_lists):
+    """
+    Return one value per elementary interval of every dimension.
+
+    Every verdict is constant between two consecutive range boundaries of
+    the rules involved, so checking the start of each such interval covers
+    every possible packet.
+    """
+    points = []
+    for (low_field, high_field), domain_max in zip(DIMENSIONS, (ADDRESS_MAX, PORT_MAX,
+                                                               ADDRESS_MAX, PORT_MAX)):
+        values = {0}
+        for boxes in boxes_lists:
+            for box in boxes:
+                values.add(box[low_field])
+                if box[high_field] < domain_max:
+                    values.add(box[high_field] + 1)
+        points.append(sorted(values))
+    return points
+
+
+def family_points(points, family):
+    """
+    Restrict representative points to the address keys of family: IPv4
+    packets only have keys in the IPv4-mapped range.
+    """
+    if family[0] == 6:
+        return points
+    low, high = IPV4_MAPPED_PREFIX, IPV4_MAPPED_PREFIX | 0xFFFFFFFF
+    restricted = list(points)
+    for dimension in (0, 2):
+        restricted[dimension] = [low] + [value for value in points[dimension]
+                                         if low < value <= high]
+    return restricted
+
+
+def find_counterexample(original, optimized, max_packets=DEFAULT_MAX_PACKETS):
+    """
+    Exhaustively compare the verdicts of two ordered rule lists.
+
+    Returns None when both lists give the same action for every possible
+    packet, otherwise (direction code, protocol code, family, point,
+    original action code, optimized action code) for a packet where they
+    differ; an action
+    of None means no rule matched. Raises ValueError if the number of packet
+    classes to check exceeds max_packets.
+    """
+    original_boxes = rule_boxes(original)
+    optimized_boxes = rule_boxes(optimized)
+    points = representative_points([original_boxes, optimized_boxes])
+    points = {family: family_points(points, family) for family in PACKET_FAMILIES}
+    directions = sorted(DIRECTION_CODES.values())
+    protocols = sorted(PROTOCOL_CODES.values())
+
+    count = 0
+    for family_values in points.values():
+        classes = len(directions) * len(protocols)
+        for values in family_values:
+            classes *= len(values)
+        count += classes
+    if count > max_packets:
+        raise ValueError(f"Too many packet classes to check exhaustively ({count})")
+
+    for family, direction, protocol in product(PACKET_FAMILIES, directions, protocols):
+        for point in product(*points[family]):
+            before = first_match(original_boxes, direction, protocol, family, point)
+            after = first_match(optimized_boxes, direction, protocol, family, point)
+            before_action = before.action if before else None
+            after_action = after.action if after else None
+            if before_action != after_action:
+                return direction, protocol, family, point, before_action, after_action
+    return None
@@ -0,0 +1,202 @@
+import time
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from weakref import WeakValueDictionary
+from firewall_ui.models.rule import Rule
+from firewall_ui.policy.diff import (MAX_DIFF_WINDOW, changed_regions, delta_from_regions,
+                                     rule_key)
+
+# Versions are trees of rule_key() tuples. Leaves hold runs of consecutive
+# rules and branches runs of consecutive nodes, both cut where the hash of
+# an item hits a mask, so a change only moves the boundaries next to it.
+# Nodes are hash-consed: a run seen before, in any version still kept, is
+# the same object, so versions share every unchanged run and two versions
+# can be compared by skipping the nodes they share.
+LEAF_MASK = 31      # a leaf ends after about one rule in 32
+LEAF_SIZES = (8, 128)
+BRANCH_MASK = 15    # a branch ends after about one node in 16
+BRANCH_SIZES = (4, 64)
+
+
+class _Node:
+    """A leaf (height 0, items are rule keys) or a branch (items are nodes)"""
+    __slots__ = ('items', 'size', 'height', 'hash', '__weakref__')
+
+    def __init__(self, items, size, height, node_hash):
+        self.items = items
+        self.size = size
+        self.height = height
+        self.hash = node_hash
+
+    def keys(self):
+        if self.height == 0:
+            yield from self.items
+            return
+        for node in self.items:
+            yield from node.keys()
+
+
+def _runs(hashes, mask, minimum, maximum):
+    """Yield the (start, stop) runs of the items whose hashes are given"""
+    start = 0
+    for position, item_hash in enumerate(hashes):
+        size = position + 1 - start
+        if (size >= minimum and not item_hash & mask) or size == maximum:
+            yield start, position + 1
+            start = position + 1
+    if start < len(hashes):
+        yield start, len(hashes)
+
+
+def _children(nodes):
+    return [child for node in nodes for child in node.items]
+
+
+def _offsets(nodes, start):
+    offsets = [start]
+    for node in nodes:
+        offsets.append(offsets[-1] + node.size)
+    return offsets
+
+
+@dataclass
+class RuleVersion:
+    """A ruleset recorded in a RuleHistory"""
+    number: int
+    time: float
+    note: str
+    # Summary of the changes from the version before, if any
+    changes: str
+    root: _Node = field(repr=False)
+
+    def __len__(self):
+        return self.root.size
+
+
+class RuleHistory:
+    """
+    The last limit rulesets recorded, numbered from 1, with unchanged runs
+    of rules stored once for every version that contains them. A version
+    costs memory for the rules it changed and a few nodes around them.
+    """
+
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.versions = []
+        self._next_number = 1
+        # Hash-consing tables; a node goes with the last version using it
+        self._leaves = WeakValueDictionary()
+        self._branches = WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.versions)
+
+    @property
+    def latest(self):
+        return self.versions[-1] if self.versions else None
+
+    def get(self, number):
+        """Return version number; raises KeyError if it is not kept"""
+        first = self.versions[0].number if self.versions else 0
+        if not 0 <= number - first < len(self.versions):
+            raise KeyError(f"No version {number} in history")
+        return self.versions[number - first]
+
+    def record(self, rules, note=""):
+        """Add rules (Rule objects, in order) as a new version and return it"""
+        root = self._build([rule_key(rule) for rule in rules])
+        previous = self.latest
+        changes = ""
+        if previous is not None:
+            changes = self._diff(previous.root, root).summary()
+        version = RuleVersion(self._next_number, time.time(), note, changes, root)
+        self._next_number += 1
+        self.versions.append(version)
+        del self.versions[:-self.limit]
+        return version
+
+    def rules(self, number):
+        """Return the rules of version number as new Rule objects"""
+        return [Rule(position, *key)
+                for position, key in enumerate(self.get(number).root.keys(), 1)]
+
+    def diff(self, old_number, new_number):
+        """
+        Return the RuleDelta from version old_number to new_number (see
+        policy/diff.py). Runs both versions share are skipped whole, so the
+        work grows with the changes between them rather than their size.
+        """
+        return self._diff(self.get(old_number).root, self.get(new_number).root)
+
+    def _build(self, keys):
+        hashes = [hash(key) for key in keys]
+        nodes = []
+        for start, stop in _runs(hashes, LEAF_MASK, *LEAF_SIZES):
+            nodes.append(self._leaf(tuple(keys[start:stop]), tuple(hashes[start:stop])))
+        if not nodes:
+            return self._leaf((), ())
+        while len(nodes) > 1:
+            nodes = [self._branch(tuple(nodes[start:stop]))
+                     for start, stop in _runs([node.hash for node in nodes],
+                                              BRANCH_MASK, *BRANCH_SIZES)]
+        return nodes[0]
+
+    def _leaf(self, keys, hashes):
+        leaf = self._leaves.get(hashes)
+        if leaf is not None and leaf.items == keys:
+            return leaf
+        new_leaf = _Node(keys, len(keys), 0, hash(hashes))
+        if leaf is None:
+            # On a hash collision the leaf just goes unshared
+            self._leaves[hashes] = new_leaf
+        return new_leaf
+
+    def _branch(self, nodes):
+        # Children are hash-consed, so their identities stand for their content
+        identities = tuple(map(id, nodes))
+        branch = self._branches.get(identities)
+        if branch is None:
+            branch = _Node(nodes, sum(node.size for node in nodes), nodes[0].height + 1,
+                           hash(tuple(node.hash for node in nodes)))
+            self._branches[identities] = branch
+        return branch
+
+    @staticmethod
+    def _diff(old, new):
+        old_nodes, new_nodes = [old], [new]
+        while old_nodes[0].height > new_nodes[0].height:
+            old_nodes = _children(old_nodes)
+        while new_nodes[0].height > old_nodes[0].height:
+            new_nodes = _children(new_nodes)
+
+        # Match nodes level by level and only descend into unmatched runs
+        regions = []
+        old_keys = {}
+        new_keys = {}
+        pending = [(old_nodes, new_nodes, 0, 0)]
+        while pending:
+            old_nodes, new_nodes, old_start, new_start = pending.pop()
+            old_offsets = _offsets(old_nodes, old_start)
+            new_offsets = _offsets(new_nodes, new_start)
+            opcodes = SequenceMatcher(None, list(map(id, old_nodes)), list(map(id, new_nodes)),
+                                      autojunk=False).get_opcodes()
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == 'equal':
+                    continue
+                old_run, new_run = old_nodes[i1:i2], new_nodes[j1:j2]
+                if (old_run or new_run)[0].height:
+                    pending.append((_children(old_run), _children(new_run),
+                                    old_offsets[i1], new_offsets[j1]))
+                    continue
+                old_run = _children(old_run)
+                new_run = _children(new_run)
+                old_keys.update(zip(range(old_offsets[i1], old_offsets[i2]), old_run))
+                new_keys.update(zip(range(new_offsets[j1], new_offsets[j2]), new_run))
+                if max(len(old_run), len(new_run)) > MAX_DIFF_WINDOW:
+                    regions.append((old_offsets[i1], old_offsets[i2],
+                                    new_offsets[j1], new_offsets[j2]))
+                else:
+                    regions.extend(changed_regions(old_run, new_run,
+                                                   old_offsets[i1], new_offsets[j1]))
+        regions.sort()
+        return delta_from_regions(old_keys, new_keys, regions, old.size, new.size)
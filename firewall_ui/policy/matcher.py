@@ -0,0 +1,283 @@
+from bisect import bisect_right
+from math import isqrt
+from firewall_ui.models.address import IPV4_MAPPED_PREFIX, parse_address
+from firewall_ui.models.rule import Protocol, Direction
+from firewall_ui.models.ruleset import (PROTOCOL_CODES, DIRECTION_CODES, PROTOCOL_ANY,
+                                        ACTIONS)
+from firewall_ui.models.validation import PORT_MIN, PORT_MAX
+from firewall_ui.policy.space import DIMENSIONS, PACKET_FAMILIES, as_ruleset, rule_boxes
+
+MIN_BLOCK_SIZE = 64
+# Port value of a packet without ports; only rules matching any port see it
+PORTLESS = PORT_MIN - 1
+_PORT_DIMENSIONS = (1, 3)
+
+
+def _protocol_code(protocol):
+    """Packets that are neither TCP nor UDP only match ANY rules"""
+    if protocol in (Protocol.TCP, Protocol.UDP):
+        return PROTOCOL_CODES[protocol]
+    if protocol in (Protocol.TCP.value, Protocol.UDP.value):
+        return PROTOCOL_CODES[Protocol(protocol)]
+    return PROTOCOL_ANY
+
+
+def _direction_code(direction):
+    return DIRECTION_CODES[Direction(direction)]
+
+
+def _address(address):
+    """
+    Return (IP version, comparison key) of an address string or key. Keys
+    in the IPv4-mapped range are taken as IPv4 addresses.
+    """
+    if isinstance(address, int):
+        return (4 if address >> 32 == IPV4_MAPPED_PREFIX >> 32 else 6), address
+    version, value = parse_address(str(address))
+    return version, IPV4_MAPPED_PREFIX | value if version == 4 else value
+
+
+def _port(port):
+    return PORTLESS if port is None else port
+
+
+def _ranges(boxes, dimension):
+    """(low, high) of boxes along dimension; any-port ranges also hold PORTLESS"""
+    low_field, high_field = DIMENSIONS[dimension]
+    for box in boxes:
+        low, high = box[low_field], box[high_field]
+        if dimension in _PORT_DIMENSIONS and low == PORT_MIN and high == PORT_MAX:
+            low = PORTLESS
+        yield low, high
+
+
+def _elementary_masks(intervals):
+    """
+    Sweep (low, high, bit) intervals into sorted interval starts and the
+    bitmask of intervals covering each elementary interval.
+    """
+    events = {}
+    for low, high, bit in intervals:
+        events.setdefault(low, []).append(bit)
+        events.setdefault(high + 1, []).append(-bit)
+    # Every value looked up is at least PORTLESS, so it always finds a cell
+    bounds = [PORTLESS]
+    masks = [0]
+    counts = {}
+    mask = 0
+    for position in sorted(events):
+        for bit in events[position]:
+            count = counts.get(abs(bit), 0) + (1 if bit > 0 else -1)
+            counts[abs(bit)] = count
+            if count:
+                mask |= abs(bit)
+            else:
+                mask &= ~abs(bit)
+        if position == bounds[-1]:
+            masks[-1] = mask
+        else:
+            bounds.append(position)
+            masks.append(mask)
+    return bounds, masks
+
+
+class _Block:
+    """Per-field bitsets of up to block_size consecutive rules"""
+
+    def __init__(self, offset, boxes):
+        self.offset = offset
+        self.dimensions = []
+        for dimension in range(len(DIMENSIONS)):
+            self.dimensions.append(_elementary_masks(
+                (low, high, 1 << bit)
+                for bit, (low, high) in enumerate(_ranges(boxes, dimension))))
+        self.directions = {}
+        self.protocols = {}
+        self.families = {}
+        for code in DIRECTION_CODES.values():
+            self.directions[code] = _bits(boxes, lambda box: box.direction == code)
+        for family in PACKET_FAMILIES:
+            self.families[family] = _bits(boxes, lambda box: box.family == family)
+        for code in PROTOCOL_CODES.values():
+            self.protocols[code] = _bits(
+                boxes, lambda box: box.protocol == code or box.protocol == PROTOCOL_ANY)
+
+
+def _bits(boxes, predicate):
+    mask = 0
+    for bit, box in enumerate(boxes):
+        if predicate(box):
+            mask |= 1 << bit
+    return mask
+
+
+class CompiledMatcher:
+    """
+    First-match packet classifier compiled from an ordered rule list.
+
+    Enabled rules are split into blocks of consecutive rules. Every field
+    (direction, protocol, address family and the four address/port ranges)
+    is turned into elementary intervals with a bitset of the rules matching
+    there, at two levels: which blocks can match, and which rules inside a
+    block match.
+    A packet is classified by AND-ing one bitset per field, first across
+    blocks and then inside the first candidate blocks in rule order; the
+    lowest set bit is the first matching rule. No rule is scanned linearly.
+
+    Batch classification also caches verdicts per combination of global
+    elementary intervals, since every packet in such a cell gets the same
+    verdict.
+    """
+
+    def __init__(self, rules, block_size=None):
+        self.rules = list(rules)
+        boxes = rule_boxes(as_ruleset(self.rules))
+        self._positions = [box.index for box in boxes]
+        self._actions = [ACTIONS[box.action] for box in boxes]
+        if block_size is None:
+            block_size = max(MIN_BLOCK_SIZE, isqrt(len(boxes)))
+        self.block_size = block_size
+
+        block_boxes = [boxes[start:start + block_size]
+                       for start in range(0, len(boxes), block_size)]
+        self._blocks = [_Block(number * block_size, members)
+                        for number, members in enumerate(block_boxes)]
+
+        # Block-level bitsets: bit b is set if some rule of block b matches
+        self._dimensions = []
+        for dimension in range(len(DIMENSIONS)):
+            self._dimensions.append(_elementary_masks(
+                (low, high, 1 << number) for number, members in enumerate(block_boxes)
+                for low, high in _ranges(members, dimension)))
+        self._direction_blocks = {
+            code: _bits(self._blocks, lambda block: block.directions[code])
+            for code in DIRECTION_CODES.values()}
+        self._protocol_blocks = {
+            code: _bits(self._blocks, lambda block: block.protocols[code])
+            for code in PROTOCOL_CODES.values()}
+        self._family_blocks = {
+            family: _bits(self._blocks, lambda block: block.families[family])
+            for family in PACKET_FAMILIES}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def match(self, source_address, source_port, destination_address, destination_port,
+              protocol, direction):
+        """
+        Return (rule, action) of the first rule matching a packet, or
+        (None, None) if no rule matches. protocol is a Protocol, its value,
+        or anything else for a packet that is neither TCP nor UDP; such a
+        packet may have None for its ports.
+        """
+        position = self.match_position(source_address, source_port, destination_address,
+                                       destination_port, protocol, direction)
+        if position < 0:
+            return None, None
+        return self.rules[position], self.rules[position].action
+
+    def match_position(self, source_address, source_port, destination_address,
+                       destination_port, protocol, direction):
+        """Return the list position of the first matching rule, or -1"""
+        source_version, source_key = _address(source_address)
+        destination_version, destination_key = _address(destination_address)
+        values = (source_key, _port(source_port), destination_key, _port(destination_port))
+        cells = tuple(bisect_right(bounds, value) - 1
+                      for (bounds, masks), value in zip(self._dimensions, values))
+        match = self._match(_direction_code(direction), _protocol_code(protocol),
+                            (source_version, destination_version), values, cells)
+        return self._positions[match] if match >= 0 else -1
+
+    def classify_many(self, packets):
+        """
+        Classify (source address, source port, destination address,
+        destination port, protocol, direction) tuples.
+
+        Returns the list position of the first matching rule for every
+        packet, or -1 where no rule matches. Addresses may be strings or
+        keys from address_key; passing keys skips address parsing, and keys
+        in the IPv4-mapped range are taken as IPv4 addresses.
+        """
+        (source_bounds, _), (source_port_bounds, _), \
+            (destination_bounds, _), (destination_port_bounds, _) = self._dimensions
+        positions = self._positions
+        match = self._match
+        # value -> (elementary interval, comparison key[, IP version]), per field
+        source_cells = {}
+        source_port_cells = {}
+        destination_cells = {}
+        destination_port_cells = {}
+        field_codes = {}
+        verdicts = {}
+        results = []
+        append = results.append
+        for source, source_port, destination, destination_port, protocol, direction in packets:
+            codes = field_codes.get((protocol, direction))
+            if codes is None:
+                codes = field_codes[(protocol, direction)] = (
+                    _direction_code(direction), _protocol_code(protocol))
+
+            # The four lookups are unrolled: this loop runs once per packet
+            source_cell = source_cells.get(source)
+            if source_cell is None:
+                version, key = _address(source)
+                source_cell = source_cells[source] = (
+                    bisect_right(source_bounds, key) - 1, key, version)
+            source_port_cell = source_port_cells.get(source_port)
+            if source_port_cell is None:
+                port = _port(source_port)
+                source_port_cell = source_port_cells[source_port] = (
+                    bisect_right(source_port_bounds, port) - 1, port)
+            destination_cell = destination_cells.get(destination)
+            if destination_cell is None:
+                version, key = _address(destination)
+                destination_cell = destination_cells[destination] = (
+                    bisect_right(destination_bounds, key) - 1, key, version)
+            destination_port_cell = destination_port_cells.get(destination_port)
+            if destination_port_cell is None:
+                port = _port(destination_port)
+                destination_port_cell = destination_port_cells[destination_port] = (
+                    bisect_right(destination_port_bounds, port) - 1, port)
+
+            family = (source_cell[2], destination_cell[2])
+            cells = (source_cell[0], source_port_cell[0],
+                     destination_cell[0], destination_port_cell[0])
+            verdict = verdicts.get((codes, family, cells))
+            if verdict is None:
+                verdict = match(codes[0], codes[1], family,
+                                (source_cell[1], source_port_cell[1],
+                                 destination_cell[1], destination_port_cell[1]), cells)
+                verdict = verdicts[(codes, family, cells)] = (
+                    positions[verdict] if verdict >= 0 else -1)
+            append(verdict)
+        return results
+
+    def actions_many(self, packets):
+        """Like classify_many, but return the Action (or None) for every packet"""
+        rules = self.rules
+        return [rules[position].action if position >= 0 else None
+                for position in self.classify_many(packets)]
+
+    def _match(self, direction, protocol, family, values, cells):
+        """Return the index of the first matching enabled rule, or -1"""
+        candidates = (self._direction_blocks[direction] & self._protocol_blocks[protocol]
+                      & self._family_blocks.get(family, 0))
+        for (bounds, masks), cell in zip(self._dimensions, cells):
+            candidates &= masks[cell]
+            if not candidates:
+                return -1
+
+        blocks = self._blocks
+        while candidates:
+            lowest = candidates & -candidates
+            block = blocks[lowest.bit_length() - 1]
+            bits = (block.directions[direction] & block.protocols[protocol]
+                    & block.families[family])
+            for (bounds, masks), value in zip(block.dimensions, values):
+                bits &= masks[bisect_right(bounds, value) - 1]
+                if not bits:
+                    break
+            if bits:
+                return block.offset + (bits & -bits).bit_length() - 1
+            candidates ^= lowest
+        return -1
@@ -0,0 +1,112 @@
+from dataclasses import dataclass, replace
+from firewall_ui.models.address import key_to_address
+from firewall_ui.policy.analyzer import find_covering, merge_candidates
+from firewall_ui.policy.space import BoxIndex, DIMENSIONS, as_ruleset, group_boxes, rule_boxes
+
+# Rule fields holding the bounds of each dimension, in DIMENSIONS order
+_DIMENSION_RULE_FIELDS = (
+    ('source_address_start', 'source_address_end'),
+    ('source_port_start', 'source_port_end'),
+    ('destination_address_start', 'destination_address_end'),
+    ('destination_port_start', 'destination_port_end'),
+)
+_ADDRESS_DIMENSIONS = (0, 2)
+
+
+@dataclass
+class OptimizationResult:
+    rules: list
+    original_count: int
+    disabled_removed: int = 0
+    dead_removed: int = 0
+    merged: int = 0
+    passes: int = 0
+
+    @property
+    def reduction_ratio(self):
+        if not self.original_count:
+            return 0.0
+        return 1 - len(self.rules) / self.original_count
+
+    def summary(self):
+        return (f"{self.original_count} -> {len(self.rules)} rules "
+                f"({self.reduction_ratio:.1%} fewer): {self.disabled_removed} disabled and "
+                f"{self.dead_removed} never-matching rules dropped, {self.merged} merges")
+
+
+def optimize(rules, max_passes=8):
+    """
+    Return an equivalent, shorter rule list for the kernel to evaluate.
+
+    Disabled rules and rules that can never match (see analyze) are dropped
+    and mergeable rules are combined, repeating until nothing changes. Every
+    packet gets the same verdict from the result as from the input under
+    first-match semantics. Merges within one pass span disjoint stretches of
+    the list, so each keeps the safety guarantee it was checked with.
+
+    The input rules are not modified; the result holds copies numbered
+    from 1.
+    """
+    rules = list(rules)
+    ruleset = as_ruleset(rules)
+    boxes = rule_boxes(ruleset)
+    result = OptimizationResult(rules=[], original_count=len(rules),
+                                disabled_removed=len(rules) - len(boxes))
+    # Current rule for every live position; merged rules get widened copies
+    current = {box.index: rules[box.index] for box in boxes}
+
+    while result.passes < max_passes:
+        result.passes += 1
+        changed = False
+        groups = group_boxes(boxes)
+        boxes = []
+        for group in groups:
+            index = BoxIndex(group)
+            live = [box for box in group if find_covering(index, box) is None]
+            result.dead_removed += len(group) - len(live)
+            changed |= len(live) != len(group)
+
+            merged_boxes = _apply_merges(live, current)
+            result.merged += len(live) - len(merged_boxes)
+            changed |= len(merged_boxes) != len(live)
+            boxes.extend(merged_boxes)
+
+        boxes.sort(key=lambda box: box.index)
+        if not changed:
+            break
+
+    result.rules = [replace(current[box.index], id=position + 1)
+                    for position, box in enumerate(boxes)]
+    return result
+
+
+def _apply_merges(boxes, current):
+    """Apply a set of merges with pairwise disjoint index spans"""
+    # Only boxes of one family are paired, so merged address ranges stay in it
+    candidates = merge_candidates(boxes, BoxIndex(boxes))
+    # Prefer short spans: they are the least likely to block other merges
+    candidates.sort(key=lambda pair: (pair[1].index - pair[0].index, pair[0].index))
+
+    taken = []
+    merged = {}
+    removed = set()
+    for earlier, later, dimension in candidates:
+        if any(earlier.index <= end and start <= later.index for start, end in taken):
+            continue
+        taken.append((earlier.index, later.index))
+
+        low_field, high_field = DIMENSIONS[dimension]
+        low = min(earlier[low_field], later[low_field])
+        high = max(earlier[high_field], later[high_field])
+        merged[earlier.index] = earlier._replace(**{
+            earlier._fields[low_field]: low, earlier._fields[high_field]: high})
+        removed.add(later.index)
+
+        start_field, end_field = _DIMENSION_RULE_FIELDS[dimension]
+        if dimension in _ADDRESS_DIMENSIONS:
+            low, high = key_to_address(low), key_to_address(high)
+        current[earlier.index] = replace(current[earlier.index],
+                                         **{start_field: low, end_field: high})
+        del current[later.index]
+
+    return [merged.get(box.index, box) for box in boxes if box.index not in removed]
@@ -0,0 +1,221 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from operator import itemgetter
+from firewall_ui.models.ruleset import RuleSet, PROTOCOL_ANY, FLAG_ENABLED
+
+# A rule seen as a box in (source address, source port, destination address,
+# destination port) space, plus the fields that must agree for two rules to
+# see the same packets. index is the rule's position in the ordered list.
+# IPv4 and IPv6 keys share one 128-bit space, so family, the (source,
+# destination) IP versions, keeps an IPv6 range from holding IPv4 packets.
+Box = namedtuple('Box', [
+    'index', 'direction', 'protocol', 'action', 'family',
+    'source_low', 'source_high', 'source_port_low', 'source_port_high',
+    'destination_low', 'destination_high', 'destination_port_low', 'destination_port_high',
+])
+
+# (low field, high field) positions of every dimension inside a Box
+DIMENSIONS = ((5, 6), (7, 8), (9, 10), (11, 12))
+# The families a packet can have; a rule mixing versions matches nothing
+PACKET_FAMILIES = ((4, 4), (6, 6))
+DIMENSION_NAMES = ("source address", "source port", "destination address", "destination port")
+
+
+def as_ruleset(rules):
+    return rules if isinstance(rules, RuleSet) else RuleSet(rules)
+
+
+def rule_boxes(rules):
+    """
+    Return the Box of every enabled rule, in rule order.
+
+    Disabled rules never match a packet, so they are left out; Box.index
+    still refers to the rule's position in the full list.
+    """
+    ruleset = as_ruleset(rules)
+    source_port_low, source_port_high, destination_port_low, destination_port_high = \
+        ruleset.port_bounds()
+    families = zip(ruleset.source_start.versions(), ruleset.destination_start.versions())
+    columns = zip(
+        range(len(ruleset)), ruleset.flags, ruleset.directions, ruleset.protocols,
+        ruleset.actions, families, ruleset.source_start.keys(), ruleset.source_end.keys(),
+        source_port_low, source_port_high,
+        ruleset.destination_start.keys(), ruleset.destination_end.keys(),
+        destination_port_low, destination_port_high)
+    return [Box(index, *fields) for index, flags, *fields in columns if flags & FLAG_ENABLED]
+
+
+def group_boxes(boxes):
+    """
+    Split boxes by direction and family, keeping their order. Boxes of
+    different groups never match the same packet.
+    """
+    groups = defaultdict(list)
+    for box in boxes:
+        groups[box.direction, box.family].append(box)
+    return list(groups.values())
+
+
+def protocols_overlap(a, b):
+    return a == b or a == PROTOCOL_ANY or b == PROTOCOL_ANY
+
+
+def covers(outer, inner):
+    """True if every packet matched by inner is also matched by outer"""
+    return (outer.direction == inner.direction
+            and outer.family == inner.family
+            and (outer.protocol == PROTOCOL_ANY or outer.protocol == inner.protocol)
+            and outer.source_low <= inner.source_low and inner.source_high <= outer.source_high
+            and outer.source_port_low <= inner.source_port_low
+            and inner.source_port_high <= outer.source_port_high
+            and outer.destination_low <= inner.destination_low
+            and inner.destination_high <= outer.destination_high
+            and outer.destination_port_low <= inner.destination_port_low
+            and inner.destination_port_high <= outer.destination_port_high)
+
+
+def intersects(a, b):
+    """True if some packet is matched by both a and b"""
+    return (a.direction == b.direction
+            and a.family == b.family
+            and protocols_overlap(a.protocol, b.protocol)
+            and a.source_low <= b.source_high and b.source_low <= a.source_high
+            and a.source_port_low <= b.source_port_high and b.source_port_low <= a.source_port_high
+            and a.destination_low <= b.destination_high and b.destination_low <= a.destination_high
+            and a.destination_port_low <= b.destination_port_high
+            and b.destination_port_low <= a.destination_port_high)
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over boxes along one dimension.
+
+    stab(x) yields every box whose [low, high] range contains x in
+    O(log n + k) for k results.
+    """
+
+    LEAF_SIZE = 16
+
+    def __init__(self, boxes, low_field, high_field):
+        self._low = itemgetter(low_field)
+        self._high = itemgetter(high_field)
+        self._root = self._build(sorted(boxes, key=self._low))
+
+    def _build(self, boxes):
+        """Build a subtree from boxes sorted by range start"""
+        if len(boxes) <= self.LEAF_SIZE:
+            return (None, boxes, None, None, None) if boxes else None
+        low = self._low
+        high = self._high
+        center = low(boxes[len(boxes) // 2])
+        left, here, right = [], [], []
+        for box in boxes:
+            if high(box) < center:
+                left.append(box)
+            elif low(box) > center:
+                right.append(box)
+            else:
+                here.append(box)
+        by_high = sorted(here, key=high, reverse=True)
+        return (center, here, by_high, self._build(left), self._build(right))
+
+    def stab(self, x):
+        low = self._low
+        high = self._high
+        node = self._root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if center is None:
+                for box in by_low:
+                    if low(box) <= x <= high(box):
+                        yield box
+                return
+            if x < center:
+                # Everything here reaches center > x, so only low matters
+                for box in by_low:
+                    if low(box) > x:
+                        break
+                    yield box
+                node = left
+            elif x > center:
+                for box in by_high:
+                    if high(box) < x:
+                        break
+                    yield box
+                node = right
+            else:
+                yield from by_low
+                return
+
+
+class BoxIndex:
+    """
+    Per-dimension interval index over a set of boxes.
+
+    Each dimension keeps its sorted range starts and ends, which give the
+    exact number of boxes containing a point with two binary searches, and
+    an IntervalTree to enumerate them. Queries count candidates in every
+    dimension and only enumerate the most selective one, so their cost
+    follows the number of genuinely overlapping rules.
+    """
+
+    def __init__(self, boxes):
+        self.boxes = list(boxes)
+        self._dimensions = []
+        for low_field, high_field in DIMENSIONS:
+            by_low = sorted(self.boxes, key=itemgetter(low_field))
+            self._dimensions.append((
+                low_field, high_field,
+                [box[low_field] for box in by_low], by_low,
+                sorted(box[high_field] for box in self.boxes),
+            ))
+        # Interval trees are built on first use: most queries end up
+        # enumerating the same one or two selective dimensions
+        self._trees = [None] * len(DIMENSIONS)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def containing(self, box):
+        """Yield the boxes that cover box"""
+        if not self.boxes:
+            return
+        best = None
+        for dimension, (low_field, high_field, lows, by_low, highs) in enumerate(self._dimensions):
+            point = box[low_field]
+            count = bisect_right(lows, point) - bisect_left(highs, point)
+            if best is None or count < best[0]:
+                best = (count, dimension, point)
+        _, dimension, point = best
+        for candidate in self._tree(dimension).stab(point):
+            if covers(candidate, box):
+                yield candidate
+
+    def overlapping(self, box):
+        """Yield the boxes that intersect box"""
+        if not self.boxes:
+            return
+        best = None
+        for dimension, (low_field, high_field, lows, by_low, highs) in enumerate(self._dimensions):
+            # Ranges meeting [low, high] either contain low or start inside (low, high]
+            low, high = box[low_field], box[high_field]
+            first_inside = bisect_right(lows, low)
+            last_inside = bisect_right(lows, high)
+            count = (first_inside - bisect_left(highs, low)) + (last_inside - first_inside)
+            if best is None or count < best[0]:
+                best = (count, dimension, low, by_low, first_inside, last_inside)
+        _, dimension, low, by_low, first_inside, last_inside = best
+        for candidate in self._tree(dimension).stab(low):
+            if intersects(candidate, box):
+                yield candidate
+        for position in range(first_inside, last_inside):
+            candidate = by_low[position]
+            if intersects(candidate, box):
+                yield candidate
+
+    def _tree(self, dimension):
+        tree = self._trees[dimension]
+        if tree is None:
+            low_field, high_field = DIMENSIONS[dimension]
+            tree = self._trees[dimension] = IntervalTree(self.boxes, low_field, high_field)
+        return tree
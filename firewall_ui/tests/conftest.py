@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def runtime_files(tmp_path_factory):
+    """Point the log, metrics and snapshot files at a temporary directory"""
+    directory = tmp_path_factory.mktemp("runtime")
+    patch = pytest.MonkeyPatch()
+    patch.setattr("firewall_ui.utils.logger.LOG_FILE", str(directory / "logs" / "firewall.log"))
+    patch.setattr("firewall_ui.utils.logger.EVENT_LOG_FILE", str(directory / "logs" / "events.bin"))
+    patch.setattr("firewall_ui.ui.main_window.METRICS_FILE", str(directory / "logs" / "metrics.prom"))
+    patch.setattr("firewall_ui.ui.main_window.RULESET_SNAPSHOT_FILE",
+                  str(directory / "cache" / "ruleset.snapshot"))
+    yield directory
+    patch.undo()
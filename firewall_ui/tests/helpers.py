@@ -0,0 +1,46 @@
+"""Builders shared by the test modules"""
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.policy.diff import apply_delta
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.kernel_comm import KernelCommunicator
+
+
+def make_rule(rule_id=1, source="192.168.1.1", destination="10.0.0.1",
+              port_start=80, port_end=443, **kwargs):
+    """A TCP inbound accept rule; kwargs set any other Rule field"""
+    fields = dict(
+        id=rule_id,
+        source_address_start=source,
+        source_address_end=source,
+        source_port_start=None,
+        source_port_end=None,
+        destination_address_start=destination,
+        destination_address_end=destination,
+        destination_port_start=port_start,
+        destination_port_end=port_end,
+        protocol=Protocol.TCP,
+        action=Action.ACCEPT,
+        direction=Direction.INBOUND
+    )
+    fields.update(kwargs)
+    return Rule(**fields)
+
+
+def make_rules(count):
+    """Rules 1 to count, each with its own port and description"""
+    return [make_rule(i, port_start=i, port_end=i, description=f"rule {i}")
+            for i in range(1, count + 1)]
+
+
+def connect(capabilities, wire_format="auto", **options):
+    """A KernelCommunicator talking to a new FakeKernel, with small chunks"""
+    kernel = FakeKernel(capabilities, chunk_size=4096, **options)
+    communicator = KernelCommunicator(wire_format, socket_factory=kernel.connect)
+    communicator.CHUNK_SIZE = 4096
+    return communicator, kernel
+
+
+def apply(old, new, delta):
+    """Apply delta to the keys old, taking changed keys from new"""
+    changed = [target for _, target in delta.updates] + delta.inserts
+    return apply_delta(old, delta, {position: new[position] for position in changed})
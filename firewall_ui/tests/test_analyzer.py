@@ -0,0 +1,83 @@
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.policy.analyzer import analyze, SHADOWED, REDUNDANT, MERGEABLE
+from firewall_ui.tests import helpers
+
+
+def make_rule(source_start, source_end, action=Action.ACCEPT, port_start=80, port_end=80,
+              **kwargs):
+    return helpers.make_rule(0, source_start, "10.0.0.1", port_start, port_end,
+                             source_address_end=source_end, action=action, **kwargs)
+
+
+class TestAnalyzer(unittest.TestCase):
+    def kinds(self, report):
+        return [(finding.kind, finding.rule, finding.other) for finding in report.findings]
+
+    def test_shadowed_and_redundant(self):
+        rules = [
+            make_rule("192.168.0.0", "192.168.255.255", protocol=Protocol.ANY),
+            make_rule("192.168.1.0", "192.168.1.255", action=Action.DROP),
+            make_rule("192.168.2.0", "192.168.2.255"),
+            make_rule("172.16.0.0", "172.16.0.255"),
+        ]
+        report = analyze(rules)
+
+        self.assertEqual(self.kinds(report), [(SHADOWED, 1, 0), (REDUNDANT, 2, 0)])
+        self.assertEqual(report.dead_rules(), {1, 2})
+
+    def test_later_wider_rule_does_not_shadow(self):
+        rules = [
+            make_rule("192.168.1.0", "192.168.1.255", action=Action.DROP),
+            make_rule("192.168.0.0", "192.168.255.255"),
+        ]
+        self.assertEqual(analyze(rules).findings, [])
+
+    def test_direction_protocol_and_enabled_are_respected(self):
+        rules = [
+            make_rule("0.0.0.0", "255.255.255.255", direction=Direction.OUTBOUND),
+            make_rule("0.0.0.0", "255.255.255.255", protocol=Protocol.UDP),
+            make_rule("0.0.0.0", "255.255.255.255", enabled=False),
+            make_rule("10.0.0.0", "10.0.0.255", action=Action.DROP),
+        ]
+        self.assertEqual(analyze(rules).findings, [])
+
+    def test_families_are_kept_apart(self):
+        rules = [
+            make_rule("::", "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff", action=Action.DROP,
+                      destination_address_start="::",
+                      destination_address_end="ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff"),
+            make_rule("10.0.0.0", "10.0.0.255"),
+            make_rule("::ffff:10.0.0.0", "::ffff:10.0.0.255", action=Action.DROP,
+                      destination_address_start="::ffff:10.0.0.1",
+                      destination_address_end="::ffff:10.0.0.1"),
+        ]
+        # Rule 3 is an IPv6 rule inside rule 1, whatever its keys share with rule 2
+        self.assertEqual(self.kinds(analyze(rules)), [(REDUNDANT, 2, 0)])
+
+    def test_mergeable_ranges(self):
+        rules = [
+            make_rule("10.1.0.0", "10.1.0.255", port_start=80, port_end=80),
+            make_rule("10.1.0.0", "10.1.0.255", port_start=81, port_end=443),
+            make_rule("10.1.0.0", "10.1.0.255", port_start=1000, port_end=2000),
+        ]
+        self.assertEqual(self.kinds(analyze(rules)), [(MERGEABLE, 1, 0)])
+
+    def test_merge_blocked_by_conflicting_rule_in_between(self):
+        rules = [
+            make_rule("10.1.0.0", "10.1.0.255"),
+            make_rule("10.1.1.0", "10.1.1.10", action=Action.DROP),
+            make_rule("10.1.1.0", "10.1.1.255"),
+        ]
+        self.assertEqual(analyze(rules).mergeable, [])
+
+    def test_ipv6_ranges(self):
+        rules = [
+            make_rule("2001:db8::", "2001:db8::ffff"),
+            make_rule("2001:db8::10", "2001:db8::20", action=Action.DROP),
+            make_rule("10.0.0.0", "10.0.0.255", action=Action.DROP),
+        ]
+        self.assertEqual(self.kinds(analyze(rules)), [(SHADOWED, 1, 0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from firewall_ui import cli
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.logger import FirewallLogger
+from firewall_ui.tests.helpers import make_rule
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "kernel.sock")
+        self.kernel = FakeKernel()
+        self.kernel.serve(self.socket_path)
+        self.addCleanup(self.kernel.close)
+        self.rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 201)]
+        self.rule_file = self.write_rules("rules.json", [rule.to_dict() for rule in self.rules])
+        # main() quiets the shared console log handler; give it back to other tests
+        console = FirewallLogger().console_handler
+        self.addCleanup(console.setLevel, console.level)
+
+    def write_rules(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as rule_file:
+            json.dump(data, rule_file)
+        return path
+
+    def run_cli(self, *args):
+        """Run the CLI with --json and return (exit status, printed object)"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = cli.main(["--json", "--socket", self.socket_path, *args])
+        result = json.loads(output.getvalue())
+        self.assertEqual(result["status"], status)
+        return status, result
+
+    def test_apply_get_and_diff(self):
+        self.assertEqual(self.run_cli("apply", self.rule_file), (cli.EXIT_OK, {
+            "status": 0, "rules": 200, "applied": 200}))
+        self.assertEqual(self.kernel.configs_received, 1)
+
+        status, result = self.run_cli("get")
+        self.assertEqual(status, cli.EXIT_OK)
+        self.assertEqual(result["rules"], [rule.to_dict() for rule in self.rules])
+
+        self.assertEqual(self.run_cli("diff", self.rule_file)[0], cli.EXIT_OK)
+        changed = [rule.to_dict() for rule in self.rules[1:]]
+        changed[0]["description"] = "changed"
+        status, result = self.run_cli("diff", self.write_rules("changed.json", changed))
+        self.assertEqual(status, cli.EXIT_DIFFERENT)
+        self.assertEqual((result["deleted"], result["updated"]), (1, 1))
+
+        status, result = self.run_cli("diff", "--window", "1",
+                                      self.write_rules("reversed.json", changed[::-1]))
+        self.assertEqual((status, result.get("window_exceeded")), (cli.EXIT_DIFFERENT, True))
+        self.assertNotIn("inserted", result)
+
+    def test_invalid_rules_are_not_sent(self):
+        data = [rule.to_dict() for rule in self.rules]
+        data[3]["source_address_start"] = "not an address"
+        path = self.write_rules("invalid.json", data)
+        for command in ("validate", "apply"):
+            status, result = self.run_cli(command, path)
+            self.assertEqual(status, cli.EXIT_INVALID)
+            self.assertIn("Rule 4", result["error"])
+        self.assertEqual(self.kernel.messages_received, 0)
+        self.assertEqual(self.run_cli("validate", self.rule_file)[0], cli.EXIT_OK)
+
+    def test_rule_file_formats(self):
+        self.assertEqual(self.run_cli("apply", self.rule_file)[0], cli.EXIT_OK)
+        for name, file_format in (("rules.csv", "csv"), ("rules.rules", "iptables")):
+            path = os.path.join(self.directory, name)
+            self.assertEqual(self.run_cli("get", "-o", path)[0], cli.EXIT_OK)
+            self.assertEqual(self.run_cli("diff", path)[0], cli.EXIT_OK)
+            self.assertEqual(self.run_cli("validate", path), (cli.EXIT_OK, {
+                "status": 0, "rules": 200, "format": file_format}))
+        status, result = self.run_cli("--format", "csv", "validate", self.rule_file)
+        self.assertEqual(status, cli.EXIT_INVALID)
+        self.assertIn("lacks the columns", result["error"])
+
+    def test_kernel_failures(self):
+        self.kernel.fail_next()
+        self.assertEqual(self.run_cli("apply", self.rule_file)[0], cli.EXIT_REJECTED)
+        self.kernel.close()
+        status, result = self.run_cli("get")
+        self.assertEqual(status, cli.EXIT_UNAVAILABLE)
+
+    def test_no_qt_imports(self):
+        # Nor the socket module, which validate has no use for
+        code = ("import sys; from firewall_ui.cli import main; "
+                f"status = main(['validate', {self.rule_file!r}]); "
+                "sys.exit(10 if any(name.startswith('PyQt') or name == 'socket' "
+                "for name in sys.modules) else status)")
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        # Run from the temporary directory so its logs are written there
+        result = subprocess.run([sys.executable, "-c", code], cwd=self.directory,
+                                env=dict(os.environ, PYTHONPATH=root), capture_output=True)
+        self.assertEqual(result.returncode, cli.EXIT_OK, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
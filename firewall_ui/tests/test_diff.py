@@ -0,0 +1,48 @@
+import random
+import unittest
+from firewall_ui.policy.diff import diff_rules, rule_key
+from firewall_ui.tests.helpers import apply, make_rule
+
+
+class TestDiff(unittest.TestCase):
+    def test_single_changes(self):
+        old = [rule_key(make_rule(i, port_start=i, port_end=i)) for i in range(1000)]
+
+        new = list(old)
+        new[500] = rule_key(make_rule(500, description="changed"))
+        delta = diff_rules(old, new)
+        self.assertEqual((delta.updates, delta.size), ([(500, 500)], 1))
+
+        new = old[:10] + old[11:600] + [old[10]] + old[600:]
+        delta = diff_rules(old, new)
+        self.assertEqual((delta.moves, delta.size), ([(10, 599)], 1))
+
+        new = old[:300] + old[305:]
+        self.assertEqual(diff_rules(old, new).deletes, [300, 301, 302, 303, 304])
+        self.assertTrue(diff_rules(old, old).empty)
+
+    def test_window_limit(self):
+        old = list(range(100))
+        self.assertIsNone(diff_rules(old, list(reversed(old)), max_window=50))
+
+    def test_random_edits_apply(self):
+        generator = random.Random(7)
+        for _ in range(500):
+            old = [generator.randrange(30) for _ in range(generator.randrange(40))]
+            new = list(old)
+            for _ in range(generator.randrange(6)):
+                operation = generator.randrange(4)
+                if operation == 0 and new:
+                    new.pop(generator.randrange(len(new)))
+                elif operation == 1:
+                    new.insert(generator.randrange(len(new) + 1), generator.randrange(30))
+                elif operation == 2 and new:
+                    new[generator.randrange(len(new))] = generator.randrange(30)
+                elif operation == 3 and new:
+                    value = new.pop(generator.randrange(len(new)))
+                    new.insert(generator.randrange(len(new) + 1), value)
+            self.assertEqual(apply(old, new, diff_rules(old, new)), new)
+
+
+if __name__ == '__main__':
+    unittest.main()
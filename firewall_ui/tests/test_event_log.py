@@ -0,0 +1,184 @@
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import unittest
+from dataclasses import replace
+from firewall_ui.utils.event_log import (EventLogHandler, EventLogReader, EVENT_TYPES, HEADER,
+                                         RECORD, event, main)
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.utils.logger import FirewallLogger
+from firewall_ui.utils.wire_format import encode_rules
+from firewall_ui.tests.helpers import connect, make_rule
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "events.bin")
+        self.handler = EventLogHandler(self.path)
+        self.addCleanup(self.handler.close)
+
+    def log(self, created, level=logging.INFO, **extra):
+        record = logging.makeLogRecord({'levelno': level, 'msg': "message",
+                                        'created': created, **extra})
+        self.handler.handle(record)
+
+    def test_only_event_records_are_written(self):
+        self.log(100.0)
+        self.log(101.0, **event("apply", rule_id=7, latency=0.25, payload_size=4096))
+        self.log(102.0, level=logging.ERROR, **event("timeout"))
+        # A record that reaches the writer late does not go back in time
+        self.log(101.5, **event("get_config"))
+        self.handler.flush_batch()
+
+        with EventLogReader(self.path) as reader:
+            events = list(reader.query())
+        self.assertEqual([(e.timestamp, e.event) for e in events],
+                         [(101.0, "apply"), (102.0, "timeout"), (102.0, "get_config")])
+        self.assertEqual(events[0][1:], (logging.INFO, "apply", 7, 0.25, 4096))
+        self.assertEqual(events[1][1:], (logging.ERROR, "timeout", None, None, None))
+
+    def test_query_matches_full_scan(self):
+        generator = random.Random(1)
+        expected = []
+        for number in range(10000):
+            name = generator.choice(EVENT_TYPES)
+            latency = generator.random() if generator.random() < 0.9 else None
+            level = generator.choice([logging.INFO, logging.WARNING, logging.ERROR])
+            self.log(1000.0 + number, level, **event(name, number % 50, latency, number))
+            expected.append((1000.0 + number, level, name, number % 50, latency, number))
+        self.handler.flush_batch()
+
+        with EventLogReader(self.path) as reader:
+            self.assertEqual(len(reader), 10000)
+            found = list(reader.query(since=3000.5, until=7000, events=["apply", "timeout"],
+                                      min_latency=0.5, min_level=logging.WARNING))
+            self.assertEqual(found, [
+                record for record in expected
+                if 3000.5 <= record[0] < 7000 and record[2] in ("apply", "timeout")
+                and record[4] is not None and record[4] >= 0.5 and record[1] >= logging.WARNING])
+            self.assertEqual([record.payload_size for record in reader.query(rule_id=3, until=1200)],
+                             [3, 53, 103, 153])
+            self.assertEqual(list(reader.query(since=20000)), [])
+
+    def test_partial_record_is_ignored(self):
+        self.log(1.0, **event("apply"))
+        self.handler.flush_batch()
+        with open(self.path, 'ab') as log_file:
+            log_file.write(b'\x00' * (RECORD.size // 2))
+        with EventLogReader(self.path) as reader:
+            self.assertEqual(len(reader), 1)
+
+        with open(self.path, 'r+b') as log_file:
+            log_file.write(b'NOPE')
+        with self.assertRaises(ValueError):
+            EventLogReader(self.path)
+
+    def test_reopened_file_is_appended_to(self):
+        self.log(1.0, **event("apply"))
+        self.handler.close()
+        handler = EventLogHandler(self.path)
+        handler.handle(logging.makeLogRecord({'levelno': logging.ERROR, 'created': 2.0,
+                                             **event("timeout")}))
+        handler.close()
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 2 * RECORD.size)
+
+    def test_reopening_cuts_partial_record(self):
+        self.log(5.0, **event("apply"))
+        self.handler.close()
+        with open(self.path, 'ab') as log_file:
+            log_file.write(b'\xff' * (RECORD.size // 2))
+
+        handler = EventLogHandler(self.path)
+        # Earlier than the last record, so clamped to keep the file sorted
+        handler.handle(logging.makeLogRecord({'levelno': logging.ERROR, 'created': 2.0,
+                                             **event("timeout")}))
+        handler.close()
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 2 * RECORD.size)
+        with EventLogReader(self.path) as reader:
+            self.assertEqual([(e.timestamp, e.event) for e in reader.query()],
+                             [(5.0, "apply"), (5.0, "timeout")])
+
+    def test_unsorted_file_is_scanned(self):
+        # Two writers on one file, each sorted on its own
+        self.handler.flush_batch()
+        other = EventLogHandler(self.path)
+        self.addCleanup(other.close)
+        for number in range(1, 6):
+            self.log(10.0 * number, **event("apply", payload_size=number))
+        self.handler.flush_batch()
+        other.handle(logging.makeLogRecord({'levelno': logging.INFO, 'created': 25.0,
+                                           **event("timeout")}))
+        other.flush_batch()
+
+        with EventLogReader(self.path) as reader:
+            self.assertFalse(reader.is_sorted())
+            self.assertEqual([(e.timestamp, e.event) for e in reader.query(since=20, until=35)],
+                             [(20.0, "apply"), (30.0, "apply"), (25.0, "timeout")])
+            self.assertEqual(len(list(reader.query(until=10))), 0)
+
+    def test_command_line(self):
+        for number in range(10):
+            self.log(1000.0 + number, **event("apply", latency=number / 10, payload_size=number))
+        self.handler.flush_batch()
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main([self.path, "--event", "apply", "--min-latency", "500", "--json",
+                  "--since", "1970-01-01T00:00:00+00:00"])
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([e['payload_size'] for e in events], [5, 6, 7, 8, 9])
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main([self.path, "--min-latency", "500", "--count"])
+        self.assertEqual(output.getvalue(), "5\n")
+
+    def test_kernel_operations_are_recorded(self):
+        manager = FirewallLogger()
+        manager.add_sink(self.handler)
+        try:
+            communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART)
+            self.addCleanup(communicator.close)
+            rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 501)]
+            self.assertEqual(communicator.send_config(rules), (True, None, None))
+            self.assertIsNone(communicator.get_current_config()[1])
+            manager.listener.queue.join()
+        finally:
+            manager.remove_sink(self.handler)
+
+        with EventLogReader(self.path) as reader:
+            events = {record.event: record for record in reader.query()}
+        self.assertEqual(events["apply"].payload_size, len(kernel.stored))
+        self.assertGreater(events["apply"].latency, 0)
+        self.assertIn("get_config", events)
+        self.assertGreater(events["request"].latency, 0)
+
+    def test_validation_failure_names_the_rule(self):
+        manager = FirewallLogger()
+        manager.add_sink(self.handler)
+        try:
+            communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA)
+            self.addCleanup(communicator.close)
+            rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 101)]
+            self.assertEqual(communicator.send_config(rules), (True, None, None))
+            # Changed behind the communicator's back, so the delta read back differs
+            stored = list(rules)
+            stored[41] = replace(stored[41], destination_port_end=9999)
+            kernel.stored = encode_rules(stored)
+            rules[5] = replace(rules[5], description="changed")
+            self.assertIsNotNone(communicator.send_config(rules)[2])
+            manager.listener.queue.join()
+        finally:
+            manager.remove_sink(self.handler)
+
+        with EventLogReader(self.path) as reader:
+            failures = list(reader.query(events=["validation_failed"]))
+        self.assertEqual([record.rule_id for record in failures], [42])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from firewall_ui.utils import kernel_comm
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.tests.helpers import make_rule
+
+
+class TestFakeKernel(unittest.TestCase):
+    def setUp(self):
+        self.rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 301)]
+
+    def communicator(self, kernel, wire_format="auto"):
+        self.addCleanup(kernel.close)
+        communicator = KC(wire_format, socket_factory=kernel.connect)
+        self.addCleanup(communicator.close)
+        return communicator
+
+    def test_config_is_stored_and_converted(self):
+        kernel = FakeKernel(chunk_size=1024, reverse_chunks=True)
+        binary = self.communicator(kernel)
+        self.assertEqual(binary.send_config(self.rules), (True, None, None))
+        self.assertEqual(kernel.rules(), self.rules)
+
+        # A second client reading JSON sees the binary push
+        json_client = self.communicator(kernel, wire_format="json")
+        config, error = json_client.get_current_config()
+        self.assertIsNone(error)
+        self.assertEqual(config, [rule.to_dict() for rule in self.rules])
+
+    def test_latency(self):
+        kernel = FakeKernel(latency=0.02)
+        communicator = self.communicator(kernel)
+        communicator.get_current_config()
+        stats = communicator.latency_stats()
+        self.assertGreaterEqual(stats[KC.MSG_GET_CAPS].last, 0.02)
+        self.assertGreaterEqual(stats[KC.MSG_GET_CONFIG_BINARY].last, 0.02)
+
+    def test_injected_rejection(self):
+        kernel = FakeKernel()
+        communicator = self.communicator(kernel)
+        kernel.fail_next()
+        self.assertEqual(communicator.send_config(self.rules),
+                         (False, "Kernel rejected configuration", None))
+        self.assertEqual(kernel.stored, b'')
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+
+    def test_dropped_messages_time_out(self):
+        kernel = FakeKernel(drop_rate=1.0)
+        communicator = self.communicator(kernel)
+        communicator.SOCKET_TIMEOUT = 0.1
+        self.assertEqual(communicator.capabilities(), 0)
+        self.assertEqual(communicator.get_current_config(), (None, "Communication timeout"))
+
+    def test_reconnect_after_module_reload(self):
+        kernel = FakeKernel()
+        communicator = self.communicator(kernel)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.assertIsNotNone(communicator.applied_keys)
+
+        kernel.disconnect()
+        connections = communicator.session.connections
+        deadline = time.monotonic() + 2
+        while communicator.session.connections == connections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        # Nothing is known about the rules of a reloaded module, so the
+        # unchanged config is pushed again in full
+        self.assertEqual(kernel.configs_received, 2)
+
+    def test_unix_socket_server(self):
+        path = os.path.join(tempfile.mkdtemp(), "kernel.sock")
+        kernel = FakeKernel()
+        kernel.serve(path)
+        self.addCleanup(kernel.close)
+        with patch.object(kernel_comm, 'KERNEL_SOCKET_PATH', path):
+            communicator = KC()
+        self.addCleanup(communicator.close)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.assertEqual(communicator.get_current_config(),
+                         ([rule.to_dict() for rule in self.rules], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import random
+import tempfile
+import unittest
+from dataclasses import replace
+from unittest import mock
+from PyQt6.QtWidgets import QApplication, QMessageBox
+from firewall_ui.ui import main_window
+from firewall_ui.utils import kernel_comm
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.wire_format import encode_rules
+from firewall_ui.policy.diff import rule_key
+from firewall_ui.policy.history import RuleHistory
+from firewall_ui.ui.widgets.history_view import HistoryView
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.tests.helpers import apply, connect, make_rule, make_rules
+
+app = QApplication.instance() or QApplication([])
+
+
+def leaves(node):
+    if node.height == 0:
+        return {id(node)}
+    return set().union(*(leaves(child) for child in node.items))
+
+
+class TestRuleHistory(unittest.TestCase):
+    def setUp(self):
+        self.history = RuleHistory()
+        self.rules = make_rules(5000)
+
+    def test_record_and_read_back(self):
+        self.assertIsNone(self.history.latest)
+        first = self.history.record(self.rules, "Loaded")
+        second = self.history.record(self.rules[:10])
+        empty = self.history.record([])
+        self.assertEqual([first.number, second.number, empty.number], [1, 2, 3])
+        self.assertEqual((len(first), len(second), len(empty)), (5000, 10, 0))
+        self.assertEqual(self.history.rules(1), self.rules)
+        self.assertEqual(self.history.rules(3), [])
+        self.assertEqual(second.changes, "0 inserted, 4990 deleted, 0 moved, 0 updated")
+
+        history = RuleHistory(limit=2)
+        for count in range(5):
+            history.record(self.rules[:count])
+        self.assertEqual([version.number for version in history.versions], [4, 5])
+        self.assertEqual(history.rules(5), self.rules[:4])
+        with self.assertRaises(KeyError):
+            history.get(3)
+
+    def test_versions_share_unchanged_rules(self):
+        first = self.history.record(self.rules)
+        changed = list(self.rules)
+        changed[2500] = replace(changed[2500], description="changed")
+        del changed[100]
+        second = self.history.record(changed)
+        new_leaves = leaves(second.root) - leaves(first.root)
+        self.assertLessEqual(len(new_leaves), 4)
+        self.assertGreater(len(leaves(first.root)), 100)
+
+        # The same rules give the same tree, however they were recorded
+        third = self.history.record(self.history.rules(1))
+        self.assertIs(third.root, first.root)
+        self.assertTrue(self.history.diff(1, 3).empty)
+
+    def test_diff_between_any_versions(self):
+        generator = random.Random(3)
+        rules = self.rules[:1000]
+        self.history.record(rules)
+        for number in range(20):
+            rules = list(rules)
+            for _ in range(generator.randrange(1, 8)):
+                position = generator.randrange(len(rules))
+                operation = generator.randrange(4)
+                if operation == 0:
+                    rules.pop(position)
+                elif operation == 1:
+                    rules.insert(position, make_rule(0, description=f"new {number}"))
+                elif operation == 2:
+                    rules[position] = replace(rules[position], description=f"edit {number}")
+                else:
+                    rules.insert(generator.randrange(len(rules)), rules.pop(position))
+            self.history.record(rules)
+
+        keys = {version.number: [rule_key(rule) for rule in self.history.rules(version.number)]
+                for version in self.history.versions}
+        for old, new in ((1, 21), (21, 1), (5, 6), (10, 3), (7, 7)):
+            with self.subTest(old=old, new=new):
+                self.assertEqual(apply(keys[old], keys[new], self.history.diff(old, new)),
+                                 keys[new])
+
+        moved = self.history.record(self.rules[1:1000] + self.rules[:1])
+        delta = self.history.diff(1, moved.number)
+        self.assertEqual((delta.moves, delta.size), ([(0, 999)], 1))
+
+    def test_rollback_through_kernel_communicator(self):
+        communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA
+                                       | KC.CAP_DIGEST)
+        self.addCleanup(communicator.close)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.history.record(self.rules)
+        bad = [replace(rule, action=self.rules[0].action) for rule in self.rules[:100]]
+        self.assertEqual(communicator.send_config(bad), (True, None, None))
+        self.history.record(bad)
+
+        self.assertEqual(communicator.send_config(self.history.rules(1)), (True, None, None))
+        self.assertEqual(kernel.rules(), self.rules)
+
+
+class TestHistoryView(unittest.TestCase):
+    def test_roll_back_selected_version(self):
+        history = RuleHistory()
+        rules = make_rules(50)
+        history.record(rules, "Loaded from kernel module")
+        history.record(rules[:40], "Applied")
+        view = HistoryView(history)
+        view.refresh()
+        requested = []
+        view.rollback_requested.connect(requested.append)
+        self.assertEqual(view.model.rowCount(), 2)
+        self.assertEqual(view.model.data(view.model.index(0, 3)),
+                         "0 inserted, 10 deleted, 0 moved, 0 updated")
+
+        view.table.selectRow(0)
+        self.assertFalse(view.rollback_button.isEnabled())
+        view.table.selectRow(1)
+        self.assertTrue(view.rollback_button.isEnabled())
+        self.assertIn("10 inserted", view.summary_label.text())
+        view.rollback_button.click()
+        self.assertEqual(requested, [1])
+
+
+class TestHistoryWindow(unittest.TestCase):
+    def test_optimized_apply_records_and_rolls_back_table_rules(self):
+        kernel = FakeKernel()
+        # Each rule's port follows the last one's, so the optimizer merges them
+        rules = make_rules(20)
+        kernel.stored = encode_rules(rules)
+        socket_path = os.path.join(tempfile.mkdtemp(), "kernel.sock")
+        kernel.serve(socket_path)
+        self.addCleanup(kernel.close)
+        with mock.patch.object(main_window, "RULESET_SNAPSHOT_FILE", None), \
+                mock.patch.object(kernel_comm, "KERNEL_SOCKET_PATH", socket_path), \
+                mock.patch.object(QMessageBox, "information"):
+            window = main_window.MainWindow()
+            self.addCleanup(window.close)
+            window.kernel_started = True
+            window.connect_kernel()
+            self.wait(window)
+
+            edited = [replace(rule, description="") for rule in rules[:10]]
+            window.rule_table.set_rules(edited)
+            window.optimize_checkbox.setChecked(True)
+            window.apply_rules()
+            self.wait(window)
+            self.assertLess(len(kernel.rules()), len(edited))
+            self.assertEqual(window.rule_history.rules(2), edited)
+
+            window.rollback_to(1)
+            self.wait(window)
+
+        self.assertEqual(window.rule_table.get_all_rules(), rules)
+        self.assertEqual(window.rule_history.rules(3), rules)
+        self.assertEqual(window.rule_history.latest.note, "Rolled back to version 1")
+
+    @staticmethod
+    def wait(window):
+        app.processEvents()
+        while window.rules_loading or window.kernel_client.busy:
+            app.processEvents()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtTest import QSignalSpy
+from firewall_ui.ui.kernel_client import KernelClient
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.tests.helpers import connect, make_rule
+
+# A full QApplication, since other test modules create widgets
+app = QApplication.instance() or QApplication([])
+
+
+class TestKernelClient(unittest.TestCase):
+    def setUp(self):
+        self.communicator, self.kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART)
+        self.client = KernelClient(self.communicator)
+        self.rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 2001)]
+
+    def tearDown(self):
+        self.client.shutdown()
+        self.communicator.close()
+
+    def test_send_and_get_off_thread(self):
+        busy = QSignalSpy(self.client.busy_changed)
+        progress = QSignalSpy(self.client.progress)
+        sent = QSignalSpy(self.client.config_sent)
+        received = QSignalSpy(self.client.config_received)
+
+        self.client.send_config(self.rules)
+        self.client.get_config()
+        self.assertTrue(self.client.busy)
+        self.assertTrue(received.wait(5000))
+
+        self.assertEqual(sent[0], [True, None, None])
+        self.assertEqual(received[0], [[rule.to_dict() for rule in self.rules], None])
+        self.assertEqual([args[0] for args in busy], [True, False])
+        self.assertFalse(self.client.busy)
+        done, total = progress[len(progress) - 1]
+        self.assertEqual(done, total)
+
+    def test_optimize_off_thread(self):
+        optimized = QSignalSpy(self.client.config_optimized)
+        sent = QSignalSpy(self.client.config_sent)
+        self.client.send_config(self.rules, optimize=True)
+        self.assertTrue(sent.wait(5000))
+
+        result = optimized[0][0]
+        self.assertEqual(result.original_count, 2000)
+        self.assertLess(len(result.rules), 2000)
+        self.assertEqual(sent[0], [True, None, None])
+        self.assertEqual(self.kernel.rules(), result.rules)
+
+    def test_validate_rules_off_thread(self):
+        validated = QSignalSpy(self.client.rules_validated)
+        self.rules[41] = make_rule(42, port_start=443, port_end=80)
+        self.client.validate_rules(self.rules)
+        self.assertTrue(self.client.busy)
+        self.assertTrue(validated.wait(5000))
+
+        rules, report = validated[0]
+        self.assertIs(rules, self.rules)
+        self.assertEqual(sorted(report.errors), [41])
+        self.assertFalse(self.client.busy)
+        self.assertEqual(self.kernel.messages_received, 0)
+
+    def test_cancel(self):
+        sent = QSignalSpy(self.client.config_sent)
+        # Cancel as soon as the first chunk is acknowledged
+        self.communicator.on_progress = lambda done, total: self.client.cancel()
+        self.client.send_config(self.rules)
+        self.assertTrue(sent.wait(5000))
+        self.assertEqual(sent[0], [False, "Transfer cancelled", None])
+        self.assertFalse(self.communicator.cancel_event.is_set())
+        self.assertIsNone(self.communicator.applied_keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from dataclasses import replace
+from unittest.mock import patch
+from firewall_ui.models.rule import Action
+from firewall_ui.utils.fake_kernel import _Connection
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.utils.rule_digest import MerkleTree
+from firewall_ui.utils.wire_format import encode_rules
+from firewall_ui.tests.helpers import connect, make_rules
+
+
+class TestKernelCommunicator(unittest.TestCase):
+    def setUp(self):
+        self.rules = make_rules(2000)
+
+    def connect(self, capabilities, **options):
+        communicator, kernel = connect(capabilities, **options)
+        self.addCleanup(communicator.close)
+        return communicator, kernel
+
+    def check_round_trip(self, communicator):
+        success, error, validation_error = communicator.send_config(self.rules)
+        self.assertTrue(success, error)
+        self.assertIsNone(validation_error)
+        config, error = communicator.get_current_config()
+        self.assertIsNone(error)
+        self.assertEqual(config, [rule.to_dict() for rule in self.rules])
+
+    def test_multipart_binary(self):
+        communicator, kernel = self.connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART)
+        self.check_round_trip(communicator)
+        self.assertTrue(communicator.uses_binary_format())
+        self.assertGreater(kernel.chunks_received, KC.CHUNK_WINDOW)
+
+    def test_multipart_json(self):
+        communicator, kernel = self.connect(KC.CAP_MULTIPART, reverse_chunks=True)
+        self.check_round_trip(communicator)
+        self.assertFalse(communicator.uses_binary_format())
+        self.assertGreater(len(kernel.stored), 1024 * 128)
+
+    def test_single_message_without_multipart(self):
+        communicator, kernel = self.connect(0)
+        self.rules = self.rules[:20]
+        self.check_round_trip(communicator)
+        self.assertEqual(kernel.chunks_received, 0)
+
+    def test_delta_push(self):
+        communicator, kernel = self.connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA)
+        self.check_round_trip(communicator)
+        chunks = kernel.chunks_received
+
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.assertEqual(kernel.deltas_received, 0)
+
+        moved = self.rules.pop(10)
+        self.rules.insert(1500, moved)
+        self.rules[5] = replace(self.rules[5], action=Action.DROP)
+        del self.rules[700:705]
+        self.rules.insert(0, replace(self.rules[0], description="new"))
+        for position, rule in enumerate(self.rules):
+            rule.id = position + 1
+        self.check_round_trip(communicator)
+        self.assertEqual(kernel.deltas_received, 1)
+        self.assertEqual(kernel.chunks_received, chunks + 1)
+
+    def test_delta_push_is_read_back_without_digest(self):
+        communicator, kernel = self.connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA)
+        self.check_round_trip(communicator)
+        # Changed behind the communicator's back, so a delta lands on other rules
+        stored = list(self.rules)
+        stored[1234] = replace(stored[1234], destination_port_end=9999)
+        kernel.stored = encode_rules(stored)
+
+        self.rules[5] = replace(self.rules[5], action=Action.DROP)
+        self.assertEqual(communicator.send_config(self.rules),
+                         (True, None, "Rule mismatch for field destination_port_end: "
+                                      "sent 1235, received 9999"))
+        self.assertEqual(communicator.mismatch_rule_id, self.rules[1234].id)
+        self.assertEqual(kernel.deltas_received, 1)
+        self.assertIsNone(communicator.applied_keys)
+
+        self.check_round_trip(communicator)
+        self.assertEqual(kernel.deltas_received, 1)
+        self.assertEqual(kernel.rules(), self.rules)
+
+    def test_digest_validation(self):
+        communicator, kernel = self.connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DIGEST)
+        self.check_round_trip(communicator)
+        self.assertEqual(kernel.digest_requests, 1)
+
+        stored = kernel.rules()
+        stored[1234] = replace(stored[1234], destination_port_end=9999)
+        kernel.stored = encode_rules(stored)
+        self.assertEqual(communicator.validate_applied_config(self.rules),
+                         (False, "Rule mismatch at position 1235"))
+        self.assertEqual(communicator.mismatch_rule_id, self.rules[1234].id)
+        # Root and top node, then two children per level
+        self.assertEqual(kernel.digest_requests, 2 + 1 + MerkleTree.from_rules(stored).height - 1)
+
+        kernel.stored = encode_rules(self.rules[:1500])
+        self.assertEqual(communicator.validate_applied_config(self.rules),
+                         (False, "Config size mismatch: sent 2000, received 1500"))
+        self.assertIsNone(communicator.mismatch_rule_id)
+
+    def test_incomplete_transfer_is_an_error(self):
+        communicator, kernel = self.connect(KC.CAP_MULTIPART)
+
+        def send_first_chunk_only(connection, seq, msg_type, config):
+            connection.reply(seq, msg_type, KC.CHUNK_HEADER.pack(10, 0) + b'[]',
+                             flags=KC.NLM_F_MULTI)
+            connection.reply(seq, b'', nlmsg_type=KC.NLMSG_DONE)
+
+        with patch.object(_Connection, 'send_chunks', send_first_chunk_only):
+            config, error = communicator.get_current_config()
+        self.assertIsNone(config)
+        self.assertEqual(error, "Incomplete multipart transfer")
+
+
+if __name__ == '__main__':
+    unittest.main()
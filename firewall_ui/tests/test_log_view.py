@@ -0,0 +1,83 @@
+import logging
+import unittest
+from PyQt6.QtWidgets import QApplication
+from firewall_ui.ui.widgets.log_view import LogView, LogModel
+
+app = QApplication.instance() or QApplication([])
+
+
+def entries(count, start=0, level=logging.INFO):
+    return [(level, f"message {number}") for number in range(start, start + count)]
+
+
+class TestLogModel(unittest.TestCase):
+    def test_keeps_only_the_newest_entries(self):
+        model = LogModel(capacity=1000)
+        for start in range(0, 25000, 500):
+            model.append_entries(entries(500, start))
+        self.assertEqual(model.rowCount(), 1000)
+        self.assertEqual(model.data(model.index(0)), "message 24000")
+        self.assertEqual(model.data(model.index(999)), "message 24999")
+
+        # A batch bigger than the capacity keeps its tail
+        model.append_entries(entries(1500, 30000))
+        self.assertEqual(model.data(model.index(0)), "message 30500")
+
+    def test_level_filter(self):
+        model = LogModel(capacity=100)
+        model.append_entries(entries(10, level=logging.DEBUG) + entries(5, 10, logging.ERROR))
+        model.set_level(logging.WARNING)
+        self.assertEqual(model.rowCount(), 5)
+        model.append_entries(entries(10, 20, logging.DEBUG) + entries(1, 30, logging.WARNING))
+        self.assertEqual(model.rowCount(), 6)
+        model.set_level(logging.DEBUG)
+        self.assertEqual(model.rowCount(), 26)
+
+    def test_find_wraps_around(self):
+        model = LogModel(capacity=100)
+        model.append_entries(entries(20))
+        self.assertEqual(model.find("MESSAGE 1", start=2), 10)
+        self.assertEqual(model.find("message 5", start=6), 5)
+        self.assertEqual(model.find("message 1", start=9, backwards=True), 1)
+        self.assertEqual(model.find("message 19", start=0, backwards=True), 19)
+        self.assertEqual(model.find("missing"), -1)
+
+
+class TestLogView(unittest.TestCase):
+    def setUp(self):
+        self.view = LogView(capacity=500)
+        self.logger = logging.getLogger(f"test_log_view.{self.id()}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.handlers = [self.view.handler]
+
+    def test_records_are_inserted_in_batches(self):
+        inserts = []
+        self.view.model.rowsInserted.connect(lambda *args: inserts.append(args))
+        for number in range(2000):
+            self.logger.info("record %d", number)
+        self.assertEqual(self.view.model.rowCount(), 0)
+
+        self.view.refresh()
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.view.model.rowCount(), 500)
+        self.assertEqual(self.view.model.data(self.view.model.index(499)), "record 1999")
+
+    def test_incremental_search(self):
+        for number in range(100):
+            self.logger.info("record %d", number)
+        self.view.refresh()
+        self.view.search_edit.setText("record 4")
+        self.assertEqual(self.view.current_row(), 4)
+        # Refining the text keeps the match if it still fits
+        self.view.search_edit.setText("record 42")
+        self.assertEqual(self.view.current_row(), 42)
+        self.view.find_next()
+        self.assertEqual(self.view.current_row(), 42)
+        self.view.search_edit.setText("record 4")
+        self.view.find_next()
+        self.assertEqual(self.view.current_row(), 43)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import io
+import logging
+import os
+import queue
+import tempfile
+import unittest
+import uuid
+from firewall_ui.utils.kernel_comm import KernelCommunicator
+from firewall_ui.utils import logger as logger_module
+from firewall_ui.utils.logger import (FirewallLogger, AsyncQueueHandler, AsyncLogListener,
+                                      BatchedFileHandler)
+
+
+class Collector(logging.Handler):
+    def __init__(self, level=logging.DEBUG):
+        super().__init__(level)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class Payload:
+    """Stands in for a large config whose str() is expensive"""
+
+    def __init__(self):
+        self.conversions = 0
+
+    def __str__(self):
+        self.conversions += 1
+        return "payload"
+
+
+class TestAsyncLogging(unittest.TestCase):
+    def pipeline(self, *handlers, size=0):
+        log_queue = queue.Queue(size)
+        listener = AsyncLogListener(log_queue, *handlers)
+        logger = logging.getLogger(f"test_logger.{self.id()}")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = [AsyncQueueHandler(log_queue)]
+        return logger, listener
+
+    def test_messages_are_formatted_only_for_interested_sinks(self):
+        info, warning = Collector(logging.INFO), Collector(logging.WARNING)
+        logger, listener = self.pipeline(info, warning)
+        listener.start()
+        payload = Payload()
+        logger.debug("Sent config: %s", payload)
+        logger.warning("Sent config: %s", payload)
+        listener.stop()
+
+        self.assertEqual(payload.conversions, 1)
+        self.assertEqual(info.messages, ["Sent config: payload"])
+        self.assertEqual(warning.messages, ["Sent config: payload"])
+
+    def test_file_writes_are_batched(self):
+        path = os.path.join(tempfile.mkdtemp(), "firewall.log")
+        flushes = []
+
+        class CountingFileHandler(BatchedFileHandler):
+            def flush_batch(self):
+                flushes.append(1)
+                super().flush_batch()
+        handler = CountingFileHandler(path)
+        logger, listener = self.pipeline(handler)
+        # Queue everything before the writer starts so it sees one burst
+        for number in range(1000):
+            logger.info("record %d", number)
+        listener.start()
+        listener.stop()
+        handler.close()
+
+        with open(path) as log_file:
+            self.assertEqual(log_file.read().splitlines(),
+                             [f"record {number}" for number in range(1000)])
+        self.assertLessEqual(len(flushes), 1000 // AsyncLogListener.BATCH_SIZE + 2)
+
+    def test_debug_records_give_way_under_backpressure(self):
+        sink = Collector()
+        logger, listener = self.pipeline(sink, size=20)
+        for number in range(100):
+            logger.debug("debug %d", number)
+        handler = logger.handlers[0]
+        # Ten records fill half the queue, then one in ten of the other 90 is kept
+        self.assertEqual(handler.queue.qsize(), 19)
+
+        listener.start()
+        handler.queue.join()
+        logger.info("still here")
+        listener.stop()
+
+        self.assertEqual(len(sink.messages), 21)
+        self.assertEqual(sink.messages[-2:],
+                         ["Dropped 81 log records under load", "still here"])
+
+    def test_bad_format_arguments_do_not_stop_the_writer(self):
+        sink = Collector()
+        sink.handleError = lambda record: errors.append(record.msg)
+        errors = []
+        logger, listener = self.pipeline(sink)
+        listener.start()
+        logger.info("%d rules", "many")
+        logger.info("still here")
+        listener.stop()
+
+        self.assertEqual(errors, ["%d rules"])
+        self.assertEqual(sink.messages, ["still here"])
+
+    def test_stalled_writer_does_not_block_callers(self):
+        sink = Collector()
+        logger, listener = self.pipeline(sink, size=5)
+        handler = logger.handlers[0]
+        handler.PUT_TIMEOUT = 0.01
+        # Nothing takes records off the queue until the listener starts
+        for number in range(8):
+            logger.warning("warning %d", number)
+        self.assertEqual(handler.dropped, 3)
+
+        listener.start()
+        handler.queue.join()
+        logger.info("still here")
+        listener.stop()
+        self.assertEqual(sink.messages[-2:], ["Dropped 3 log records under load", "still here"])
+
+
+class TestFirewallLogger(unittest.TestCase):
+    def test_each_record_reaches_each_sink_once(self):
+        manager = FirewallLogger()
+        # Every component that used to add its own handlers
+        KernelCommunicator(socket_factory=socket_error).close()
+        self.assertIs(FirewallLogger(), manager)
+        self.assertEqual(len(manager.get_logger().handlers), 1)
+
+        extra = Collector()
+        manager.add_sink(extra)
+        console = next(handler for handler in manager.listener.handlers
+                       if type(handler) is logging.StreamHandler)
+        console_stream = io.StringIO()
+        stderr = console.setStream(console_stream)
+        try:
+            marker = uuid.uuid4().hex
+            FirewallLogger().get_logger().error("once %s", marker)
+            manager.listener.queue.join()
+        finally:
+            console.setStream(stderr)
+            manager.remove_sink(extra)
+
+        log_path = logger_module.LOG_FILE
+        for path in (log_path, os.path.join(os.path.dirname(log_path), "error.log")):
+            with open(path) as log_file:
+                self.assertEqual(log_file.read().count(marker), 1, path)
+        self.assertEqual(console_stream.getvalue().count(marker), 1)
+        self.assertEqual(sum(marker in message for message in extra.messages), 1)
+
+
+def socket_error():
+    raise OSError("No kernel module in tests")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import random
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.policy.matcher import CompiledMatcher
+from firewall_ui.tests import helpers
+
+
+def make_rule(source_start, source_end, port_start, port_end, action=Action.ACCEPT, **kwargs):
+    return helpers.make_rule(0, source_start, "192.168.0.0", port_start, port_end,
+                             source_address_end=source_end,
+                             destination_address_end="192.168.0.255", action=action, **kwargs)
+
+
+def linear_match(rules, source, source_port, destination, destination_port, protocol, direction):
+    """Straightforward first-match scan used as the reference"""
+    import ipaddress
+    for position, rule in enumerate(rules):
+        if not rule.enabled or rule.direction != direction:
+            continue
+        if rule.protocol != Protocol.ANY and rule.protocol != protocol:
+            continue
+        if not (ipaddress.ip_address(rule.source_address_start) <= ipaddress.ip_address(source)
+                <= ipaddress.ip_address(rule.source_address_end)):
+            continue
+        if not (ipaddress.ip_address(rule.destination_address_start)
+                <= ipaddress.ip_address(destination)
+                <= ipaddress.ip_address(rule.destination_address_end)):
+            continue
+        if not rule.destination_port_start <= destination_port <= rule.destination_port_end:
+            continue
+        return position
+    return -1
+
+
+class TestCompiledMatcher(unittest.TestCase):
+    def test_first_match_wins(self):
+        rules = [
+            make_rule("10.0.0.0", "10.0.0.255", 22, 22, action=Action.DROP),
+            make_rule("10.0.0.0", "10.255.255.255", 0, 65535, protocol=Protocol.ANY),
+            make_rule("0.0.0.0", "255.255.255.255", 0, 65535, action=Action.DROP),
+        ]
+        matcher = CompiledMatcher(rules)
+
+        rule, action = matcher.match("10.0.0.5", 4000, "192.168.0.1", 22,
+                                     Protocol.TCP, Direction.INBOUND)
+        self.assertIs(rule, rules[0])
+        self.assertEqual(action, Action.DROP)
+        self.assertEqual(matcher.match_position("10.1.0.5", 4000, "192.168.0.1", 22,
+                                                "UDP", "INBOUND"), 1)
+        self.assertEqual(matcher.match_position("11.0.0.1", 1, "192.168.0.1", 22,
+                                                Protocol.TCP, Direction.INBOUND), 2)
+        self.assertEqual(matcher.match("11.0.0.1", 1, "192.168.1.1", 22,
+                                       Protocol.TCP, Direction.INBOUND), (None, None))
+        self.assertEqual(matcher.match_position("10.0.0.5", 1, "192.168.0.1", 22,
+                                                Protocol.TCP, Direction.OUTBOUND), -1)
+
+    def test_other_protocols_only_match_any(self):
+        rules = [make_rule("10.0.0.0", "10.0.0.255", 0, 65535),
+                 make_rule("10.0.0.0", "10.0.0.255", 0, 65535, protocol=Protocol.ANY)]
+        matcher = CompiledMatcher(rules)
+        self.assertEqual(matcher.match_position("10.0.0.1", 0, "192.168.0.1", 0,
+                                                "ICMP", Direction.INBOUND), 1)
+
+    def test_packets_without_ports(self):
+        rules = [make_rule("10.0.0.0", "10.0.0.255", 22, 22, protocol=Protocol.ANY),
+                 make_rule("10.0.0.0", "10.0.0.255", 0, 65535, protocol=Protocol.ANY),
+                 make_rule("10.0.0.0", "10.0.0.255", None, None, protocol=Protocol.ANY)]
+        matcher = CompiledMatcher(rules)
+        packet = ("10.0.0.1", None, "192.168.0.1", None, "ICMP", Direction.INBOUND)
+        self.assertEqual(matcher.match_position(*packet), 1)
+        self.assertEqual(CompiledMatcher(rules[::2]).classify_many([packet]), [1])
+        self.assertEqual(CompiledMatcher(rules[:1]).classify_many([packet]), [-1])
+
+    def test_ipv4_mapped_ipv6_packets_skip_ipv4_rules(self):
+        rules = [make_rule("10.0.0.0", "10.0.0.255", 0, 65535)]
+        matcher = CompiledMatcher(rules)
+        packets = [("::ffff:10.0.0.1", 1, "::ffff:192.168.0.1", 80, Protocol.TCP,
+                    Direction.INBOUND),
+                   ("10.0.0.1", 1, "::ffff:192.168.0.1", 80, Protocol.TCP, Direction.INBOUND),
+                   ("10.0.0.1", 1, "192.168.0.1", 80, Protocol.TCP, Direction.INBOUND)]
+        self.assertEqual(matcher.classify_many(packets), [-1, -1, 0])
+        self.assertEqual(matcher.match_position(*packets[0]), -1)
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(42)
+        rules = []
+        for _ in range(300):
+            start = rng.randrange(64)
+            port = rng.randrange(100)
+            rules.append(make_rule(f"10.0.0.{start}", f"10.0.0.{start + rng.randrange(64)}",
+                                   port, port + rng.randrange(20),
+                                   action=rng.choice(list(Action)),
+                                   protocol=rng.choice(list(Protocol)),
+                                   direction=rng.choice(list(Direction)),
+                                   enabled=rng.random() > 0.1))
+        packets = [(f"10.0.0.{rng.randrange(140)}", 1000,
+                    f"192.168.{rng.randrange(2)}.1", rng.randrange(130),
+                    rng.choice([Protocol.TCP, Protocol.UDP]), rng.choice(list(Direction)))
+                   for _ in range(2000)]
+
+        # Small blocks so that matches span several of them
+        matcher = CompiledMatcher(rules, block_size=16)
+        expected = [linear_match(rules, *packet) for packet in packets]
+        self.assertEqual(matcher.classify_many(packets), expected)
+        self.assertEqual([matcher.match_position(*packet) for packet in packets[:200]],
+                         expected[:200])
+        self.assertEqual(matcher.actions_many(packets[:5]),
+                         [rules[p].action if p >= 0 else None for p in expected[:5]])
+
+if __name__ == '__main__':
+    unittest.main()
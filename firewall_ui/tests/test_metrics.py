@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from PyQt6.QtWidgets import QApplication
+from firewall_ui.ui.widgets.metrics_view import MetricsView
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.utils.metrics import Metrics, MetricsExporter, metrics
+from firewall_ui.tests.helpers import connect, make_rule
+
+app = QApplication.instance() or QApplication([])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_spans_and_counters(self):
+        registry = Metrics()
+        registry.increment("bytes_sent", 100)
+        registry.increment("bytes_sent", 20)
+        with self.assertRaises(ValueError):
+            with registry.span("encode"):
+                raise ValueError
+
+        @registry.timed("encode")
+        def encode():
+            return "payload"
+        self.assertEqual(encode(), "payload")
+
+        self.assertEqual(registry.counter("bytes_sent"), 120)
+        self.assertEqual(registry.timing("encode").count, 2)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"], {"bytes_sent": 120})
+        self.assertGreaterEqual(snapshot["spans"]["encode"]["maximum"],
+                                snapshot["spans"]["encode"]["average"])
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {"counters": {}, "spans": {}})
+
+    def test_prometheus_text(self):
+        registry = Metrics()
+        registry.increment("timeouts")
+        registry.observe("kernel.send", 0.5)
+        registry.observe("kernel.send", 0.25)
+        lines = registry.to_prometheus().splitlines()
+        self.assertIn("# TYPE firewall_ui_timeouts_total counter", lines)
+        self.assertIn("firewall_ui_timeouts_total 1", lines)
+        self.assertIn('firewall_ui_span_seconds_count{span="kernel.send"} 2', lines)
+        self.assertIn('firewall_ui_span_seconds_sum{span="kernel.send"} 0.75', lines)
+        self.assertIn('firewall_ui_span_max_seconds{span="kernel.send"} 0.5', lines)
+
+    def test_exporter_writes_on_stop(self):
+        registry = Metrics()
+        registry.increment("rules_sent", 3)
+        path = os.path.join(tempfile.mkdtemp(), "metrics", "metrics.json")
+        exporter = MetricsExporter(registry, path, interval=60)
+        exporter.start()
+        exporter.stop()
+        with open(path) as metrics_file:
+            self.assertEqual(json.load(metrics_file)["counters"], {"rules_sent": 3})
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+
+class TestKernelMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 1001)]
+
+    def test_apply_and_fetch_are_instrumented(self):
+        communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART)
+        self.addCleanup(communicator.close)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.assertIsNone(communicator.get_current_config()[1])
+
+        self.assertEqual(metrics.counter("rules_sent"), 1000)
+        self.assertEqual(metrics.counter("rules_received"), 1000)
+        self.assertEqual(metrics.counter("bytes_sent"), len(kernel.stored))
+        # Validation reads the config back once, then the fetch
+        self.assertEqual(metrics.counter("bytes_received"), 2 * len(kernel.stored))
+        for span in ("send_config", "encode", "kernel.send", "kernel.wait_status",
+                     "validate_applied_config", "get_current_config", "kernel.receive",
+                     "decode"):
+            self.assertGreater(metrics.timing(span).count, 0, span)
+        self.assertGreaterEqual(metrics.timing("send_config").total,
+                                metrics.timing("kernel.send").total)
+
+    def test_timeouts_are_counted(self):
+        communicator, kernel = connect(0, latency=0.2)
+        self.addCleanup(communicator.close)
+        communicator.capabilities()
+        communicator.SOCKET_TIMEOUT = 0.05
+        self.assertEqual(communicator.get_current_config(), (None, "Communication timeout"))
+        self.assertEqual(metrics.counter("timeouts"), 1)
+
+
+class TestMetricsView(unittest.TestCase):
+    def test_shows_registry(self):
+        registry = Metrics()
+        registry.observe("send_config", 0.125)
+        registry.increment("timeouts", 2)
+        view = MetricsView(registry)
+        view.refresh()
+        self.assertEqual(view.span_model.rowCount(), 1)
+        self.assertEqual(view.span_model.data(view.span_model.index(0, 2)), "125.00")
+        self.assertEqual(view.counter_model.data(view.counter_model.index(0, 1)), "2")
+
+        view.reset()
+        self.assertEqual(view.span_model.rowCount(), 0)
+        self.assertEqual(view.counter_model.rowCount(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
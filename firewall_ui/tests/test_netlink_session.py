@@ -0,0 +1,171 @@
+import logging
+import socket
+import threading
+import time
+import unittest
+from firewall_ui.utils.netlink_session import NetlinkSession, NLMSG_HEADER
+
+logger = logging.getLogger("test_netlink_session")
+
+
+def reply(sock, seq, msg_type, payload=b''):
+    sock.send(NLMSG_HEADER.pack(17 + len(payload), 0, 0, seq, 0) + msg_type + payload)
+
+
+def receive(sock):
+    message = sock.recv(1 << 16)
+    return NLMSG_HEADER.unpack_from(message)[3], message[16:17], message[17:]
+
+
+class TestNetlinkSession(unittest.TestCase):
+    def setUp(self):
+        self.peers = []
+
+    def connect(self):
+        client, server = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.peers.append(server)
+        return client
+
+    def open_session(self, connect=None):
+        session = NetlinkSession(connect or self.connect, logger)
+        self.addCleanup(session.close)
+        return session
+
+    def test_replies_are_matched_by_sequence_number(self):
+        session = self.open_session()
+        peer = self.peers[0]
+        first = session.request(b'\x01', b'first')
+        second = session.request(b'\x02', b'second')
+        requests = [receive(peer), receive(peer)]
+        self.assertEqual([(msg_type, payload) for _, msg_type, payload in requests],
+                         [(b'\x01', b'first'), (b'\x02', b'second')])
+        self.assertNotEqual(first.seq, second.seq)
+
+        # Answer out of order
+        reply(peer, second.seq, b'\x02', b'two')
+        reply(peer, first.seq, b'\x01', b'one')
+        self.assertEqual(first.next_message(1)[17:], b'one')
+        self.assertEqual(second.next_message(1)[17:], b'two')
+        first.close()
+        second.close()
+
+    def test_concurrent_requests(self):
+        session = self.open_session()
+        peer = self.peers[0]
+        results = {}
+
+        def echo():
+            for _ in range(20):
+                seq, msg_type, payload = receive(peer)
+                reply(peer, seq, msg_type, payload[::-1])
+
+        def call(number):
+            with session.request(b'\x01', str(number).encode()) as request:
+                results[number] = request.next_message(1)[17:]
+        server = threading.Thread(target=echo)
+        server.start()
+        clients = [threading.Thread(target=call, args=(number,)) for number in range(20)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        server.join()
+        self.assertEqual(results, {number: str(number).encode()[::-1] for number in range(20)})
+
+    def test_unnumbered_reply_goes_to_oldest_request(self):
+        session = self.open_session()
+        peer = self.peers[0]
+        with session.request(b'\x08') as oldest, session.request(b'\x08') as newest:
+            reply(peer, 0, b'\x08', b'caps')
+            self.assertEqual(oldest.next_message(1)[17:], b'caps')
+            with self.assertRaises(socket.timeout):
+                newest.next_message(0.1)
+
+    def test_batched_replies_are_split(self):
+        session = self.open_session()
+        peer = self.peers[0]
+        with session.request(b'\x01') as first, session.request(b'\x02') as second:
+            # Lengths 19 and 18, each padded to a multiple of 4
+            peer.send(NLMSG_HEADER.pack(19, 0, 0, first.seq, 0) + b'\x01ab\0'
+                      + NLMSG_HEADER.pack(18, 0, 0, second.seq, 0) + b'\x02c\0\0'
+                      + NLMSG_HEADER.pack(18, 0, 0, first.seq, 0) + b'\x01d')
+            self.assertEqual(first.next_message(1)[16:], b'\x01ab')
+            self.assertEqual(second.next_message(1)[16:], b'\x02c')
+            self.assertEqual(first.next_message(1)[16:], b'\x01d')
+
+            # A length running past the datagram drops the rest of it
+            peer.send(NLMSG_HEADER.pack(18, 0, 0, first.seq, 0) + b'\x01e\0\0'
+                      + NLMSG_HEADER.pack(40, 0, 0, second.seq, 0) + b'\x02f')
+            self.assertEqual(first.next_message(1)[16:], b'\x01e')
+            with self.assertRaises(socket.timeout):
+                second.next_message(0.1)
+
+    def test_reply_larger_than_buffer_fails_its_request(self):
+        class SmallBufferSession(NetlinkSession):
+            RECV_BUFFER_SIZE = 64
+        session = SmallBufferSession(self.connect, logger)
+        self.addCleanup(session.close)
+        peer = self.peers[0]
+        with session.request(b'\x01') as request:
+            reply(peer, request.seq, b'\x01', b'x' * 100)
+            with self.assertRaisesRegex(ConnectionError, "117 bytes .* 64 byte receive buffer"):
+                request.next_message(1)
+            # The session carries on with the next reply
+            reply(peer, request.seq, b'\x01', b'small')
+            self.assertEqual(request.next_message(1)[17:], b'small')
+
+    def test_reconnect_after_connection_loss(self):
+        session = self.open_session()
+        request = session.request(b'\x02')
+        self.peers[0].close()
+        with self.assertRaises(ConnectionError):
+            request.next_message(1)
+        request.close()
+
+        deadline = time.monotonic() + 2
+        while session.connections < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(session.connections, 2)
+        with session.request(b'\x02') as request:
+            seq, _, _ = receive(self.peers[1])
+            reply(self.peers[1], seq, b'\x02', b'again')
+            self.assertEqual(request.next_message(1)[17:], b'again')
+
+    def test_failed_connect_is_retried(self):
+        attempts = []
+
+        def connect():
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise OSError("Protocol not supported")
+            return self.connect()
+        session = self.open_session(connect)
+        self.assertFalse(session.connected)
+        with self.assertRaises(ConnectionError):
+            session.open(b'\x02')
+
+        deadline = time.monotonic() + 2
+        while not session.connected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(session.connected)
+        self.assertEqual(len(attempts), 3)
+
+    def test_latency_is_recorded_per_message_type(self):
+        session = self.open_session()
+        peer = self.peers[0]
+        for _ in range(3):
+            with session.request(b'\x0b') as request:
+                seq, _, _ = receive(peer)
+                reply(peer, seq, b'\x0b')
+                request.next_message(1)
+        # Requests that never got a reply are not counted
+        session.request(b'\x0b').close()
+
+        stats = session.latencies[b'\x0b']
+        self.assertEqual(stats.count, 3)
+        self.assertGreater(stats.average, 0)
+        self.assertGreaterEqual(stats.maximum, stats.last)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.policy.equivalence import find_counterexample
+from firewall_ui.policy.optimizer import optimize
+from firewall_ui.tests import helpers
+
+
+def make_rule(source_start="10.0.0.0", source_end="10.0.0.255", port_start=80, port_end=80,
+              action=Action.ACCEPT, **kwargs):
+    return helpers.make_rule(0, source_start, "192.168.0.1", port_start, port_end,
+                             source_address_end=source_end, action=action, **kwargs)
+
+
+def random_rule(rng):
+    """Small random rule varying source address and destination port"""
+    source_start = rng.randrange(16)
+    port_start = rng.randrange(12)
+    return make_rule(
+        source_start=f"10.0.0.{source_start}",
+        source_end=f"10.0.0.{source_start + rng.randrange(6)}",
+        port_start=port_start,
+        port_end=port_start + rng.randrange(5),
+        action=rng.choice(list(Action)),
+        protocol=rng.choice(list(Protocol)),
+        direction=rng.choice(list(Direction)),
+        enabled=rng.random() > 0.1
+    )
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_merges_adjacent_port_ranges(self):
+        rules = [make_rule(port_start=80, port_end=80), make_rule(port_start=81, port_end=443)]
+        result = optimize(rules)
+
+        self.assertEqual(len(result.rules), 1)
+        self.assertEqual((result.rules[0].destination_port_start,
+                          result.rules[0].destination_port_end), (80, 443))
+        self.assertEqual(result.merged, 1)
+        self.assertAlmostEqual(result.reduction_ratio, 0.5)
+        self.assertIsNone(find_counterexample(rules, result.rules))
+
+    def test_merges_chains_of_address_ranges(self):
+        rules = [make_rule(f"10.0.{i}.0", f"10.0.{i}.255") for i in range(4)]
+        result = optimize(rules)
+
+        self.assertEqual(len(result.rules), 1)
+        self.assertEqual(result.rules[0].source_address_start, "10.0.0.0")
+        self.assertEqual(result.rules[0].source_address_end, "10.0.3.255")
+
+    def test_drops_disabled_and_dead_rules(self):
+        rules = [
+            make_rule("10.0.0.0", "10.0.255.255", protocol=Protocol.ANY),
+            make_rule("10.0.1.0", "10.0.1.255", action=Action.DROP),
+            make_rule("172.16.0.0", "172.16.0.255", enabled=False),
+            make_rule("172.16.0.0", "172.16.0.255", action=Action.DROP),
+        ]
+        result = optimize(rules)
+
+        self.assertEqual([rule.id for rule in result.rules], [1, 2])
+        self.assertEqual(result.disabled_removed, 1)
+        self.assertEqual(result.dead_removed, 1)
+        self.assertEqual(rules[3].id, 0)
+
+    def test_does_not_merge_across_conflicting_rule(self):
+        rules = [
+            make_rule(port_start=80, port_end=80),
+            make_rule(port_start=81, port_end=81, action=Action.DROP),
+            make_rule(port_start=81, port_end=90),
+        ]
+        result = optimize(rules)
+
+        self.assertEqual(len(result.rules), 3)
+        self.assertIsNone(find_counterexample(rules, result.rules))
+
+    def test_ipv6_rules_do_not_hide_ipv4_rules(self):
+        everything = "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff"
+        rules = [
+            make_rule("::", everything, port_start=0, port_end=65535, action=Action.DROP,
+                      destination_address_start="::", destination_address_end=everything),
+            make_rule("10.0.0.0", "10.0.0.255"),
+            make_rule("10.0.1.0", "10.0.1.255"),
+        ]
+        result = optimize(rules)
+
+        self.assertEqual(result.dead_removed, 0)
+        self.assertEqual(len(result.rules), 2)
+        self.assertEqual(result.rules[1].source_address_end, "10.0.1.255")
+        self.assertIsNone(find_counterexample(rules, result.rules))
+        # The reference itself tells the families apart
+        self.assertIsNotNone(find_counterexample(rules, rules[:1]))
+
+    def test_counterexample_detects_reordering(self):
+        rules = [make_rule(action=Action.DROP), make_rule("10.0.0.0", "10.0.0.9")]
+        self.assertIsNotNone(find_counterexample(rules, list(reversed(rules))))
+
+    def test_random_rulesets_stay_equivalent(self):
+        rng = random.Random(1234)
+        for _ in range(150):
+            rules = [random_rule(rng) for _ in range(rng.randrange(2, 9))]
+            result = optimize(rules)
+            self.assertLessEqual(len(result.rules), len(rules))
+            self.assertIsNone(find_counterexample(rules, result.rules), rules)
+
+if __name__ == '__main__':
+    unittest.main()
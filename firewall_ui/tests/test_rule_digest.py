@@ -0,0 +1,54 @@
+import random
+import unittest
+from dataclasses import replace
+from firewall_ui.utils.rule_digest import MerkleTree, find_divergence, leaf_hash
+from firewall_ui.tests.helpers import make_rule
+
+
+class TestRuleDigest(unittest.TestCase):
+    def test_leaf_covers_every_field(self):
+        rule = make_rule(1)
+        variants = [replace(rule, id=2), replace(rule, source_address_end="192.168.1.2"),
+                    replace(rule, destination_address_start="::ffff:10.0.0.1"),
+                    replace(rule, source_port_start=0), replace(rule, destination_port_end=444),
+                    replace(rule, protocol="UDP"), replace(rule, action="DROP"),
+                    replace(rule, direction="OUTBOUND"), replace(rule, enabled=False),
+                    replace(rule, description="x")]
+        hashes = {leaf_hash(variant) for variant in variants}
+        self.assertEqual(len(hashes), len(variants))
+        self.assertNotIn(leaf_hash(rule), hashes)
+
+    def test_root_depends_on_order_and_count(self):
+        rules = [make_rule(i) for i in range(1, 6)]
+        root = MerkleTree.from_rules(rules).root
+        self.assertEqual(MerkleTree.from_rules(list(rules)).root, root)
+        self.assertNotEqual(MerkleTree.from_rules(rules[:4]).root, root)
+        self.assertNotEqual(MerkleTree([]).root, MerkleTree.from_rules(rules[:1]).root)
+
+    def check_divergence(self, local, remote, expected):
+        local_tree = MerkleTree(local)
+        remote_tree = MerkleTree(remote)
+        calls = []
+
+        def fetch(nodes):
+            calls.append(nodes)
+            return [remote_tree.node(*node) for node in nodes]
+        self.assertNotEqual(local_tree.root, remote_tree.root)
+        self.assertEqual(find_divergence(local_tree, fetch), expected)
+        self.assertLessEqual(len(calls), local_tree.height)
+
+    def test_find_divergence(self):
+        generator = random.Random(5)
+        leaves = [i.to_bytes(16, 'big') for i in range(1000)]
+        for _ in range(100):
+            position = generator.randrange(1000)
+            changed = list(leaves)
+            changed[position] = b'\xff' * 16
+            self.check_divergence(leaves, changed, position)
+            # Remote list shorter or longer than the local one
+            self.check_divergence(leaves, leaves[:position], position)
+            self.check_divergence(leaves[:position + 1], leaves, position + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import io
+import os
+import tempfile
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.policy.diff import rule_key
+from firewall_ui.utils.rule_files import (RuleReader, RuleFileError, iter_json, iter_rules,
+                                          write_rules, validated_batches, iptables_rule)
+from firewall_ui.tests.helpers import make_rule
+
+IPTABLES_SAVE = """# Generated by iptables-save v1.8.7
+*nat
+:PREROUTING ACCEPT [0:0]
+-A PREROUTING -p tcp --dport 8080 -j REDIRECT --to-ports 80
+COMMIT
+*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -m comment --comment "admin \\"ssh\\"" -j ACCEPT
+-A INPUT -p udp -m udp --sport 53 --dport 1024: -j ACCEPT
+-A INPUT -m iprange --src-range 192.168.1.10-192.168.1.20 -j REJECT
+-A OUTPUT -d 2001:db8::/32 -j DROP
+COMMIT
+"""
+
+
+class TestRuleFiles(unittest.TestCase):
+    def setUp(self):
+        self.rules = [
+            make_rule(1, description='web "front", primary'),
+            make_rule(2, source="10.0.0.0", source_address_end="10.0.0.255",
+                      protocol=Protocol.UDP, action=Action.DROP),
+            make_rule(3, source="2001:db8::1", destination="2001:db8::2", enabled=False,
+                      direction=Direction.OUTBOUND, port_start=None, port_end=None,
+                      protocol=Protocol.ANY),
+            make_rule(4, source="192.168.1.10", source_address_end="192.168.1.20",
+                      source_port_start=1024, source_port_end=65535, port_start=53, port_end=53),
+        ]
+
+    def round_trip(self, format):
+        stream = io.StringIO()
+        self.assertEqual(write_rules(stream, self.rules, format), len(self.rules))
+        stream.seek(0)
+        return list(iter_rules(stream, format))
+
+    def test_formats_round_trip(self):
+        for format in ("json", "csv", "iptables"):
+            with self.subTest(format=format):
+                self.assertEqual([rule_key(rule) for rule in self.round_trip(format)],
+                                 [rule_key(rule) for rule in self.rules])
+        self.assertEqual(iptables_rule(self.rules[1]),
+                         "-A INPUT -s 10.0.0.0/24 -d 10.0.0.1/32 -p udp -m udp "
+                         "--dport 80:443 -j DROP")
+
+    def test_json_is_read_in_chunks(self):
+        text = io.StringIO()
+        write_rules(text, self.rules, "json")
+        for chunk_size in (1, 7, 1 << 16):
+            stream = io.StringIO(text.getvalue())
+            self.assertEqual(len(list(iter_json(stream, chunk_size))), len(self.rules))
+        self.assertEqual(list(iter_json(io.StringIO(" [ ] "))), [])
+
+        for text, error in (('{"id": 1}', "Expected a JSON array"),
+                            ('[{"id": 1}, {"id": ', "Rule 2: invalid JSON"),
+                            ('[{"id": 1} {"id": 2}]', "Rule 1: expected ','"),
+                            ('[1]', "Rule 1: expected an object")):
+            with self.subTest(text=text), self.assertRaisesRegex(RuleFileError, error):
+                list(iter_json(io.StringIO(text), 4))
+
+    def test_iptables_save(self):
+        rules = list(iter_rules(io.StringIO(IPTABLES_SAVE), "iptables"))
+        self.assertEqual(len(rules), 4)
+        ssh, dns, reject, v6 = rules
+        self.assertEqual((ssh.source_address_start, ssh.source_address_end),
+                         ("10.0.0.0", "10.255.255.255"))
+        self.assertEqual((ssh.destination_address_start, ssh.destination_address_end),
+                         ("0.0.0.0", "255.255.255.255"))
+        self.assertEqual(ssh.description, 'admin "ssh"')
+        self.assertEqual((dns.protocol, dns.source_port_start, dns.source_port_end,
+                          dns.destination_port_start, dns.destination_port_end),
+                         (Protocol.UDP, 53, 53, 1024, 65535))
+        self.assertEqual((reject.action, reject.protocol, reject.source_address_end),
+                         (Action.DROP, Protocol.ANY, "192.168.1.20"))
+        self.assertEqual((v6.direction, v6.source_address_start, v6.destination_address_end),
+                         (Direction.OUTBOUND, "::", "2001:db8:ffff:ffff:ffff:ffff:ffff:ffff"))
+
+        for line, error in (("-A INPUT -i eth0 -j ACCEPT", "unsupported option '-i'"),
+                            ("-A FORWARD -j ACCEPT", "unsupported chain 'FORWARD'"),
+                            ("-A INPUT -m state --state NEW -j ACCEPT", "'-m state'"),
+                            ("-A INPUT ! -s 10.0.0.1 -j DROP", "negated"),
+                            ("-A INPUT --dport 22 -j DROP", "ports need -p tcp")):
+            with self.subTest(line=line), self.assertRaisesRegex(RuleFileError, f"Line 3: .*{error}"):
+                list(iter_rules(io.StringIO(f"*filter\n:INPUT ACCEPT [0:0]\n{line}\n"), "iptables"))
+        with self.assertRaisesRegex(RuleFileError, "Rule 1 cannot be written"):
+            write_rules(io.StringIO(), [make_rule(protocol=Protocol.ANY)], "iptables")
+
+    def test_invalid_rules_are_numbered_from_the_file_start(self):
+        rules = [make_rule(i) for i in range(1, 11)]
+        rules[7].destination_port_start = 70000
+        batches = validated_batches(rules, batch_size=3)
+        self.assertEqual(len(next(batches)), 3)
+        self.assertEqual(len(next(batches)), 3)
+        with self.assertRaisesRegex(RuleFileError, "^Rule 8: Port numbers must be between"):
+            next(batches)
+
+        stream = io.StringIO("protocol,action,direction\nTCP,ACCEPT,INBOUND\n")
+        with self.assertRaisesRegex(RuleFileError, "lacks the columns: source_address_start"):
+            list(iter_rules(stream, "csv"))
+        text = io.StringIO()
+        write_rules(text, self.rules, "csv")
+        stream = io.StringIO(text.getvalue().replace(",53,53,", ",53,x,"))
+        with self.assertRaisesRegex(RuleFileError, "^Line 5: invalid value"):
+            list(iter_rules(stream, "csv"))
+
+    def test_reader(self):
+        directory = tempfile.mkdtemp()
+        for format, name in (("json", "rules.json"), ("csv", "rules.csv"),
+                             ("iptables", "rules.rules"), ("csv", "rules"),
+                             ("iptables", "saved")):
+            path = os.path.join(directory, name)
+            with open(path, "w") as rule_file:
+                write_rules(rule_file, self.rules[:2], format)
+            with self.subTest(name=name), RuleReader(path, batch_size=1) as reader:
+                self.assertEqual(reader.format, format)
+                self.assertEqual([len(batch) for batch in reader], [1, 1])
+                self.assertEqual((reader.count, reader.position), (2, reader.size))
+
+        with self.assertRaisesRegex(RuleFileError, "Cannot read rules from"):
+            RuleReader(os.path.join(directory, "missing.json"))
+        with self.assertRaisesRegex(RuleFileError, "Unknown rule file format"):
+            RuleReader(path, "xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
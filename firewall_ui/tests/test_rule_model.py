@@ -1,11 +1,11 @@
 import unittest
-from src.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
 
 class TestRuleModel(unittest.TestCase):
     def test_rule_creation(self):
-        rule = Rule(
+        rule = Rule.from_single_values(
             id=1,
-            source_address="192.168.1.0/24",
+            source_address="192.168.1.1",
             source_port=80,
             destination_address="10.0.0.1",
             destination_port=443,
@@ -14,21 +14,23 @@ class TestRuleModel(unittest.TestCase):
             direction=Direction.INBOUND,
             description="Test rule"
         )
-        
+
         self.assertEqual(rule.id, 1)
-        self.assertEqual(rule.source_address, "192.168.1.0/24")
-        self.assertEqual(rule.source_port, 80)
-        self.assertEqual(rule.destination_address, "10.0.0.1")
-        self.assertEqual(rule.destination_port, 443)
+        self.assertEqual(rule.source_address_start, "192.168.1.1")
+        self.assertEqual(rule.source_address_end, "192.168.1.1")
+        self.assertEqual(rule.source_port_start, 80)
+        self.assertEqual(rule.source_port_end, 80)
+        self.assertEqual(rule.destination_address_start, "10.0.0.1")
+        self.assertEqual(rule.destination_port_end, 443)
         self.assertEqual(rule.protocol, Protocol.TCP)
         self.assertEqual(rule.action, Action.ACCEPT)
         self.assertEqual(rule.direction, Direction.INBOUND)
         self.assertEqual(rule.description, "Test rule")
 
     def test_rule_validation(self):
-        valid_rule = Rule(
+        valid_rule = Rule.from_single_values(
             id=1,
-            source_address="192.168.1.0/24",
+            source_address="192.168.1.1",
             source_port=80,
             destination_address="10.0.0.1",
             destination_port=443,
@@ -38,7 +40,7 @@ class TestRuleModel(unittest.TestCase):
         )
         self.assertTrue(valid_rule.validate())
 
-        invalid_rule = Rule(
+        invalid_rule = Rule.from_single_values(
             id=1,
             source_address="invalid_ip",
             source_port=80,
@@ -52,9 +54,9 @@ class TestRuleModel(unittest.TestCase):
             invalid_rule.validate()
 
     def test_rule_to_dict(self):
-        rule = Rule(
+        rule = Rule.from_single_values(
             id=1,
-            source_address="192.168.1.0/24",
+            source_address="192.168.1.1",
             source_port=80,
             destination_address="10.0.0.1",
             destination_port=443,
@@ -64,17 +66,18 @@ class TestRuleModel(unittest.TestCase):
             description="Test rule"
         )
         rule_dict = rule.to_dict()
-        
+
         self.assertIsInstance(rule_dict, dict)
         self.assertEqual(rule_dict['id'], 1)
-        self.assertEqual(rule_dict['source_address'], "192.168.1.0/24")
-        self.assertEqual(rule_dict['source_port'], 80)
-        self.assertEqual(rule_dict['destination_address'], "10.0.0.1")
-        self.assertEqual(rule_dict['destination_port'], 443)
+        self.assertEqual(rule_dict['source_address_start'], "192.168.1.1")
+        self.assertEqual(rule_dict['source_port_start'], 80)
+        self.assertEqual(rule_dict['destination_address_end'], "10.0.0.1")
+        self.assertEqual(rule_dict['destination_port_start'], 443)
         self.assertEqual(rule_dict['protocol'], "TCP")
         self.assertEqual(rule_dict['action'], "ACCEPT")
         self.assertEqual(rule_dict['direction'], "INBOUND")
         self.assertEqual(rule_dict['description'], "Test rule")
+        self.assertEqual(Rule.from_dict(rule_dict), rule)
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
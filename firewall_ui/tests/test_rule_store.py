@@ -0,0 +1,65 @@
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.models.rule_store import RuleStore
+from firewall_ui.tests import helpers
+
+
+def make_rule(source="192.168.1.1", destination="10.0.0.1", port=80):
+    return helpers.make_rule(0, source, destination, port, port,
+                             source_port_start=port, source_port_end=port)
+
+
+class TestRuleStore(unittest.TestCase):
+    def test_rules_are_returned_without_conversion(self):
+        rule = make_rule(source="2001:db8::1", destination="fe80::1:2")
+        store = RuleStore([rule])
+
+        stored = store.rules()[0]
+        self.assertIs(store.rules()[0], stored)
+        self.assertEqual(stored.source_address_start, "2001:db8::1")
+        self.assertEqual(stored.destination_address_end, "fe80::1:2")
+        self.assertEqual(stored.source_port_start, 80)
+
+    def test_ids_follow_positions(self):
+        store = RuleStore(make_rule(port=port) for port in range(5))
+        store.remove(1)
+        store.insert(0, make_rule(port=1000))
+        store.swap(1, 2)
+
+        rules = store.rules()
+        self.assertEqual([rule.id for rule in rules], [1, 2, 3, 4, 5])
+        self.assertEqual([rule.source_port_start for rule in rules], [1000, 2, 0, 3, 4])
+        self.assertEqual(store[3].id, 4)
+
+    def test_enum_fields_are_coerced(self):
+        rule = make_rule()
+        rule.protocol = "UDP"
+        rule.action = "DROP"
+        rule.direction = "OUTBOUND"
+        store = RuleStore()
+        store.append(rule)
+
+        self.assertEqual(store[0].protocol, Protocol.UDP)
+        self.assertEqual(store[0].action, Action.DROP)
+        self.assertEqual(store[0].direction, Direction.OUTBOUND)
+        self.assertEqual(rule.protocol, "UDP")
+
+    def test_rules_are_not_changed_in_place(self):
+        rules = [make_rule(port=port) for port in range(5)]
+        store = RuleStore(rules)
+        read = store.rules()
+        store.insert(0, make_rule(port=1000))
+        store.swap(1, 2)
+        store.replace(3, make_rule(port=2000))
+
+        self.assertEqual([rule.id for rule in rules], [0] * 5)
+        self.assertEqual([rule.id for rule in read], [1, 2, 3, 4, 5])
+        self.assertEqual([rule.id for rule in store.rules()], [1, 2, 3, 4, 5, 6])
+
+    def test_rejects_non_rules(self):
+        store = RuleStore()
+        with self.assertRaises(TypeError):
+            store.append(make_rule().to_dict())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.models.ruleset import RuleSet, address_key
+from firewall_ui.tests.helpers import make_rule
+
+
+class TestRuleSet(unittest.TestCase):
+    def test_round_trip_rules(self):
+        rules = [
+            make_rule(1, description="web"),
+            make_rule(2, source="2001:db8::1", protocol=Protocol.UDP, action=Action.DROP),
+            make_rule(3, destination="::ffff:10.0.0.1", direction=Direction.OUTBOUND,
+                      enabled=False, port_start=None, port_end=None),
+        ]
+        ruleset = RuleSet.from_rules(rules)
+
+        self.assertEqual(len(ruleset), 3)
+        self.assertEqual(ruleset.to_rules(), rules)
+        self.assertEqual(ruleset.to_dicts(), [rule.to_dict() for rule in rules])
+        self.assertEqual(ruleset[1], rules[1])
+        self.assertEqual(ruleset[-1], rules[2])
+
+    def test_from_dicts(self):
+        dicts = [make_rule(i, port_start=i, port_end=i + 10).to_dict() for i in range(50)]
+        self.assertEqual(RuleSet.from_dicts(dicts).to_dicts(), dicts)
+
+    def test_columns_widen_for_ipv6(self):
+        ruleset = RuleSet([make_rule(1)])
+        self.assertFalse(ruleset.source_start.wide)
+
+        ruleset.append(make_rule(2, source="fe80::1"))
+        self.assertTrue(ruleset.source_start.wide)
+        self.assertFalse(ruleset.destination_start.wide)
+        self.assertEqual(ruleset[0].source_address_start, "192.168.1.1")
+        self.assertEqual(ruleset.source_start.keys(),
+                         [address_key("192.168.1.1"), address_key("fe80::1")])
+
+    def test_port_bounds_treat_missing_ports_as_any(self):
+        ruleset = RuleSet([make_rule(1), make_rule(2, port_start=None, port_end=None)])
+        source_low, source_high, destination_low, destination_high = ruleset.port_bounds()
+
+        self.assertEqual((source_low, source_high), ([0, 0], [65535, 65535]))
+        self.assertEqual((destination_low, destination_high), ([80, 0], [443, 65535]))
+
+    def test_invalid_values_leave_columns_consistent(self):
+        ruleset = RuleSet([make_rule(1)])
+        with self.assertRaises(ValueError):
+            ruleset.append(make_rule(2, source="not-an-ip"))
+        with self.assertRaises(ValueError):
+            ruleset.append(make_rule(3, port_end=70000))
+
+        self.assertEqual(len(ruleset), 1)
+        self.assertEqual(len(ruleset.source_start), 1)
+
+    def test_memory_per_rule(self):
+        ruleset = RuleSet(make_rule(i, port_start=i % 65536, port_end=i % 65536)
+                          for i in range(1000))
+        self.assertLessEqual(ruleset.nbytes() / len(ruleset), 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+from dataclasses import replace
+from unittest import mock
+from PyQt6.QtWidgets import QApplication
+from firewall_ui.ui import main_window
+from firewall_ui.utils import kernel_comm
+from firewall_ui.utils.fake_kernel import FakeKernel
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.utils.rule_digest import MerkleTree
+from firewall_ui.utils.snapshot_cache import SnapshotCache, HEADER
+from firewall_ui.utils.wire_format import encode_rules
+from firewall_ui.tests.helpers import connect, make_rule, make_rules
+
+app = QApplication.instance() or QApplication([])
+
+
+class TestSnapshotCache(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "cache", "ruleset.snapshot")
+        self.cache = SnapshotCache(self.path)
+        self.rules = make_rules(500)
+        self.digest = MerkleTree.from_rules(self.rules).root
+
+    def test_save_and_load(self):
+        self.assertIsNone(self.cache.load())
+        self.cache.save(encode_rules(self.rules), len(self.rules), self.digest)
+
+        snapshot = self.cache.load()
+        self.assertEqual(snapshot.digest, self.digest)
+        self.assertEqual(len(snapshot), len(self.rules))
+        self.assertEqual([len(batch) for batch in snapshot.rule_batches(200)], [200, 200, 100])
+        self.assertEqual([rule for batch in snapshot.rule_batches(200) for rule in batch],
+                         self.rules)
+
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.load())
+        self.cache.invalidate()
+
+    def test_unusable_files_are_ignored(self):
+        self.cache.save(encode_rules(self.rules), len(self.rules), self.digest)
+        with open(self.path, "rb") as snapshot_file:
+            data = snapshot_file.read()
+        for name, damaged in (("version", data[:4] + b"\x02" + data[5:]),
+                              ("payload", data[:-10] + bytes(10)),
+                              ("truncated", data[:HEADER.size + 100]),
+                              ("count", data[:8] + b"\x00" + data[9:]),
+                              ("header", data[:10])):
+            with self.subTest(name=name):
+                with open(self.path, "wb") as snapshot_file:
+                    snapshot_file.write(damaged)
+                self.assertIsNone(self.cache.load())
+
+    def test_kept_up_to_date_by_kernel_communicator(self):
+        communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA
+                                       | KC.CAP_DIGEST)
+        communicator.snapshot_cache = self.cache
+        self.addCleanup(communicator.close)
+
+        # A full push is saved as sent, keyed by the digest it was validated with
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        snapshot = self.cache.load()
+        self.assertEqual(snapshot.digest, self.digest)
+        self.assertEqual(communicator.confirm_digest(snapshot.digest), (True, None))
+
+        # Deltas carry only the changes, so the snapshot is dropped
+        changed = self.rules[:-1] + [replace(self.rules[-1], description="changed")]
+        self.assertEqual(communicator.send_config(changed), (True, None, None))
+        self.assertIsNone(self.cache.load())
+        self.assertEqual(communicator.confirm_digest(snapshot.digest), (False, None))
+
+        # and fetched again with the configuration
+        config, error = communicator.get_current_config()
+        self.assertIsNone(error)
+        snapshot = self.cache.load()
+        self.assertEqual(snapshot.ruleset.to_dicts(), config)
+        self.assertEqual(snapshot.digest, MerkleTree.from_rules(changed).root)
+
+    def test_not_kept_without_kernel_digests(self):
+        communicator, kernel = connect(KC.CAP_BINARY_RULES | KC.CAP_MULTIPART)
+        communicator.snapshot_cache = self.cache
+        self.addCleanup(communicator.close)
+        self.assertEqual(communicator.send_config(self.rules), (True, None, None))
+        self.assertIsNone(communicator.get_current_config()[1])
+        self.assertIsNone(self.cache.load())
+        self.assertEqual(communicator.confirm_digest(self.digest), (False, None))
+
+
+class TestSnapshotStartup(unittest.TestCase):
+    def test_stale_snapshot_is_replaced_by_kernel_config(self):
+        directory = tempfile.mkdtemp()
+        kernel_rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 201)]
+        stale = [make_rule(i, port_start=i, port_end=i, description="stale")
+                 for i in range(1, 601)]
+        kernel = FakeKernel()
+        kernel.stored = encode_rules(kernel_rules)
+        socket_path = os.path.join(directory, "kernel.sock")
+        kernel.serve(socket_path)
+        self.addCleanup(kernel.close)
+        snapshot_path = os.path.join(directory, "ruleset.snapshot")
+        SnapshotCache(snapshot_path).save(encode_rules(stale), len(stale),
+                                          MerkleTree.from_rules(stale).root)
+
+        with mock.patch.object(main_window, "RULESET_SNAPSHOT_FILE", snapshot_path), \
+                mock.patch.object(kernel_comm, "KERNEL_SOCKET_PATH", socket_path):
+            window = main_window.MainWindow()
+            self.addCleanup(window.close)
+            # One stale rule per time slice, so the digest reply comes mid-load
+            window.rule_table.LOAD_BATCH_SIZE = 1
+            window.rule_table.LOAD_SLICE = 0
+            window.kernel_started = True
+            # and the kernel configuration after the rest of the snapshot could be in
+            on_snapshot_checked = window.on_snapshot_checked
+            loading_when_checked = []
+
+            def slow_kernel_after_check(matches, error):
+                loading_when_checked.append(window.rule_table.loading)
+                kernel.latency = 0.5
+                on_snapshot_checked(matches, error)
+            window.on_snapshot_checked = slow_kernel_after_check
+            shown = []
+            window.rule_table.loading_progress.connect(shown.append)
+            window.connect_kernel()
+            while window.rules_loading or window.kernel_client.busy:
+                self.assertFalse(window.apply_button.isEnabled())
+                app.processEvents()
+
+        self.assertEqual(loading_when_checked, [True])
+        self.assertLess(max(shown), len(stale))
+        self.assertEqual(window.rule_table.get_all_rules(), kernel_rules)
+        self.assertEqual([(version.note, len(version)) for version in window.rule_history.versions],
+                         [("Loaded from kernel module", 200)])
+        # Saved again from the kernel module's configuration
+        self.assertEqual(SnapshotCache(snapshot_path).load().ruleset.to_rules(), kernel_rules)
+
+
+if __name__ == '__main__':
+    unittest.main()
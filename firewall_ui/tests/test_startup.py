@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import unittest
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QLabel
+from firewall_ui.ui.widgets.lazy_tab import LazyTab
+from firewall_ui.ui.widgets.rule_table import RuleTableWidget, ENABLED_COLUMN
+from firewall_ui.tests.helpers import make_rule
+
+app = QApplication.instance() or QApplication([])
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestProgressiveLoading(unittest.TestCase):
+    def setUp(self):
+        self.table = RuleTableWidget()
+        self.table.LOAD_BATCH_SIZE = 100
+        self.table.LOAD_SLICE = 0
+        self.config = [make_rule(i, port_start=i, port_end=i).to_dict() for i in range(1, 451)]
+        self.finished = []
+        self.table.loading_finished.connect(self.finished.append)
+
+    def wait_for_load(self):
+        while self.table.loading:
+            app.processEvents()
+
+    def test_rules_arrive_in_batches(self):
+        self.table.load_rules_progressively(self.config)
+        # The first batch is in before control returns to the event loop
+        self.assertEqual(self.table.rowCount(), 100)
+        self.assertTrue(self.table.loading)
+        self.wait_for_load()
+
+        self.assertEqual(self.finished, [450])
+        self.assertEqual([rule.to_dict() for rule in self.table.get_all_rules()], self.config)
+
+    def test_new_load_replaces_unfinished_one(self):
+        self.table.load_rules_progressively(self.config)
+        self.table.load_rules(self.config[:10])
+        self.assertFalse(self.table.loading)
+        app.processEvents()
+        self.assertEqual(self.table.rowCount(), 10)
+
+        self.table.load_rules_progressively([])
+        self.assertEqual(self.finished, [0])
+
+    def test_failed_load_keeps_previous_rules(self):
+        def batches():
+            yield [make_rule(1)] * 100
+            yield [make_rule(2)] * 100
+            raise ValueError("Rule 201: broken")
+        failures = []
+        self.table.loading_failed.connect(failures.append)
+        self.table.load_rules(self.config[:10])
+        self.table.load_rule_batches(batches())
+        self.wait_for_load()
+
+        self.assertEqual(failures, ["Rule 201: broken"])
+        self.assertEqual(self.finished, [])
+        self.assertEqual([rule.to_dict() for rule in self.table.get_all_rules()], self.config[:10])
+
+    def test_read_only_table_keeps_its_rules(self):
+        self.table.load_rules(self.config[:3])
+        self.table.set_read_only(True)
+        self.assertFalse(self.table.up_button.isEnabled())
+        self.assertFalse(self.table.down_button.isEnabled())
+        index = self.table.model.index(0, ENABLED_COLUMN)
+        self.assertFalse(self.table.model.flags(index) & Qt.ItemFlag.ItemIsUserCheckable)
+        self.assertFalse(self.table.model.setData(index, Qt.CheckState.Unchecked.value,
+                                                  Qt.ItemDataRole.CheckStateRole))
+        self.assertTrue(self.table.get_rule(0).enabled)
+
+        self.table.set_read_only(False)
+        self.assertTrue(self.table.up_button.isEnabled())
+        self.assertTrue(self.table.model.setData(index, Qt.CheckState.Unchecked.value,
+                                                 Qt.ItemDataRole.CheckStateRole))
+        self.assertFalse(self.table.get_rule(0).enabled)
+
+
+class TestLazyStartup(unittest.TestCase):
+    def test_tab_is_built_when_first_shown(self):
+        built = []
+        tab = LazyTab(lambda: built.append(1) or QLabel("content"))
+        self.assertEqual(built, [])
+        tab.show()
+        tab.hide()
+        tab.show()
+        self.assertEqual(built, [1])
+        self.assertIsInstance(tab.ensure_widget(), QLabel)
+        tab.close()
+
+    def test_window_module_leaves_heavy_modules_unloaded(self):
+        deferred = ["firewall_ui.ui.rule_dialog", "firewall_ui.ui.widgets.analysis_panel",
+                    "firewall_ui.ui.widgets.metrics_view", "firewall_ui.policy.analyzer",
+                    "firewall_ui.policy.optimizer", "firewall_ui.utils.kernel_comm"]
+        code = ("import sys, firewall_ui.ui.main_window; "
+                f"print([name for name in {deferred!r} if name in sys.modules])")
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                                text=True, env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+        self.assertEqual(result.stdout.strip(), "[]", result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from firewall_ui.models.validation import validate_many
+from firewall_ui.tests import helpers
+
+
+def make_rule(source_start="192.168.1.1", source_end="192.168.1.10",
+              destination="10.0.0.1", port_start=80, port_end=443):
+    return helpers.make_rule(1, source_start, destination, port_start, port_end,
+                             source_address_end=source_end)
+
+
+class TestValidateMany(unittest.TestCase):
+    def test_valid_rules(self):
+        report = validate_many([make_rule(), make_rule("::1", "::ff", "fe80::1")])
+        self.assertTrue(report.ok)
+        self.assertEqual(report.total, 2)
+        self.assertIsNone(report.first_error())
+
+    def test_reports_every_invalid_rule(self):
+        rules = [
+            make_rule(),
+            make_rule(source_start="invalid_ip"),
+            make_rule(source_start="10.0.0.9", source_end="10.0.0.1"),
+            make_rule(port_start=443, port_end=80),
+            make_rule(port_end=70000),
+            make_rule(source_start="10.0.0.1", source_end="::1"),
+            make_rule(source_start="bad", port_start=9, port_end=1),
+        ]
+        report = validate_many(rules)
+
+        self.assertFalse(report.ok)
+        self.assertEqual(sorted(report.errors), [1, 2, 3, 4, 5, 6])
+        self.assertIn("does not appear to be an IPv4 or IPv6 address", report.errors[1][0])
+        self.assertEqual(report.errors[2], ["Source IP start must be less than or equal to end"])
+        self.assertEqual(report.errors[3], ["Destination port start must be less than or equal to end"])
+        self.assertEqual(report.errors[4], ["Port numbers must be between 0 and 65535"])
+        self.assertEqual(report.errors[5], ["Source IP start and end must be of the same IP version"])
+        self.assertEqual(len(report.errors[6]), 2)
+        self.assertEqual(report.first_error()[0], 1)
+        self.assertIn("Rule 3:", report.summary())
+
+    def test_rule_validate_raises_first_error(self):
+        with self.assertRaisesRegex(ValueError, "Invalid rule: Source IP start"):
+            make_rule(source_start="10.0.0.9", source_end="10.0.0.1").validate()
+        self.assertTrue(make_rule().validate())
+
+if __name__ == '__main__':
+    unittest.main()
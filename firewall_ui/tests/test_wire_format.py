@@ -0,0 +1,49 @@
+import unittest
+from firewall_ui.models.rule import Protocol, Action, Direction
+from firewall_ui.models.ruleset import RuleSet
+from firewall_ui.utils.wire_format import (encode_rules, encode_ruleset, decode_rules,
+                                           decode_ruleset, is_binary_payload, HEADER,
+                                           WireFormatError)
+from firewall_ui.tests.helpers import make_rule
+
+
+class TestWireFormat(unittest.TestCase):
+    def test_round_trip(self):
+        rules = [
+            make_rule(1, description="web"),
+            make_rule(2, source="2001:db8::1", protocol=Protocol.UDP, action=Action.DROP),
+            make_rule(3, destination="::ffff:10.0.0.1", direction=Direction.OUTBOUND,
+                      enabled=False, port_start=None, port_end=None, description="ünïcode"),
+        ]
+        payload = encode_rules(rules)
+        self.assertTrue(is_binary_payload(payload))
+        self.assertEqual(decode_rules(payload), rules)
+
+    def test_fixed_width_ipv4_rules(self):
+        rules = [make_rule(i, port_start=i, port_end=i) for i in range(1, 101)]
+        payload = encode_rules(rules)
+        # id + 4 addresses + 4 ports + 4 code bytes
+        self.assertEqual(len(payload), HEADER.size + 100 * (4 + 16 + 8 + 4))
+        self.assertEqual(decode_ruleset(payload).to_dicts(), [rule.to_dict() for rule in rules])
+
+    def test_empty(self):
+        self.assertEqual(len(decode_ruleset(encode_ruleset(RuleSet()))), 0)
+
+    def test_trailing_padding_is_ignored(self):
+        rules = [make_rule(1, description="padded")]
+        self.assertEqual(decode_rules(encode_rules(rules) + b'\x00\x00\x00'), rules)
+
+    def test_rejects_bad_payloads(self):
+        payload = encode_rules([make_rule(1, description="x")])
+        with self.assertRaises(WireFormatError):
+            decode_ruleset(payload[:-1])
+        with self.assertRaises(WireFormatError):
+            decode_ruleset(b'[{"id": 1}]' + bytes(HEADER.size))
+        corrupt = bytearray(payload)
+        corrupt[HEADER.size + 4 + 16 + 8] = 200  # protocol code
+        with self.assertRaises(WireFormatError):
+            decode_ruleset(corrupt)
+
+
+if __name__ == '__main__':
+    unittest.main()
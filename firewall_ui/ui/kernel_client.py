@@ -0,0 +1,167 @@
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+
+class _KernelWorker(QObject):
+    """Runs KernelCommunicator calls on the kernel client thread"""
+    config_received = pyqtSignal(object, object)
+    config_sent = pyqtSignal(bool, object, object)
+    config_optimized = pyqtSignal(object)
+    config_validated = pyqtSignal(bool, object)
+    digest_checked = pyqtSignal(bool, object)
+    rules_validated = pyqtSignal(object, object)
+    progress = pyqtSignal(int, int)
+
+    def __init__(self, kernel_comm):
+        super().__init__()
+        self.kernel_comm = kernel_comm
+        kernel_comm.on_progress = self.progress.emit
+
+    @pyqtSlot()
+    def get_config(self):
+        self.config_received.emit(*self._run(self.kernel_comm.get_current_config))
+
+    @pyqtSlot(object, bool)
+    def send_config(self, rules, optimize):
+        if optimize:
+            from firewall_ui.policy.optimizer import optimize as optimize_rules
+            result = optimize_rules(rules)
+            self.config_optimized.emit(result)
+            rules = result.rules
+        self.config_sent.emit(*self._run(self.kernel_comm.send_config, rules))
+
+    @pyqtSlot(object)
+    def validate_config(self, rules):
+        self.config_validated.emit(*self._run(self.kernel_comm.validate_applied_config, rules))
+
+    @pyqtSlot(object)
+    def check_digest(self, digest):
+        self.digest_checked.emit(*self._run(self.kernel_comm.confirm_digest, digest))
+
+    @pyqtSlot(object)
+    def validate_rules(self, rules):
+        from firewall_ui.models.validation import validate_many
+        self.rules_validated.emit(rules, validate_many(rules))
+
+    def _run(self, call, *args):
+        # A cancel only applies to the request that was running
+        try:
+            return call(*args)
+        finally:
+            self.kernel_comm.cancel_event.clear()
+
+
+class KernelClient(QObject):
+    """
+    Asynchronous front end of a KernelCommunicator.
+
+    Requests are queued to a worker living on its own QThread and run one
+    at a time, so blocking socket calls never run on the GUI thread. The
+    results arrive as signals with the same values the KernelCommunicator
+    methods return:
+
+        config_received(config, error)
+        config_sent(success, error, validation_error)
+        config_validated(is_valid, error)
+        digest_checked(matches, error)
+
+    validate_rules() checks rules without the kernel module, also off the
+    GUI thread, and reports rules_validated(rules, report) with the
+    ValidationReport of validate_many().
+
+    send_config(rules, optimize=True) first reports the OptimizationResult
+    of optimize(rules) with config_optimized(result), then sends its rules.
+
+    progress(done, total) reports bytes moved by multipart transfers and
+    busy_changed(busy) whether any request is queued or running.
+    """
+    _get_requested = pyqtSignal()
+    _send_requested = pyqtSignal(object, bool)
+    _validate_requested = pyqtSignal(object)
+    _digest_check_requested = pyqtSignal(object)
+    _rules_validation_requested = pyqtSignal(object)
+
+    config_received = pyqtSignal(object, object)
+    config_sent = pyqtSignal(bool, object, object)
+    config_optimized = pyqtSignal(object)
+    config_validated = pyqtSignal(bool, object)
+    digest_checked = pyqtSignal(bool, object)
+    rules_validated = pyqtSignal(object, object)
+    progress = pyqtSignal(int, int)
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, kernel_comm, parent=None):
+        super().__init__(parent)
+        self.kernel_comm = kernel_comm
+        self._pending = 0
+
+        self._thread = QThread()
+        self._worker = _KernelWorker(kernel_comm)
+        self._worker.moveToThread(self._thread)
+        self._thread.finished.connect(self._worker.deleteLater)
+
+        self._get_requested.connect(self._worker.get_config)
+        self._send_requested.connect(self._worker.send_config)
+        self._validate_requested.connect(self._worker.validate_config)
+        self._digest_check_requested.connect(self._worker.check_digest)
+        self._rules_validation_requested.connect(self._worker.validate_rules)
+        self._worker.config_received.connect(
+            lambda *result: self._finish(self.config_received, result))
+        self._worker.config_sent.connect(
+            lambda *result: self._finish(self.config_sent, result))
+        self._worker.config_validated.connect(
+            lambda *result: self._finish(self.config_validated, result))
+        self._worker.digest_checked.connect(
+            lambda *result: self._finish(self.digest_checked, result))
+        self._worker.rules_validated.connect(
+            lambda *result: self._finish(self.rules_validated, result))
+        self._worker.config_optimized.connect(self.config_optimized)
+        self._worker.progress.connect(self.progress)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def get_config(self):
+        self._start()
+        self._get_requested.emit()
+
+    def send_config(self, rules, optimize=False):
+        self._start()
+        self._send_requested.emit(list(rules), optimize)
+
+    def validate_config(self, rules):
+        self._start()
+        self._validate_requested.emit(list(rules))
+
+    def check_digest(self, digest):
+        """Ask whether the kernel module's rule digest is digest"""
+        self._start()
+        self._digest_check_requested.emit(digest)
+
+    def validate_rules(self, rules):
+        """Check rules, a list of Rule objects, before they are applied"""
+        self._start()
+        self._rules_validation_requested.emit(rules)
+
+    def cancel(self):
+        """Abort the running multipart transfer at the next chunk"""
+        if self._pending:
+            self.kernel_comm.cancel_event.set()
+
+    def shutdown(self):
+        """Stop the worker thread once the running request has finished"""
+        self.cancel()
+        self._thread.quit()
+        self._thread.wait()
+
+    def _start(self):
+        self._pending += 1
+        if self._pending == 1:
+            self.busy_changed.emit(True)
+
+    def _finish(self, signal, result):
+        self._pending -= 1
+        if self._pending == 0:
+            self.busy_changed.emit(False)
+        signal.emit(*result)
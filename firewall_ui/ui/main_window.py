@@ -1,16 +1,44 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QTabWidget, QTextEdit, QMessageBox)
-from PyQt6.QtCore import Qt
-from firewall_ui.ui.rule_dialog import RuleDialog
+                             QPushButton, QTabWidget, QMessageBox, QCheckBox,
+                             QProgressBar, QFileDialog, QApplication)
+from PyQt6.QtCore import Qt, QTimer
 from firewall_ui.ui.widgets.rule_table import RuleTableWidget
+from firewall_ui.ui.widgets.log_view import LogView
+from firewall_ui.ui.widgets.lazy_tab import LazyTab
+from firewall_ui.config.settings import (OPTIMIZE_RULES_ON_APPLY, METRICS_FILE,
+                                         RULESET_SNAPSHOT_FILE, HISTORY_LIMIT)
 from firewall_ui.utils.logger import FirewallLogger
-from firewall_ui.utils.kernel_comm import KernelCommunicator
+from firewall_ui.utils.metrics import metrics, MetricsExporter
+# Dialogs, the analysis, metrics and history tabs, validation, the optimizer,
+# rule files, the ruleset history and the kernel communication stack are
+# imported where they are first used, so the window can paint before they
+# load.
+
+RULE_FILE_FILTERS = {
+    "JSON (*.json)": "json",
+    "CSV (*.csv)": "csv",
+    "iptables-save (*.rules *.save)": "iptables",
+}
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.logger_manager = FirewallLogger()
         self.logger = self.logger_manager.get_logger()
-        self.kernel_comm = KernelCommunicator()
+        # Created by connect_kernel() once the window is up
+        self.kernel_comm = None
+        self.kernel_client = None
+        self.snapshot_cache = None
+        # Rules shown from the snapshot cache are coming in, and the kernel
+        # module has not confirmed them yet
+        self.loading_snapshot = False
+        self.snapshot_unconfirmed = False
+        # The configuration requested from the kernel module is coming in
+        self.loading_kernel = False
+        self.rules_loading = True
+        # Rulesets applied or loaded this session, created with the kernel
+        # stack, and the (rules, note, rollback) of the push in progress
+        self.rule_history = None
+        self.pending_apply = None
         self.setWindowTitle("Firewall Rules Manager")
         self.setGeometry(100, 100, 800, 600)
 
@@ -53,44 +81,281 @@ class MainWindow(QMainWindow):
         clone_button = QPushButton("Clone Rule")
         clone_button.clicked.connect(self.clone_rule)
         button_layout.addWidget(clone_button)
+
+        # Import replaces the rules with those of a file, Export saves them
+        import_button = QPushButton("Import...")
+        import_button.clicked.connect(self.import_rules)
+        button_layout.addWidget(import_button)
+
+        export_button = QPushButton("Export...")
+        export_button.clicked.connect(self.export_rules)
+        button_layout.addWidget(export_button)
+
+        # Disabled while rules are still coming in
+        self.edit_buttons = [add_button, edit_button, delete_button, clone_button,
+                             import_button, export_button]
+        # The RuleReader of an import in progress
+        self.import_reader = None
         
-        # Apply Rules button
-        apply_button = QPushButton("Apply Rules")
-        apply_button.clicked.connect(self.apply_rules)
-        button_layout.addWidget(apply_button)
+        # Optimize on apply toggle
+        self.optimize_checkbox = QCheckBox("Optimize")
+        self.optimize_checkbox.setToolTip("Merge ranges and drop never-matching rules before applying")
+        self.optimize_checkbox.setChecked(OPTIMIZE_RULES_ON_APPLY)
+        button_layout.addWidget(self.optimize_checkbox)
+
+        # Apply Rules button, enabled once the kernel is connected and the
+        # initial rules are loaded
+        self.apply_button = QPushButton("Apply Rules")
+        self.apply_button.clicked.connect(self.apply_rules)
+        self.apply_button.setEnabled(False)
+        button_layout.addWidget(self.apply_button)
+
+        # Transfer progress, shown while talking to the kernel module
+        self.transfer_progress = QProgressBar()
+        self.transfer_progress.setMaximumWidth(150)
+        self.transfer_progress.hide()
+        button_layout.addWidget(self.transfer_progress)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.hide()
+        button_layout.addWidget(self.cancel_button)
 
         rules_layout.addLayout(button_layout)
 
         # Create Logs Tab
         logs_tab = QWidget()
         logs_layout = QVBoxLayout(logs_tab)
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        logs_layout.addWidget(self.log_text)
+        self.log_view = LogView()
+        logs_layout.addWidget(self.log_view)
         
+        # Analysis, Metrics and History tabs are built when first opened
+        self.analysis_tab = LazyTab(self.create_analysis_panel)
+        self.metrics_tab = LazyTab(self.create_metrics_view)
+        self.history_tab = LazyTab(self.create_history_view)
+
         # Add tabs to tab widget
         self.tab_widget.addTab(rules_tab, "Firewall Rules")
+        self.tab_widget.addTab(self.analysis_tab, "Analysis")
         self.tab_widget.addTab(logs_tab, "Logs")
+        self.tab_widget.addTab(self.metrics_tab, "Metrics")
+        self.tab_widget.addTab(self.history_tab, "History")
+
+        # Show log records in the Logs tab
+        self.logger_manager.add_sink(self.log_view.handler)
+
+        # Keep the metrics file up to date for local scrapers
+        self.metrics_exporter = None
+        if METRICS_FILE:
+            self.metrics_exporter = MetricsExporter(metrics, METRICS_FILE)
+            self.metrics_exporter.start()
+
+        self.rule_table.loading_finished.connect(self.on_rules_loaded)
+        self.rule_table.loading_progress.connect(self.on_rules_progress)
+        self.rule_table.loading_failed.connect(self.on_rules_failed)
 
-        # Connect the custom handler to update logs
-        qt_handler = self.logger_manager.get_qt_handler()
-        qt_handler.new_log.connect(self.update_logs)
+        # Connect and load the initial configuration after the first paint
+        # (see paintEvent), so the window shows without waiting for it
+        self.kernel_started = False
 
-        # Load initial configuration
+    @property
+    def analysis_panel(self):
+        return self.analysis_tab.ensure_widget()
+
+    @property
+    def metrics_view(self):
+        return self.metrics_tab.ensure_widget()
+
+    def create_analysis_panel(self):
+        from firewall_ui.ui.widgets.analysis_panel import AnalysisPanel
+        panel = AnalysisPanel(self.rule_table.get_all_rules, self.logger)
+        panel.rule_activated.connect(self.show_rule)
+        return panel
+
+    def create_metrics_view(self):
+        from firewall_ui.ui.widgets.metrics_view import MetricsView
+        return MetricsView(metrics)
+
+    def create_history_view(self):
+        from firewall_ui.ui.widgets.history_view import HistoryView
+        view = HistoryView(self.rule_history)
+        view.rollback_requested.connect(self.rollback_to)
+        return view
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.kernel_started:
+            self.kernel_started = True
+            QTimer.singleShot(0, self.connect_kernel)
+
+    def connect_kernel(self):
+        from firewall_ui.utils.snapshot_cache import SnapshotCache
+        snapshot = None
+        if RULESET_SNAPSHOT_FILE:
+            self.snapshot_cache = SnapshotCache(RULESET_SNAPSHOT_FILE)
+            snapshot = self.snapshot_cache.load()
+        if snapshot is not None:
+            # Shown right away; editing waits for the kernel to confirm it
+            self.logger.info(f"Showing {len(snapshot)} rules from the configuration snapshot")
+            self.set_rules_loading(True)
+            self.loading_snapshot = self.snapshot_unconfirmed = True
+            self.rule_table.load_rule_batches(
+                snapshot.rule_batches(self.rule_table.LOAD_BATCH_SIZE))
+
+        from firewall_ui.policy.history import RuleHistory
+        from firewall_ui.utils.kernel_comm import KernelCommunicator
+        from firewall_ui.ui.kernel_client import KernelClient
+        self.rule_history = RuleHistory(HISTORY_LIMIT)
+        self.kernel_comm = KernelCommunicator(snapshot_cache=self.snapshot_cache)
+        self.kernel_client = KernelClient(self.kernel_comm, self)
+        self.kernel_client.busy_changed.connect(self.on_kernel_busy)
+        self.kernel_client.progress.connect(self.on_kernel_progress)
+        self.kernel_client.config_sent.connect(self.on_config_sent)
+        self.kernel_client.config_optimized.connect(self.on_config_optimized)
+        self.kernel_client.rules_validated.connect(self.on_rules_validated)
+        self.kernel_client.digest_checked.connect(self.on_snapshot_checked)
+        self.cancel_button.clicked.connect(self.kernel_client.cancel)
+        if snapshot is not None:
+            self.kernel_client.check_digest(snapshot.digest)
+        else:
+            self.load_initial_config()
+
+    def on_snapshot_checked(self, matches, error):
+        self.snapshot_unconfirmed = False
+        if matches:
+            self.logger.info("Kernel module confirmed the configuration snapshot")
+            if not self.loading_snapshot:
+                self.record_version(self.rule_table.get_all_rules(), "Loaded from kernel module")
+                self.set_rules_loading(False)
+            return
+        if error:
+            self.logger.warning(f"Could not confirm the configuration snapshot: {error}")
+        else:
+            self.logger.info("Configuration snapshot is out of date, loading from kernel module")
+        try:
+            self.snapshot_cache.invalidate()
+        except OSError as e:
+            self.logger.warning(f"Could not remove the configuration snapshot: {e}")
+        # Stop showing the snapshot rules; the table stays read-only until
+        # the kernel module's configuration is in
+        self.loading_snapshot = False
+        self.rule_table.set_rules([])
         self.load_initial_config()
 
     def load_initial_config(self):
-        config, error = self.kernel_comm.get_current_config()
+        self.set_rules_loading(True)
+        self.loading_kernel = True
+        self.kernel_client.config_received.connect(self.on_initial_config)
+        self.kernel_client.get_config()
+
+    def on_initial_config(self, config, error):
+        self.kernel_client.config_received.disconnect(self.on_initial_config)
         if error:
+            # Also drops unconfirmed snapshot rules
+            self.loading_kernel = False
+            self.rule_table.load_rules([])
+            self.set_rules_loading(False)
             self.logger.error(f"Failed to load initial config: {error}")
             QMessageBox.warning(self, "Communication Error",
                               f"Failed to load configuration from kernel module: {error}\n"
                               "The application will start with empty configuration.")
         else:
-            self.rule_table.load_rules(config)
-            self.logger.info("Successfully loaded configuration from kernel module")
+            # Rows appear batch by batch; on_rules_loaded follows
+            self.rule_table.load_rules_progressively(config)
+
+    def on_rules_loaded(self, count):
+        if self.import_reader:
+            self.logger.info(f"Imported {count} rules from {self.import_reader.path}")
+            self.finish_import()
+        elif self.loading_snapshot:
+            self.loading_snapshot = False
+            self.logger.info(f"Loaded {count} rules from the configuration snapshot")
+            if self.snapshot_unconfirmed:
+                # Editing is enabled by on_snapshot_checked
+                return
+            self.record_version(self.rule_table.get_all_rules(), "Loaded from kernel module")
+        elif self.loading_kernel:
+            self.loading_kernel = False
+            self.logger.info(f"Successfully loaded configuration from kernel module ({count} rules)")
+            self.record_version(self.rule_table.get_all_rules(), "Loaded from kernel module")
+        else:
+            # A load that was replaced before it finished
+            return
+        self.set_rules_loading(False)
+
+    def on_rules_progress(self, count):
+        if self.import_reader and self.import_reader.size:
+            self.transfer_progress.setValue(self.import_reader.position)
+
+    def on_rules_failed(self, error):
+        self.set_rules_loading(False)
+        path = (self.import_reader.path if self.import_reader
+                else "configuration snapshot" if self.loading_snapshot else "kernel module")
+        self.loading_snapshot = self.loading_kernel = False
+        self.finish_import()
+        self.logger.error(f"Failed to load rules from {path}: {error}")
+        QMessageBox.critical(self, "Loading Failed",
+                             f"Failed to load rules from {path}:\n{error}\n"
+                             "The previous rules were kept.")
+
+    def import_rules(self):
+        from firewall_ui.utils.rule_files import RuleReader, RuleFileError
+        path, selected = QFileDialog.getOpenFileName(
+            self, "Import Rules", "",
+            ";;".join(["Rule files (*.json *.csv *.rules *.save)", *RULE_FILE_FILTERS,
+                       "All files (*)"]))
+        if not path:
+            return
+        try:
+            # Batches small enough to keep each time slice of the load short
+            self.import_reader = RuleReader(path, RULE_FILE_FILTERS.get(selected),
+                                            batch_size=self.rule_table.LOAD_BATCH_SIZE)
+        except RuleFileError as e:
+            QMessageBox.critical(self, "Import Failed", str(e))
+            return
+        self.logger.info(f"Importing {self.import_reader.format} rules from {path}")
+        self.transfer_progress.setRange(0, self.import_reader.size or 0)
+        self.transfer_progress.setValue(0)
+        self.transfer_progress.show()
+        self.set_rules_loading(True)
+        # Rules are parsed, validated and added a batch at a time
+        self.rule_table.load_rule_batches(self.import_reader)
+
+    def finish_import(self):
+        if self.import_reader:
+            self.import_reader.close()
+            self.import_reader = None
+            self.transfer_progress.hide()
+
+    def export_rules(self):
+        from firewall_ui.utils.rule_files import write_rules, detect_format, RuleFileError
+        path, selected = QFileDialog.getSaveFileName(
+            self, "Export Rules", "", ";;".join(RULE_FILE_FILTERS))
+        if not path:
+            return
+        file_format = detect_format(path) or RULE_FILE_FILTERS.get(selected, "json")
+        rules = self.rule_table.get_all_rules()
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as rule_file:
+                write_rules(rule_file, rules, file_format)
+        except (OSError, RuleFileError) as e:
+            self.logger.error(f"Failed to export rules to {path}: {e}")
+            QMessageBox.critical(self, "Export Failed", f"Failed to export rules: {e}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.logger.info(f"Exported {len(rules)} rules to {path}")
+
+    def set_rules_loading(self, loading):
+        self.rules_loading = loading
+        for button in self.edit_buttons:
+            button.setEnabled(not loading)
+        self.rule_table.set_read_only(loading)
+        self.apply_button.setEnabled(not loading and self.kernel_client is not None
+                                     and not self.kernel_client.busy)
 
     def add_rule(self):
+        from firewall_ui.ui.rule_dialog import RuleDialog
         dialog = RuleDialog(self)
         if dialog.exec():
             new_rule = dialog.get_rule()
@@ -100,6 +365,7 @@ class MainWindow(QMainWindow):
     def edit_rule(self):
         selected_row = self.rule_table.currentRow()
         if selected_row >= 0:
+            from firewall_ui.ui.rule_dialog import RuleDialog
             rule = self.rule_table.get_rule(selected_row)
             dialog = RuleDialog(self, rule)
             if dialog.exec():
@@ -127,9 +393,52 @@ class MainWindow(QMainWindow):
             self.logger.warning("No rule selected for cloning")
     
     def apply_rules(self):
-       rules = self.rule_table.get_all_rules()
-       success, error, validation_error = self.kernel_comm.send_config(rules)
+       # Validated on the kernel client thread, then pushed by on_rules_validated
+       self.kernel_client.validate_rules(self.rule_table.get_all_rules())
+
+    def on_rules_validated(self, rules, report):
+       if not report.ok:
+           self.logger.error(f"Not applying rules, validation failed: {report.summary()}")
+           QMessageBox.critical(self, "Invalid Rules", report.summary())
+           return
+       self.push_rules(rules, "Applied", False)
+
+    def push_rules(self, rules, note, rollback):
+       """
+       Send rules to the kernel module, optimized if that is switched on.
+       The history records rules as given, the way they are in the table.
+       """
+       # RuleStore never changes a rule in place, so the table's edits
+       # while the push runs do not reach the recorded version
+       self.pending_apply = (rules, note, rollback)
+       # Optimized on the kernel client thread, see on_config_optimized
+       self.kernel_client.send_config(rules, optimize=self.optimize_checkbox.isChecked())
+
+    def on_config_optimized(self, result):
+       self.logger.info(f"Optimized ruleset before apply: {result.summary()}")
+
+    def rollback_to(self, number):
+       if self.rules_loading or self.kernel_client.busy:
+           self.logger.warning(f"Not rolling back to version {number} while rules are loading "
+                               "or being applied")
+           return
+       rules = self.rule_history.rules(number)
+       self.logger.info(f"Rolling back to version {number} ({len(rules)} rules)")
+       self.push_rules(rules, f"Rolled back to version {number}", True)
+
+    def record_version(self, rules, note):
+       version = self.rule_history.record(rules, note)
+       self.logger.debug(f"Recorded ruleset version {version.number}: {version.changes or note}")
+       if self.history_tab.widget is not None:
+           self.history_tab.widget.refresh()
+
+    def on_config_sent(self, success, error, validation_error):
+       rules, note, rollback = self.pending_apply
+       self.pending_apply = None
        if success:
+           if rollback:
+               self.rule_table.set_rules(rules)
+           self.record_version(rules, note if not validation_error else f"{note} (unverified)")
            if validation_error:
                self.logger.warning(f"Rules applied but validation failed: {validation_error}")
                QMessageBox.warning(self, "Warning", 
@@ -144,6 +453,29 @@ class MainWindow(QMainWindow):
     
     
     
-    def update_logs(self, log_text):
-        self.log_text.append(log_text)
+    def on_kernel_busy(self, busy):
+        self.apply_button.setEnabled(not busy and not self.rules_loading)
+        self.cancel_button.setVisible(busy)
+        self.transfer_progress.setVisible(busy)
+        # Busy indicator until a multipart transfer reports its size
+        self.transfer_progress.setRange(0, 0)
+
+    def on_kernel_progress(self, done, total):
+        self.transfer_progress.setRange(0, max(total, 1))
+        self.transfer_progress.setValue(done)
+
+    def closeEvent(self, event):
+        self.finish_import()
+        if self.kernel_client:
+            self.kernel_client.shutdown()
+            self.kernel_comm.close()
+        self.logger_manager.remove_sink(self.log_view.handler)
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        super().closeEvent(event)
+
+    def show_rule(self, row):
+        self.tab_widget.setCurrentIndex(0)
+        self.rule_table.select_row(row)
+
     
\ No newline at end of file
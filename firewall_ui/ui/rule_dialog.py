@@ -2,6 +2,7 @@ from PyQt6.QtWidgets import (QDialog, QFormLayout, QLineEdit, QComboBox,
                              QSpinBox, QPushButton, QVBoxLayout, QDialogButtonBox, 
                              QMessageBox, QGridLayout, QLabel)
 from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.models.validation import validate_many
 import ipaddress
 
 def is_valid_ip(ip_string):
@@ -169,9 +170,9 @@ class RuleDialog(QDialog):
             sender.setFocus()
 
     def accept(self):
-        try:
-            rule = self.get_rule()
-            rule.validate()
+        report = validate_many([self.get_rule()])
+        if report.ok:
             super().accept()
-        except ValueError as e:
-            QMessageBox.warning(self, "Invalid Input", str(e))
\ No newline at end of file
+        else:
+            QMessageBox.warning(self, "Invalid Input",
+                                "Invalid rule:\n" + "\n".join(report.errors[0]))
\ No newline at end of file
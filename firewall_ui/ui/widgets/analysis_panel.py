@@ -0,0 +1,104 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableView, QAbstractItemView, QApplication)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from firewall_ui.models.validation import validate_many
+from firewall_ui.policy.analyzer import analyze
+
+FINDING_COLUMNS = ["Type", "Rule", "Related Rule", "Details"]
+
+
+class FindingsModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._findings = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._findings)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(FINDING_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return FINDING_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        finding = self._findings[index.row()]
+        column = index.column()
+        if column == 0:
+            return finding.kind.capitalize()
+        if column == 1:
+            return str(finding.rule + 1)
+        if column == 2:
+            return str(finding.other + 1)
+        return finding.detail
+
+    def set_findings(self, findings):
+        self.beginResetModel()
+        self._findings = list(findings)
+        self.endResetModel()
+
+    def finding(self, row):
+        return self._findings[row]
+
+
+class AnalysisPanel(QWidget):
+    """
+    Shows shadowed, redundant and mergeable rules of the current rule list.
+
+    rule_activated is emitted with the 0-based row of the rule a finding is
+    about when the finding is double-clicked.
+    """
+    rule_activated = pyqtSignal(int)
+
+    def __init__(self, get_rules, logger=None):
+        super().__init__()
+        self.get_rules = get_rules
+        self.logger = logger
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        self.summary_label = QLabel("Press \"Analyze\" to check the current rules")
+        top_layout.addWidget(self.summary_label)
+        top_layout.addStretch()
+        analyze_button = QPushButton("Analyze")
+        analyze_button.clicked.connect(self.run_analysis)
+        top_layout.addWidget(analyze_button)
+        layout.addLayout(top_layout)
+
+        self.model = FindingsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.doubleClicked.connect(self.on_double_clicked)
+        layout.addWidget(self.table)
+
+    def run_analysis(self):
+        rules = self.get_rules()
+        validation = validate_many(rules)
+        if not validation.ok:
+            self.model.set_findings([])
+            self.summary_label.setText(f"Fix invalid rules first. {validation.summary(limit=3)}")
+            return
+
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            report = analyze(rules)
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.model.set_findings(report.findings)
+        self.summary_label.setText(report.summary())
+        if self.logger:
+            self.logger.info(f"Rule analysis: {report.summary()}")
+
+    def on_double_clicked(self, index):
+        self.rule_activated.emit(self.model.finding(index.row()).rule)
@@ -0,0 +1,116 @@
+import time
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableView, QAbstractItemView, QHeaderView)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+HISTORY_COLUMNS = ["Version", "Applied", "Rules", "Changes", "Note"]
+
+
+class HistoryModel(QAbstractTableModel):
+    """The versions of a RuleHistory, newest first"""
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self._versions = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._versions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HISTORY_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return HISTORY_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        version = self._versions[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(version.number)
+        if column == 1:
+            return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version.time))
+        if column == 2:
+            return str(len(version))
+        if column == 3:
+            return version.changes
+        return version.note
+
+    def version(self, row):
+        return self._versions[row]
+
+    def refresh(self):
+        self.beginResetModel()
+        self._versions = list(reversed(self.history.versions))
+        self.endResetModel()
+
+
+class HistoryView(QWidget):
+    """
+    History tab: every ruleset applied or loaded this session. Roll Back
+    emits rollback_requested(number) for the selected version.
+    """
+    rollback_requested = pyqtSignal(int)
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.model = HistoryModel(history, self)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        button_layout.addWidget(self.summary_label)
+        button_layout.addStretch()
+        self.rollback_button = QPushButton("Roll Back")
+        self.rollback_button.setToolTip("Apply the selected version again")
+        self.rollback_button.setEnabled(False)
+        self.rollback_button.clicked.connect(self.roll_back)
+        button_layout.addWidget(self.rollback_button)
+        layout.addLayout(button_layout)
+
+    def showEvent(self, event):
+        self.refresh()
+        super().showEvent(event)
+
+    def refresh(self):
+        self.model.refresh()
+        self.on_selection_changed()
+
+    def selected_version(self):
+        rows = self.table.selectionModel().selectedRows()
+        return self.model.version(rows[0].row()) if rows else None
+
+    def on_selection_changed(self, *args):
+        selected = self.selected_version()
+        latest = self.history.latest
+        if selected is None or selected is latest:
+            self.rollback_button.setEnabled(False)
+            self.summary_label.setText(f"{len(self.history)} versions")
+            return
+        self.rollback_button.setEnabled(True)
+        delta = self.history.diff(latest.number, selected.number)
+        self.summary_label.setText(f"Rolling back to version {selected.number}: "
+                                   f"{delta.summary()}")
+
+    def roll_back(self):
+        selected = self.selected_version()
+        if selected is not None:
+            self.rollback_requested.emit(selected.number)
@@ -0,0 +1,29 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout
+
+
+class LazyTab(QWidget):
+    """
+    Tab page that builds its content the first time it is shown.
+
+    factory is called with no arguments and returns the widget to show, so
+    a tab's module can be imported inside the factory and stay off the
+    startup path until the user opens the tab.
+    """
+
+    def __init__(self, factory, parent=None):
+        super().__init__(parent)
+        self._factory = factory
+        self.widget = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def showEvent(self, event):
+        self.ensure_widget()
+        super().showEvent(event)
+
+    def ensure_widget(self):
+        """Build the content now if it has not been built yet, and return it"""
+        if self.widget is None:
+            self.widget = self._factory()
+            self.layout().addWidget(self.widget)
+        return self.widget
@@ -0,0 +1,215 @@
+import logging
+import threading
+from collections import deque
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QListView, QComboBox,
+                             QLineEdit, QLabel, QAbstractItemView)
+from PyQt6.QtCore import (Qt, QAbstractListModel, QModelIndex, QObject, QTimer,
+                          pyqtSignal)
+from PyQt6.QtGui import QColor, QFontDatabase
+from firewall_ui.config.settings import LOG_VIEW_CAPACITY
+
+LEVELS = [("Debug", logging.DEBUG), ("Info", logging.INFO),
+          ("Warning", logging.WARNING), ("Error", logging.ERROR)]
+LEVEL_COLORS = {logging.DEBUG: QColor("gray"), logging.WARNING: QColor("darkorange"),
+                logging.ERROR: QColor("red"), logging.CRITICAL: QColor("red")}
+
+
+class LogViewHandler(QObject, logging.Handler):
+    """
+    Logging sink feeding a LogView.
+
+    Formatted records are kept as (level, text) pairs until the view takes
+    them; at most capacity of them, so a stalled GUI cannot grow memory.
+    records_pending is emitted once when the first record arrives after
+    take_pending(), not once per record.
+    """
+    records_pending = pyqtSignal()
+
+    def __init__(self, capacity=LOG_VIEW_CAPACITY):
+        super().__init__()
+        logging.Handler.__init__(self)
+        self._pending = deque(maxlen=capacity)
+        self._pending_lock = threading.Lock()
+        self._notified = False
+
+    def emit(self, record):
+        entry = (record.levelno, self.format(record))
+        with self._pending_lock:
+            self._pending.append(entry)
+            notify, self._notified = not self._notified, True
+        if notify:
+            self.records_pending.emit()
+
+    def take_pending(self):
+        with self._pending_lock:
+            entries = list(self._pending)
+            self._pending.clear()
+            self._notified = False
+        return entries
+
+
+class LogModel(QAbstractListModel):
+    """
+    The last capacity log entries, showing those at or above a level.
+
+    Both the entries and the shown rows live in fixed-size ring buffers,
+    so memory stays flat however long the application runs.
+    """
+
+    def __init__(self, capacity=LOG_VIEW_CAPACITY, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.level = logging.DEBUG
+        self._entries = deque(maxlen=capacity)
+        self._rows = deque(maxlen=capacity)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        level, text = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return text
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return LEVEL_COLORS.get(level)
+        return None
+
+    def append_entries(self, entries):
+        """Add entries at the end, dropping the oldest rows past capacity"""
+        self._entries.extend(entries)
+        shown = [entry for entry in entries if entry[0] >= self.level][-self.capacity:]
+        if not shown:
+            return
+        overflow = len(self._rows) + len(shown) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self._rows.popleft()
+            self.endRemoveRows()
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(shown) - 1)
+        self._rows.extend(shown)
+        self.endInsertRows()
+
+    def set_level(self, level):
+        self.beginResetModel()
+        self.level = level
+        self._rows = deque((entry for entry in self._entries if entry[0] >= level),
+                           maxlen=self.capacity)
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._entries.clear()
+        self._rows.clear()
+        self.endResetModel()
+
+    def find(self, text, start=0, backwards=False):
+        """Return the first row from start on containing text, wrapping around, or -1"""
+        count = len(self._rows)
+        if not text or not count:
+            return -1
+        needle = text.casefold()
+        rows = list(self._rows)
+        step = -1 if backwards else 1
+        for offset in range(count):
+            row = (start + step * offset) % count
+            if needle in rows[row][1].casefold():
+                return row
+        return -1
+
+
+class LogView(QWidget):
+    """
+    Logs tab: a virtualized list of the most recent log records with a
+    minimum level filter and incremental search.
+
+    Records reach the view through handler, which is added to the logging
+    pipeline as a sink. They are inserted in batches at most every
+    REFRESH_INTERVAL ms, and the view follows new records while it is
+    scrolled to the bottom.
+    """
+    REFRESH_INTERVAL = 100
+
+    def __init__(self, capacity=LOG_VIEW_CAPACITY, parent=None):
+        super().__init__(parent)
+        self.handler = LogViewHandler(capacity)
+        self.model = LogModel(capacity, self)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self.REFRESH_INTERVAL)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self.handler.records_pending.connect(self._refresh_timer.start)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        top_layout.addWidget(QLabel("Level:"))
+        self.level_combo = QComboBox()
+        for name, level in LEVELS:
+            self.level_combo.addItem(name, level)
+        self.level_combo.currentIndexChanged.connect(self.on_level_changed)
+        top_layout.addWidget(self.level_combo)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search (Enter for next match)")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.on_search_changed)
+        self.search_edit.returnPressed.connect(self.find_next)
+        top_layout.addWidget(self.search_edit)
+        self.match_label = QLabel()
+        top_layout.addWidget(self.match_label)
+        layout.addLayout(top_layout)
+
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        # Rows of equal height let the view skip measuring every entry, and
+        # batched layout keeps a full buffer from being laid out at once
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.list_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.list_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        layout.addWidget(self.list_view)
+
+    def refresh(self):
+        """Insert the records that arrived since the last refresh"""
+        entries = self.handler.take_pending()
+        if not entries:
+            return
+        scrollbar = self.list_view.verticalScrollBar()
+        following = scrollbar.value() == scrollbar.maximum()
+        self.model.append_entries(entries)
+        if following:
+            self.list_view.scrollToBottom()
+
+    def on_level_changed(self, index):
+        self.model.set_level(self.level_combo.itemData(index))
+        self.list_view.scrollToBottom()
+
+    def on_search_changed(self, text):
+        # Typing refines the current match, so search from it rather than past it
+        self.find(text, self.current_row(), backwards=False)
+
+    def find_next(self):
+        self.find(self.search_edit.text(), self.current_row() + 1)
+
+    def find(self, text, start, backwards=False):
+        row = self.model.find(text, start, backwards)
+        if row < 0:
+            self.list_view.clearSelection()
+            self.match_label.setText("No match" if text else "")
+            return row
+        index = self.model.index(row)
+        self.list_view.setCurrentIndex(index)
+        self.list_view.scrollTo(index)
+        self.match_label.setText("")
+        return row
+
+    def current_row(self):
+        index = self.list_view.currentIndex()
+        return index.row() if index.isValid() else 0
@@ -0,0 +1,118 @@
+from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableView, QAbstractItemView, QHeaderView)
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from firewall_ui.utils.metrics import metrics as default_metrics
+
+SPAN_COLUMNS = ["Span", "Calls", "Average (ms)", "Max (ms)", "Last (ms)", "Total (s)"]
+COUNTER_COLUMNS = ["Counter", "Value"]
+
+
+class SnapshotModel(QAbstractTableModel):
+    """One section ("spans" or "counters") of a Metrics.snapshot()"""
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self._rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole and index.column() > 0:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self._rows[index.row()][index.column()]
+
+    def set_rows(self, rows):
+        if rows == self._rows:
+            return
+        if len(rows) == len(self._rows):
+            # Same metrics, new values: keep the selection and scroll position
+            self._rows = rows
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(rows) - 1, len(self.columns) - 1))
+            return
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+
+class MetricsView(QWidget):
+    """
+    Metrics tab: span timings and counters of the kernel communication,
+    refreshed every REFRESH_INTERVAL ms while the tab is shown.
+    """
+    REFRESH_INTERVAL = 1000
+
+    def __init__(self, registry=default_metrics, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self.span_model = SnapshotModel(SPAN_COLUMNS, self)
+        self.counter_model = SnapshotModel(COUNTER_COLUMNS, self)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(self.REFRESH_INTERVAL)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout(self)
+
+        self.span_table = self._table(self.span_model)
+        layout.addWidget(self.span_table, 3)
+        self.counter_table = self._table(self.counter_model)
+        layout.addWidget(self.counter_table, 2)
+
+        button_layout = QHBoxLayout()
+        self.summary_label = QLabel()
+        button_layout.addWidget(self.summary_label)
+        button_layout.addStretch()
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(reset_button)
+        layout.addLayout(button_layout)
+
+    def _table(self, model):
+        table = QTableView()
+        table.setModel(model)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().hide()
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        return table
+
+    def showEvent(self, event):
+        self.refresh()
+        self._refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        snapshot = self.registry.snapshot()
+        self.span_model.set_rows([
+            [name, str(stats["count"]), f"{stats['average'] * 1000:.2f}",
+             f"{stats['maximum'] * 1000:.2f}", f"{stats['last'] * 1000:.2f}",
+             f"{stats['total']:.3f}"]
+            for name, stats in snapshot["spans"].items()])
+        self.counter_model.set_rows([[name, str(value)]
+                                     for name, value in snapshot["counters"].items()])
+        self.summary_label.setText(f"{len(snapshot['spans'])} spans, "
+                                   f"{len(snapshot['counters'])} counters")
+
+    def reset(self):
+        self.registry.reset()
+        self.refresh()
@@ -1,295 +1,339 @@
-from PyQt6.QtWidgets import QTableWidget, QTableWidgetItem, QAbstractItemView, QWidget, QVBoxLayout, QHBoxLayout, QPushButton
-from PyQt6.QtCore import Qt
-from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from PyQt6.QtWidgets import QTableView, QAbstractItemView, QWidget, QVBoxLayout, QHBoxLayout, QPushButton
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from dataclasses import replace
+import time
+from itertools import islice
+from firewall_ui.models.rule import Rule
+from firewall_ui.models.rule_store import RuleStore
+from firewall_ui.config.settings import RULE_TABLE_COLUMNS
+from firewall_ui.utils.metrics import metrics
+
+ENABLED_COLUMN = 6
+
+
+def format_endpoint(address_start, address_end, port_start, port_end):
+    """Format an address/port range the way it is shown in the rule table"""
+    address = (f"{address_start}-{address_end}"
+               if address_start != address_end
+               else address_start)
+    port = (f"{port_start}-{port_end}"
+            if port_start != port_end and port_start is not None
+            else str(port_start) if port_start is not None else "")
+    return f"{address}:{port}" if port else address
+
+
+class RuleTableModel(QAbstractTableModel):
+    """
+    Table model backed by a RuleStore.
+
+    Cell text is produced on demand in data(), so only the rows the view
+    actually paints are ever formatted.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._store = RuleStore()
+        # Set while the window must not let the user change the rules
+        self.read_only = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(RULE_TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return RULE_TABLE_COLUMNS[section]
+        return str(section + 1)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        rule = self._store[row]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.CheckStateRole:
+            if column == ENABLED_COLUMN:
+                return Qt.CheckState.Checked if rule.enabled else Qt.CheckState.Unchecked
+            return None
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+
+        if column == 0:
+            return str(row + 1)
+        if column == 1:
+            return format_endpoint(rule.source_address_start, rule.source_address_end,
+                                   rule.source_port_start, rule.source_port_end)
+        if column == 2:
+            return format_endpoint(rule.destination_address_start, rule.destination_address_end,
+                                   rule.destination_port_start, rule.destination_port_end)
+        if column == 3:
+            return rule.protocol.value
+        if column == 4:
+            return rule.action.value
+        if column == 5:
+            return rule.direction.value
+        if column == 7:
+            return rule.description
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == ENABLED_COLUMN and not self.read_only:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if (self.read_only or not index.isValid() or index.column() != ENABLED_COLUMN
+                or role != Qt.ItemDataRole.CheckStateRole):
+            return False
+        row = index.row()
+        self._store.replace(row, replace(self._store[row],
+                                         enabled=Qt.CheckState(value) == Qt.CheckState.Checked))
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def set_read_only(self, read_only):
+        self.read_only = read_only
+        if self._store:
+            # The check boxes change with the flags
+            self.dataChanged.emit(self.index(0, ENABLED_COLUMN),
+                                  self.index(len(self._store) - 1, ENABLED_COLUMN))
+
+    def rule(self, row):
+        return self._store[row]
+
+    def rules(self):
+        return self._store.rules()
+
+    def set_rules(self, rules):
+        """Replace the whole rule list with a single model reset"""
+        self.beginResetModel()
+        self._store = RuleStore(rules)
+        self.endResetModel()
+
+    def append_rule(self, rule):
+        row = len(self._store)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._store.append(rule)
+        self.endInsertRows()
+
+    def append_rules(self, rules):
+        """Append a batch of rules with a single row insertion"""
+        if not rules:
+            return
+        row = len(self._store)
+        self.beginInsertRows(QModelIndex(), row, row + len(rules) - 1)
+        self._store.extend(rules)
+        self.endInsertRows()
+
+    def replace_rule(self, row, rule):
+        self._store.replace(row, rule)
+        self._emit_row_changed(row)
+
+    def remove_rule(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._store.remove(row)
+        self.endRemoveRows()
+
+    def swap_rules(self, row1, row2):
+        self._store.swap(row1, row2)
+        self._emit_row_changed(row1)
+        self._emit_row_changed(row2)
+
+    def _emit_row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, len(RULE_TABLE_COLUMNS) - 1))
+
 
 class RuleTableWidget(QWidget):
+    # Emitted with the row count when a progressive load is done and after
+    # each of its time slices, and with the error if it failed
+    loading_finished = pyqtSignal(int)
+    loading_progress = pyqtSignal(int)
+    loading_failed = pyqtSignal(str)
+    # While loading, batches of up to LOAD_BATCH_SIZE rules are taken until
+    # LOAD_SLICE seconds have passed, then inserted and the event loop runs
+    LOAD_BATCH_SIZE = 1000
+    LOAD_SLICE = 0.03
+
     def __init__(self):
         super().__init__()
+        self._loading = None
+        self._previous_rules = None
+        self._load_timer = QTimer(self)
+        self._load_timer.timeout.connect(self._load_batch)
         self.setup_ui()
-    
+
+    @property
+    def loading(self):
+        return self._loading is not None
+
     def currentRow(self):
         """Get the currently selected row"""
-        selected_rows = self.table.selectedIndexes()
+        selected_rows = self.table.selectionModel().selectedRows()
         if not selected_rows:
             return -1
         return selected_rows[0].row()
 
+    def rowCount(self):
+        return self.model.rowCount()
+
+    def select_row(self, row):
+        self.table.selectRow(row)
+        self.table.scrollTo(self.model.index(row, 0))
+
     def removeRow(self, row):
         """Remove a row from the table"""
-        self.table.removeRow(row)
-        self.update_rule_ids()  # Update IDs after deletion
+        self.model.remove_rule(row)
 
     def clone_rule(self, row):
         """Clone a rule at the specified row and add it as a new rule"""
-        if row < 0 or row >= self.table.rowCount():
+        if row < 0 or row >= self.model.rowCount():
             return
 
-        # Get the rule to clone
-        original_rule = self.get_rule(row)
-
-        # Create new rule with same data but new ID
-        new_rule = Rule(
-            id=self.table.rowCount() + 1,  # New ID will be set by add_rule
-            source_address_start=original_rule.source_address_start,
-            source_address_end=original_rule.source_address_end,
-            source_port_start=original_rule.source_port_start,
-            source_port_end=original_rule.source_port_end,
-            destination_address_start=original_rule.destination_address_start,
-            destination_address_end=original_rule.destination_address_end,
-            destination_port_start=original_rule.destination_port_start,
-            destination_port_end=original_rule.destination_port_end,
-            protocol=original_rule.protocol,
-            action=original_rule.action,
-            direction=original_rule.direction,
-            enabled=original_rule.enabled,
-            description=f"{original_rule.description}"
-        )
-
-        # Add the cloned rule
-        self.add_rule(new_rule)
-
-    # Select the new rule
-        self.table.selectRow(self.table.rowCount() - 1)
+        # Add a copy of the rule, its ID is assigned by add_rule
+        self.add_rule(replace(self.get_rule(row)))
+
+        # Select the new rule
+        self.table.selectRow(self.model.rowCount() - 1)
 
     def setup_ui(self):
         layout = QHBoxLayout()
         self.setLayout(layout)
-        
+
         # Button container
         button_layout = QVBoxLayout()
-        
+
         # Create up/down buttons
         self.up_button = QPushButton("↑")
         self.down_button = QPushButton("↓")
         self.up_button.clicked.connect(self.move_row_up)
         self.down_button.clicked.connect(self.move_row_down)
-        
+
         button_layout.addWidget(self.up_button)
         button_layout.addWidget(self.down_button)
         button_layout.addStretch()  # Pushes buttons to the top
-        
+
         layout.addLayout(button_layout)
-        
+
         # Create table
-        self.table = QTableWidget()
+        self.model = RuleTableModel(self)
+        self.table = QTableView()
         self.setup_table()
         layout.addWidget(self.table)
-        
+
     def setup_table(self):
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Source", "Destination", "Protocol", 
-            "Action", "Direction", "Enabled", "Description"
-        ])
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-    
+
+    def set_read_only(self, read_only):
+        """Disable reordering and the Enabled check boxes, or enable them again"""
+        self.model.set_read_only(read_only)
+        self.up_button.setEnabled(not read_only)
+        self.down_button.setEnabled(not read_only)
+
     def move_row_up(self):
-        selected_rows = self.table.selectedIndexes()
-        if not selected_rows:
-            return
-            
-        current_row = selected_rows[0].row()
+        current_row = self.currentRow()
         if current_row <= 0:
             return
-            
+
         self.swap_rows(current_row, current_row - 1)
         self.table.selectRow(current_row - 1)
-    
+
     def move_row_down(self):
-        selected_rows = self.table.selectedIndexes()
-        if not selected_rows:
+        current_row = self.currentRow()
+        if current_row < 0 or current_row >= self.model.rowCount() - 1:
             return
-            
-        current_row = selected_rows[0].row()
-        if current_row >= self.table.rowCount() - 1:
-            return
-            
+
         self.swap_rows(current_row, current_row + 1)
         self.table.selectRow(current_row + 1)
-    
+
     def swap_rows(self, row1, row2):
-        # Store data from both rows
-        row1_data = []
-        row2_data = []
-        
-        for col in range(self.table.columnCount()):
-            # Save row1 data
-            item1 = self.table.item(row1, col)
-            if col == 6:  # Enabled column (checkbox)
-                row1_data.append(item1.checkState())
-            else:
-                row1_data.append(item1.text() if item1 else "")
-                
-            # Save row2 data
-            item2 = self.table.item(row2, col)
-            if col == 6:  # Enabled column (checkbox)
-                row2_data.append(item2.checkState())
-            else:
-                row2_data.append(item2.text() if item2 else "")
-        
-        # Swap the data
-        for col in range(self.table.columnCount()):
-            if col == 6:  # Enabled column (checkbox)
-                item1 = QTableWidgetItem()
-                item1.setCheckState(row2_data[col])
-                item2 = QTableWidgetItem()
-                item2.setCheckState(row1_data[col])
-            else:
-                item1 = QTableWidgetItem(row2_data[col])
-                item2 = QTableWidgetItem(row1_data[col])
-                
-                if col == 0:  # ID column
-                    item1.setFlags(item1.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                    item2.setFlags(item2.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                    
-            self.table.setItem(row1, col, item1)
-            self.table.setItem(row2, col, item2)
-        
-        self.update_rule_ids()
-    
-    def update_rule_ids(self):
-        """Update rule IDs after row reordering"""
-        for row in range(self.table.rowCount()):
-            # Update ID in table
-            id_item = QTableWidgetItem(str(row + 1))
-            id_item.setFlags(id_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, 0, id_item)
-    
+        self.model.swap_rules(row1, row2)
+
     def load_rules(self, config):
-        self.table.setRowCount(0)
-        for rule_data in config:
-            rule = Rule(
-                id=rule_data.get('id', 0),
-                source_address_start=rule_data.get('source_address_start'),
-                source_address_end=rule_data.get('source_address_end'),
-                source_port_start=rule_data.get('source_port_start'),
-                source_port_end=rule_data.get('source_port_end'),
-                destination_address_start=rule_data.get('destination_address_start'),
-                destination_address_end=rule_data.get('destination_address_end'),
-                destination_port_start=rule_data.get('destination_port_start'),
-                destination_port_end=rule_data.get('destination_port_end'),
-                protocol=Protocol(rule_data['protocol']),
-                action=Action(rule_data['action']),
-                direction=Direction(rule_data['direction']),
-                enabled=rule_data.get('enabled', True),
-                description=rule_data.get('description', '')
-            )
-            self.add_rule(rule)
+        self._stop_loading()
+        self.model.set_rules(Rule.from_dict(rule_data) for rule_data in config)
+
+    def set_rules(self, rules):
+        """Replace every rule with rules, a list of Rule objects"""
+        self._stop_loading()
+        self.model.set_rules(rules)
+
+    def load_rules_progressively(self, config):
+        """
+        Replace the rules with config, a list of rule dicts, a time slice at
+        a time so the window keeps painting and responding while a large
+        ruleset comes in. loading_finished is emitted at the end;
+        load_rules() or another progressive load stops an unfinished one.
+        """
+        config = iter(config)
+        self.load_rule_batches(iter(
+            lambda: [Rule.from_dict(rule_data)
+                     for rule_data in islice(config, self.LOAD_BATCH_SIZE)], []))
+
+    def load_rule_batches(self, batches):
+        """
+        Like load_rules_progressively(), for an iterable of Rule lists such
+        as a RuleReader. If it raises ValueError or OSError, the previous
+        rules are put back and loading_failed is emitted instead.
+        """
+        self._stop_loading()
+        self._previous_rules = self.model.rules()
+        self.model.set_rules([])
+        self._loading = iter(batches)
+        self._load_batch()
+        if self._loading is not None:
+            self._load_timer.start(0)
+
+    def _load_batch(self):
+        # Every insertion makes the view lay out and repaint, so insert as
+        # much as fits in the slice rather than a fixed number of rows
+        deadline = time.perf_counter() + self.LOAD_SLICE
+        rules = []
+        finished = True
+        try:
+            for batch in self._loading:
+                rules.extend(batch)
+                if time.perf_counter() >= deadline:
+                    finished = False
+                    break
+        except (ValueError, OSError) as e:
+            previous_rules = self._previous_rules
+            self._stop_loading()
+            self.model.set_rules(previous_rules)
+            self.loading_failed.emit(str(e))
+            return
+        self.model.append_rules(rules)
+        self.loading_progress.emit(self.model.rowCount())
+        if finished:
+            self._stop_loading()
+            self.loading_finished.emit(self.model.rowCount())
+
+    def _stop_loading(self):
+        self._load_timer.stop()
+        self._loading = None
+        self._previous_rules = None
 
     def add_rule(self, rule):
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        
-        # Set ID
-        id_item = QTableWidgetItem(str(row + 1))
-        id_item.setFlags(id_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-        self.table.setItem(row, 0, id_item)
-        
-        source_ip = (f"{rule.source_address_start}-{rule.source_address_end}" 
-                    if rule.source_address_start != rule.source_address_end 
-                    else rule.source_address_start)
-        source_port = (f"{rule.source_port_start}-{rule.source_port_end}"
-                      if rule.source_port_start != rule.source_port_end and rule.source_port_start is not None
-                      else str(rule.source_port_start) if rule.source_port_start is not None else "")
-        source = f"{source_ip}:{source_port}" if source_port else source_ip
-        self.table.setItem(row, 1, QTableWidgetItem(source))
-        
-        dest_ip = (f"{rule.destination_address_start}-{rule.destination_address_end}"
-                  if rule.destination_address_start != rule.destination_address_end
-                  else rule.destination_address_start)
-        dest_port = (f"{rule.destination_port_start}-{rule.destination_port_end}"
-                    if rule.destination_port_start != rule.destination_port_end and rule.destination_port_start is not None
-                    else str(rule.destination_port_start) if rule.destination_port_start is not None else "")
-        dest = f"{dest_ip}:{dest_port}" if dest_port else dest_ip
-        self.table.setItem(row, 2, QTableWidgetItem(dest))
-        
-        self.table.setItem(row, 3, QTableWidgetItem(rule.protocol.value))
-        self.table.setItem(row, 4, QTableWidgetItem(rule.action.value))
-        self.table.setItem(row, 5, QTableWidgetItem(rule.direction.value))
-        
-        enabled_item = QTableWidgetItem()
-        enabled_item.setCheckState(Qt.CheckState.Checked if rule.enabled else Qt.CheckState.Unchecked)
-        self.table.setItem(row, 6, enabled_item)
-        
-        self.table.setItem(row, 7, QTableWidgetItem(rule.description))
+        self.model.append_rule(rule)
 
     def get_rule(self, row):
-        source = self.table.item(row, 1).text()
-        source_parts = source.split(':')
-        source_ip_range = source_parts[0].split('-')
-        source_address_start = source_ip_range[0]
-        source_address_end = source_ip_range[1] if len(source_ip_range) > 1 else source_ip_range[0]
-        
-        source_port_start = None
-        source_port_end = None
-        if len(source_parts) > 1:
-            port_range = source_parts[1].split('-')
-            source_port_start = int(port_range[0]) if port_range[0] else None
-            source_port_end = int(port_range[1]) if len(port_range) > 1 else source_port_start
-        
-        dest = self.table.item(row, 2).text()
-        dest_parts = dest.split(':')
-        dest_ip_range = dest_parts[0].split('-')
-        dest_address_start = dest_ip_range[0]
-        dest_address_end = dest_ip_range[1] if len(dest_ip_range) > 1 else dest_ip_range[0]
-        
-        dest_port_start = None
-        dest_port_end = None
-        if len(dest_parts) > 1:
-            port_range = dest_parts[1].split('-')
-            dest_port_start = int(port_range[0]) if port_range[0] else None
-            dest_port_end = int(port_range[1]) if len(port_range) > 1 else dest_port_start
-        
-        return Rule(
-            id=int(self.table.item(row, 0).text()),
-            source_address_start=source_address_start,
-            source_address_end=source_address_end,
-            source_port_start=source_port_start,
-            source_port_end=source_port_end,
-            destination_address_start=dest_address_start,
-            destination_address_end=dest_address_end,
-            destination_port_start=dest_port_start,
-            destination_port_end=dest_port_end,
-            protocol=Protocol(self.table.item(row, 3).text()),
-            action=Action(self.table.item(row, 4).text()),
-            direction=Direction(self.table.item(row, 5).text()),
-            enabled=self.table.item(row, 6).checkState() == Qt.CheckState.Checked,
-            description=self.table.item(row, 7).text()
-        )
+        return self.model.rule(row)
 
+    @metrics.timed("rule_table.get_all_rules")
     def get_all_rules(self):
-        return [self.get_rule(row) for row in range(self.table.rowCount())]
+        return self.model.rules()
 
     def update_rule(self, row, rule):
-        id_item = QTableWidgetItem(str(row + 1))
-        id_item.setFlags(id_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-        self.table.setItem(row, 0, id_item)
-        
-        source_ip = (f"{rule.source_address_start}-{rule.source_address_end}"
-                    if rule.source_address_start != rule.source_address_end
-                    else rule.source_address_start)
-        source_port = (f"{rule.source_port_start}-{rule.source_port_end}"
-                      if rule.source_port_start != rule.source_port_end and rule.source_port_start is not None
-                      else str(rule.source_port_start) if rule.source_port_start is not None else "")
-        source = f"{source_ip}:{source_port}" if source_port else source_ip
-        self.table.setItem(row, 1, QTableWidgetItem(source))
-        
-        dest_ip = (f"{rule.destination_address_start}-{rule.destination_address_end}"
-                  if rule.destination_address_start != rule.destination_address_end
-                  else rule.destination_address_start)
-        dest_port = (f"{rule.destination_port_start}-{rule.destination_port_end}"
-                    if rule.destination_port_start != rule.destination_port_end and rule.destination_port_start is not None
-                    else str(rule.destination_port_start) if rule.destination_port_start is not None else "")
-        dest = f"{dest_ip}:{dest_port}" if dest_port else dest_ip
-        self.table.setItem(row, 2, QTableWidgetItem(dest))
-        
-        self.table.setItem(row, 3, QTableWidgetItem(rule.protocol.value))
-        self.table.setItem(row, 4, QTableWidgetItem(rule.action.value))
-        self.table.setItem(row, 5, QTableWidgetItem(rule.direction.value))
-        enabled_item = QTableWidgetItem()
-        enabled_item.setCheckState(Qt.CheckState.Checked if rule.enabled else Qt.CheckState.Unchecked)
-        self.table.setItem(row, 6, enabled_item)
-        self.table.setItem(row, 7, QTableWidgetItem(rule.description))
+        self.model.replace_rule(row, rule)
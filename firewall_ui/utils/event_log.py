@@ -0,0 +1,300 @@
+"""
+Structured event log.
+
+Log records that carry an event (pass extra=event(...) to the logging
+call) are also appended to a compact binary file, next to the text logs:
+
+    logger.info("Config applied", extra=event("apply", latency=0.8, payload_size=4096))
+
+The file is a 16-byte header followed by fixed-size little-endian records
+in write order, with non-decreasing timestamps, so a time range is found
+by bisection on a memory map instead of a scan of the whole history. A
+file that is not sorted, e.g. one written by two processes at once, is
+scanned instead.
+Query it with:
+
+    python -m firewall_ui.utils.event_log logs/events.bin --event apply \\
+        --min-latency 500 --since 7d
+"""
+import datetime
+import json
+import logging
+import math
+import mmap
+import operator
+import os
+import re
+import struct
+import sys
+import time
+from collections import namedtuple
+
+MAGIC = b'FWEV'
+VERSION = 1
+HEADER = struct.Struct('<4sBxxxII')  # magic, version, record size, reserved
+# timestamp (seconds since the epoch), level, event code, rule id
+# (NO_RULE if none), latency in seconds (NaN if none), payload size in bytes
+RECORD = struct.Struct('<dBBxxIdQ')
+NO_RULE = 0xFFFFFFFF
+NO_SIZE = 0xFFFFFFFFFFFFFFFF
+
+# Event codes are stored in the file: only ever append to this list
+EVENT_TYPES = [
+    "apply",
+    "apply_delta",
+    "apply_failed",
+    "get_config",
+    "validation_failed",
+    "timeout",
+    "request",
+]
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+Event = namedtuple("Event", "timestamp level event rule_id latency payload_size")
+
+
+def event(name, rule_id=None, latency=None, payload_size=None):
+    """Return the logging extra dict that records an event in the event log"""
+    return {'event': name, 'rule_id': rule_id, 'latency': latency,
+            'payload_size': payload_size}
+
+
+def _pack(timestamp, level, name, rule_id, latency, payload_size):
+    return RECORD.pack(timestamp, level, EVENT_CODES[name],
+                       NO_RULE if rule_id is None else rule_id,
+                       math.nan if latency is None else latency,
+                       NO_SIZE if payload_size is None else payload_size)
+
+
+def _unpack(fields):
+    timestamp, level, code, rule_id, latency, payload_size = fields
+    return Event(timestamp, level,
+                 EVENT_TYPES[code] if code < len(EVENT_TYPES) else f"event {code}",
+                 None if rule_id == NO_RULE else rule_id,
+                 None if math.isnan(latency) else latency,
+                 None if payload_size == NO_SIZE else payload_size)
+
+
+class EventLogHandler(logging.Handler):
+    """
+    Appends records with an event attribute to an event log file; other
+    records are ignored. Records are buffered until flush_batch(), which
+    the log writer thread calls after every batch.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.stream = open(path, 'ab')
+        self._last_timestamp = 0.0
+        size = os.fstat(self.stream.fileno()).st_size
+        if size < HEADER.size:
+            self.stream.truncate(0)
+            self.stream.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+            return
+        # A record cut short by a crash would misalign every record after it
+        records = (size - HEADER.size) // RECORD.size
+        self.stream.truncate(HEADER.size + records * RECORD.size)
+        if records:
+            # Carry on from the last record so the file stays sorted across runs
+            with open(path, 'rb') as log_file:
+                log_file.seek(HEADER.size + (records - 1) * RECORD.size)
+                self._last_timestamp = struct.unpack('<d', log_file.read(8))[0]
+
+    def emit(self, record):
+        name = getattr(record, 'event', None)
+        if name is None:
+            return
+        # Records from different threads can reach the writer slightly out
+        # of order; keeping timestamps non-decreasing keeps the file sorted
+        timestamp = max(record.created, self._last_timestamp)
+        self._last_timestamp = timestamp
+        self.stream.write(_pack(timestamp, min(record.levelno, 255), name,
+                                getattr(record, 'rule_id', None),
+                                getattr(record, 'latency', None),
+                                getattr(record, 'payload_size', None)))
+
+    def flush_batch(self):
+        self.acquire()
+        try:
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+        super().close()
+
+
+class EventLogReader:
+    """Memory-mapped, read-only view of an event log file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as log_file:
+            size = os.fstat(log_file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not an event log")
+            self._map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, _ = HEADER.unpack_from(self._map)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not an event log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported event log version {version}")
+        # A record cut short by a crash is ignored
+        self.count = (size - HEADER.size) // RECORD.size
+        self._sorted = None
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def timestamp(self, index):
+        return struct.unpack_from('<d', self._map, HEADER.size + index * RECORD.size)[0]
+
+    def is_sorted(self):
+        """Whether the timestamps never decrease, checked on first use"""
+        if self._sorted is None:
+            view = memoryview(self._map)[HEADER.size:HEADER.size + self.count * RECORD.size]
+            try:
+                with view.cast('d') as doubles:
+                    timestamps = doubles[::RECORD.size // 8].tolist()
+            finally:
+                view.release()
+            self._sorted = all(map(operator.le, timestamps, timestamps[1:]))
+        return self._sorted
+
+    def bisect(self, timestamp):
+        """
+        Return the index of the first record at or after timestamp; only
+        meaningful if is_sorted()
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, since=None, until=None, events=None, min_latency=None,
+              min_level=None, rule_id=None):
+        """
+        Yield the Events between since and until (seconds since the
+        epoch, until exclusive) matching every given filter. Only the
+        records in the time range are read, unless the file is not sorted.
+        """
+        first, last = 0, self.count
+        if (since is not None or until is not None) and self.is_sorted():
+            if since is not None:
+                first = self.bisect(since)
+            if until is not None:
+                last = self.bisect(until)
+            since = until = None
+        codes = None if events is None else {EVENT_CODES[name] for name in events}
+        view = memoryview(self._map)[HEADER.size + first * RECORD.size:
+                                     HEADER.size + last * RECORD.size]
+        try:
+            for fields in RECORD.iter_unpack(view):
+                timestamp, level, code, rule, latency, _ = fields
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    continue
+                if codes is not None and code not in codes:
+                    continue
+                if min_latency is not None and not latency >= min_latency:
+                    continue
+                if min_level is not None and level < min_level:
+                    continue
+                if rule_id is not None and rule != rule_id:
+                    continue
+                yield _unpack(fields)
+        finally:
+            view.release()
+
+
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_time(value, now=None):
+    """Parse "7d"-style ages (s, m, h, d, w) and ISO dates into epoch seconds"""
+    match = _DURATION.match(value)
+    if match:
+        return (time.time() if now is None else now) - float(match[1]) * _UNITS[match[2]]
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def format_event(record):
+    when = datetime.datetime.fromtimestamp(record.timestamp).isoformat(sep=' ',
+                                                                      timespec='milliseconds')
+    fields = [when, logging.getLevelName(record.level), record.event]
+    if record.rule_id is not None:
+        fields.append(f"rule={record.rule_id}")
+    if record.latency is not None:
+        fields.append(f"latency={record.latency * 1000:.1f}ms")
+    if record.payload_size is not None:
+        fields.append(f"size={record.payload_size}")
+    return " ".join(fields)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Query a firewall UI event log")
+    parser.add_argument("path", help="event log file, e.g. logs/events.bin")
+    parser.add_argument("--since", help="start time: an age such as 7d or 12h, or an ISO date")
+    parser.add_argument("--until", help="end time, same formats as --since")
+    parser.add_argument("--event", action="append", choices=EVENT_TYPES,
+                        help="event type to show; may be repeated")
+    parser.add_argument("--min-latency", type=float, metavar="MS",
+                        help="only events slower than this many milliseconds")
+    parser.add_argument("--level", help="minimum level name, e.g. WARNING")
+    parser.add_argument("--rule", type=int, help="only events about this rule id")
+    parser.add_argument("--limit", type=int, help="show at most this many events")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per line")
+    parser.add_argument("--count", action="store_true", help="only print the number of matches")
+    args = parser.parse_args(argv)
+
+    min_level = None
+    if args.level:
+        min_level = logging.getLevelName(args.level.upper())
+        if not isinstance(min_level, int):
+            parser.error(f"unknown level {args.level}")
+    with EventLogReader(args.path) as reader:
+        matches = reader.query(
+            since=parse_time(args.since) if args.since else None,
+            until=parse_time(args.until) if args.until else None,
+            events=args.event,
+            min_latency=args.min_latency / 1000 if args.min_latency is not None else None,
+            min_level=min_level, rule_id=args.rule)
+        count = 0
+        for record in matches:
+            count += 1
+            if args.count:
+                continue
+            if args.json:
+                print(json.dumps(record._asdict()))
+            else:
+                print(format_event(record))
+            if args.limit and count >= args.limit:
+                break
+        if args.count:
+            print(count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+User-space stand-in for the firewall kernel module.
+
+FakeKernel speaks the framing of KernelCommunicator (netlink header, one
+MSG_* type byte, payload) over AF_UNIX SOCK_SEQPACKET sockets, which keep
+message boundaries like netlink does. It stores pushed configs, answers
+config, capability and digest requests, applies deltas and takes part in
+multipart transfers.
+
+Point a KernelCommunicator at it in-process:
+
+    kernel = FakeKernel()
+    communicator = KernelCommunicator(socket_factory=kernel.connect)
+
+or run it as a server and set KERNEL_SOCKET_PATH in config/settings.py:
+
+    python -m firewall_ui.utils.fake_kernel /tmp/firewall-kernel.sock
+
+Latency, reply fragmentation and errors can be injected to test and
+load-test the client against a misbehaving module.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from firewall_ui.models.rule import Rule
+from firewall_ui.policy.diff import apply_delta
+from firewall_ui.utils.kernel_comm import KernelCommunicator as KC
+from firewall_ui.utils.rule_digest import MerkleTree
+from firewall_ui.utils.wire_format import (encode_rules, decode_rules, decode_delta,
+                                           is_binary_payload)
+
+ALL_CAPABILITIES = KC.CAP_BINARY_RULES | KC.CAP_MULTIPART | KC.CAP_DELTA | KC.CAP_DIGEST
+SEND_TYPES = (KC.MSG_SEND_CONFIG, KC.MSG_SEND_CONFIG_BINARY, KC.MSG_SEND_DELTA)
+STATUS_PADDING = b'\x00\x00\x00'
+
+
+class FakeKernel:
+    """
+    Config store behind any number of connections.
+
+    capabilities are the bits reported for MSG_GET_CAPS. Replies are
+    delayed by latency seconds and multipart replies are split into
+    chunk_size byte chunks, sent in reverse order if reverse_chunks is set.
+    Pushes are rejected with probability error_rate and incoming messages
+    are silently dropped with probability drop_rate; fail_next() rejects
+    the next pushes deterministically.
+    """
+
+    def __init__(self, capabilities=ALL_CAPABILITIES, latency=0.0, chunk_size=KC.CHUNK_SIZE,
+                 reverse_chunks=False, error_rate=0.0, drop_rate=0.0, seed=None, logger=None):
+        self.capabilities = capabilities
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.reverse_chunks = reverse_chunks
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.logger = logger or logging.getLogger("FakeKernel")
+        # Last accepted config payload, exactly as pushed (JSON or binary)
+        self.stored = b''
+        self.messages_received = 0
+        self.chunks_received = 0
+        self.configs_received = 0
+        self.deltas_received = 0
+        self.digest_requests = 0
+        self._tree = None
+        self._failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sockets = []
+        self._listener = None
+
+    def connect(self):
+        """Return the client end of a new connection; usable as a socket_factory"""
+        client, server = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._start(server)
+        return client
+
+    def serve(self, path):
+        """Accept connections on an AF_UNIX SOCK_SEQPACKET socket at path"""
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._listener.bind(path)
+        self._listener.listen()
+        thread = threading.Thread(target=self._accept, name="fake-kernel-accept", daemon=True)
+        thread.start()
+        return thread
+
+    def disconnect(self):
+        """Drop every open connection, like a module reload would"""
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            # Closing alone leaves a thread blocked in accept() accepting
+            try:
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+        self.disconnect()
+
+    def fail_next(self, count=1):
+        """Reject the next count config pushes"""
+        self._failures += count
+
+    def tree(self):
+        """
+        Return the MerkleTree of the stored config, kept until the config
+        changes like the module keeps its digest
+        """
+        stored = self.stored
+        if self._tree is None or self._tree[0] is not stored:
+            self._tree = (stored, MerkleTree.from_rules(self.rules()))
+        return self._tree[1]
+
+    def rules(self):
+        """Return the stored config as Rule objects"""
+        if not self.stored:
+            return []
+        if is_binary_payload(self.stored):
+            return decode_rules(self.stored)
+        return [Rule.from_dict(data) for data in json.loads(self.stored)]
+
+    def _accept(self):
+        while self._listener is not None:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            self._start(sock)
+
+    def _start(self, sock):
+        with self._lock:
+            self._sockets.append(sock)
+        _Connection(self, sock).start()
+
+    def _reject_push(self):
+        if self._failures:
+            self._failures -= 1
+            return True
+        return self.error_rate and self._random.random() < self.error_rate
+
+    def _drop(self):
+        return self.drop_rate and self._random.random() < self.drop_rate
+
+
+class _Connection(threading.Thread):
+    """Serves the messages of one client connection"""
+
+    def __init__(self, kernel, sock):
+        super().__init__(name="fake-kernel", daemon=True)
+        self.kernel = kernel
+        self.sock = sock
+        # Partial multipart payloads by sequence number, as {offset: data}
+        self.transfers = {}
+
+    def reply(self, seq, msg_type, payload=b'', nlmsg_type=0, flags=0):
+        if self.kernel.latency:
+            time.sleep(self.kernel.latency)
+        self.sock.sendmsg([KC.NLMSG_HEADER.pack(16 + len(msg_type) + len(payload),
+                                                nlmsg_type, flags, seq, 0),
+                           msg_type, payload])
+
+    def run(self):
+        try:
+            while True:
+                message = self.sock.recv(1 << 21)
+                if not message:
+                    return
+                self.handle(message)
+        except OSError:
+            return
+        finally:
+            with self.kernel._lock:
+                if self.sock in self.kernel._sockets:
+                    self.kernel._sockets.remove(self.sock)
+            self.sock.close()
+
+    def handle(self, message):
+        kernel = self.kernel
+        if len(message) < 17:
+            return
+        kernel.messages_received += 1
+        if kernel._drop():
+            return
+        length, _, flags, seq, _ = KC.NLMSG_HEADER.unpack_from(message)
+        msg_type = message[16:17]
+        payload = message[17:length]
+        if flags & KC.NLM_F_MULTI:
+            payload = self.receive_chunk(seq, payload)
+            if payload is None:
+                return
+
+        if msg_type == KC.MSG_GET_CAPS:
+            self.reply(seq, msg_type, struct.pack("<L", kernel.capabilities))
+        elif msg_type in SEND_TYPES:
+            if kernel._reject_push() or not self.store(msg_type, payload):
+                self.reply(seq, KC.MSG_SEND_FAIL, STATUS_PADDING)
+            else:
+                self.reply(seq, KC.MSG_SEND_SUCCESS, STATUS_PADDING)
+        elif msg_type == KC.MSG_GET_DIGEST:
+            self.send_digest(seq, payload)
+        elif msg_type in (KC.MSG_GET_CONFIG, KC.MSG_GET_CONFIG_BINARY):
+            config = self.config(msg_type)
+            if flags & KC.NLM_F_DUMP and kernel.capabilities & KC.CAP_MULTIPART:
+                self.send_chunks(seq, msg_type, config)
+            else:
+                self.reply(seq, msg_type, config)
+
+    def store(self, msg_type, payload):
+        """Apply a pushed config or delta; returns False if it is malformed"""
+        kernel = self.kernel
+        try:
+            if msg_type == KC.MSG_SEND_DELTA:
+                delta, values = decode_delta(payload)
+                rules = apply_delta(kernel.rules(), delta, values)
+                for position, rule in enumerate(rules):
+                    rule.id = position + 1
+                payload = encode_rules(rules)
+                kernel.deltas_received += 1
+            elif msg_type == KC.MSG_SEND_CONFIG_BINARY:
+                decode_rules(payload)
+            else:
+                json.loads(payload)
+        except ValueError as e:
+            kernel.logger.warning(f"Rejected malformed config: {e}")
+            return False
+        kernel.stored = bytes(payload)
+        kernel.configs_received += 1
+        return True
+
+    def config(self, msg_type):
+        """Return the stored config in the encoding msg_type asks for"""
+        stored = self.kernel.stored
+        binary = is_binary_payload(stored)
+        if msg_type == KC.MSG_GET_CONFIG_BINARY and not binary:
+            return encode_rules(self.kernel.rules())
+        if msg_type == KC.MSG_GET_CONFIG and (binary or not stored):
+            return json.dumps([rule.to_dict() for rule in self.kernel.rules()]).encode('utf-8')
+        return stored
+
+    def receive_chunk(self, seq, payload):
+        """Collect a chunk of transfer seq; returns the whole payload once complete"""
+        if len(payload) < KC.CHUNK_HEADER.size:
+            return None
+        total, offset = KC.CHUNK_HEADER.unpack_from(payload)
+        chunks = self.transfers.setdefault(seq, {})
+        chunks[offset] = payload[KC.CHUNK_HEADER.size:]
+        self.kernel.chunks_received += 1
+        self.reply(seq, KC.MSG_CHUNK_ACK, KC.CHUNK_ACK.pack(offset))
+        if sum(len(chunk) for chunk in chunks.values()) != total:
+            return None
+        del self.transfers[seq]
+        return b''.join(chunks[offset] for offset in sorted(chunks))
+
+    def send_digest(self, seq, payload):
+        self.kernel.digest_requests += 1
+        tree = self.kernel.tree()
+        if not payload:
+            self.reply(seq, KC.MSG_GET_DIGEST, struct.pack("<L", tree.count) + tree.root)
+            return
+        nodes = [KC.DIGEST_NODE.unpack_from(payload, offset)
+                 for offset in range(0, len(payload), KC.DIGEST_NODE.size)]
+        self.reply(seq, KC.MSG_GET_DIGEST, b''.join(tree.node(*node) for node in nodes))
+
+    def send_chunks(self, seq, msg_type, config):
+        """Send config as a multipart reply, waiting for a window of acks"""
+        chunk_size = self.kernel.chunk_size
+        total = len(config)
+        offsets = list(range(0, total, chunk_size)) or [0]
+        if self.kernel.reverse_chunks:
+            offsets.reverse()
+        unacked = 0
+        for offset in offsets:
+            self.reply(seq, msg_type,
+                       KC.CHUNK_HEADER.pack(total, offset) + config[offset:offset + chunk_size],
+                       flags=KC.NLM_F_MULTI)
+            unacked += 1
+            while unacked >= KC.CHUNK_WINDOW:
+                self.receive_ack(seq)
+                unacked -= 1
+        for _ in range(unacked):
+            self.receive_ack(seq)
+        self.reply(seq, b'', nlmsg_type=KC.NLMSG_DONE)
+
+    def receive_ack(self, seq):
+        # Requests arriving in the middle of a transfer are served in turn
+        while True:
+            message = self.sock.recv(1 << 21)
+            if not message:
+                raise ConnectionError("Client closed the connection")
+            if (message[16:17] == KC.MSG_CHUNK_ACK
+                    and KC.NLMSG_HEADER.unpack_from(message)[3] == seq):
+                return
+            self.handle(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake firewall kernel module")
+    parser.add_argument("path", help="AF_UNIX socket path to listen on")
+    parser.add_argument("--capabilities", type=lambda value: int(value, 0),
+                        default=ALL_CAPABILITIES, help="capability bits (default: all)")
+    parser.add_argument("--latency", type=float, default=0.0, help="reply delay in seconds")
+    parser.add_argument("--chunk-size", type=int, default=KC.CHUNK_SIZE,
+                        help="size of multipart reply chunks in bytes")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="probability of rejecting a config push")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="probability of ignoring a message")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    kernel = FakeKernel(args.capabilities, args.latency, args.chunk_size,
+                        error_rate=args.error_rate, drop_rate=args.drop_rate)
+    kernel.serve(args.path)
+    kernel.logger.info(f"Fake kernel module listening on {args.path}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        kernel.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,21 @@ import socket
 import os
 import struct
 import json
+import threading
+import time
+from firewall_ui.config.settings import KERNEL_WIRE_FORMAT, KERNEL_SOCKET_PATH
 from firewall_ui.utils.logger import FirewallLogger
+from firewall_ui.utils.event_log import event
+from firewall_ui.utils.metrics import metrics
+from firewall_ui.utils.netlink_session import NetlinkSession
+from firewall_ui.policy.diff import diff_rules, rule_key
+from firewall_ui.utils.rule_digest import MerkleTree, find_divergence, DIGEST_SIZE
+from firewall_ui.utils.wire_format import (encode_rules, decode_ruleset, encode_delta,
+                                           WireFormatError)
+
+class TransferCancelled(Exception):
+   pass
+
 
 class KernelCommunicator:
    NETLINK_TEST_FAMILY = 25
@@ -12,50 +26,436 @@ class KernelCommunicator:
    MSG_SEND_CONFIG = b'\x01'
    MSG_SEND_SUCCESS = b'\x04'
    MSG_SEND_FAIL = b'\x05'
+   MSG_SEND_CONFIG_BINARY = b'\x06'
+   MSG_GET_CONFIG_BINARY = b'\x07'
+   MSG_GET_CAPS = b'\x08'
+   MSG_CHUNK_ACK = b'\x09'
+   MSG_SEND_DELTA = b'\x0a'
+   MSG_GET_DIGEST = b'\x0b'
+
+   # Capability bits returned by the kernel module for MSG_GET_CAPS
+   CAP_BINARY_RULES = 0x01
+   CAP_MULTIPART = 0x02
+   CAP_DELTA = 0x04
+   CAP_DIGEST = 0x08
+   # Modules that predate MSG_GET_CAPS never answer it
+   CAPS_TIMEOUT = 0.5
+
+   # Netlink header layout, flags and the multipart terminator
+   NLMSG_HEADER = struct.Struct("=LHHLL")
+   NLMSG_DONE = 0x03
+   NLM_F_REQUEST = 0x01
+   NLM_F_MULTI = 0x02
+   NLM_F_ACK = 0x04
+   NLM_F_DUMP = 0x300
+
+   # Multipart transfers: every chunk carries the total payload size and
+   # its offset so the receiver can reassemble out of order and detect gaps
+   CHUNK_HEADER = struct.Struct("<LL")
+   # MSG_CHUNK_ACK payload: offset of the acknowledged chunk
+   CHUNK_ACK = struct.Struct("<L")
+   # MSG_GET_DIGEST: an empty request returns uint32 rule count and the root
+   # digest, a list of (level, index) nodes returns their hashes in order
+   DIGEST_NODE = struct.Struct("<LL")
+   CHUNK_SIZE = 64 * 1024
+   CHUNK_WINDOW = 8
+   CHUNK_RETRIES = 2
 
-   def __init__(self):
+   # Deltas touching more than this fraction of the rules are sent in full
+   DELTA_MAX_FRACTION = 0.5
+
+   def __init__(self, wire_format=KERNEL_WIRE_FORMAT, socket_factory=None, snapshot_cache=None):
        self.logger = FirewallLogger().get_logger()
-       self.socket = None
-       self.initialize_socket()
+       self.wire_format = wire_format
+       self._capabilities = None
+       self._binary_supported = None
+       # rule_key() of every rule the kernel module was last known to hold,
+       # and the kernel's root digest of them, or None if unknown
+       self.applied_keys = None
+       self.applied_digest = None
+       # Optional SnapshotCache kept up to date with the kernel configuration
+       # whenever the module can report digests to key it with
+       self.snapshot_cache = snapshot_cache
+       # Optional progress callback, called as on_progress(done, total) in
+       # bytes during multipart transfers, and an event that aborts them
+       self.on_progress = None
+       self.cancel_event = threading.Event()
+       # Payload bytes pushed during the current send_config()
+       self.bytes_sent = 0
+       # Id of the first differing rule found by the last failed validation
+       self.mismatch_rule_id = None
+       # The session reconnects through socket_factory whenever the socket
+       # breaks; anything negotiated over the old connection is forgotten
+       self.session = NetlinkSession(socket_factory or self.initialize_socket, self.logger)
+       self._connection = self.session.connections
 
    def initialize_socket(self):
+       if KERNEL_SOCKET_PATH:
+           sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+       else:
+           sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, self.NETLINK_TEST_FAMILY)
        try:
-           self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, self.NETLINK_TEST_FAMILY)
-           self.socket.bind((os.getpid(), 0))
-           self.socket.settimeout(self.SOCKET_TIMEOUT)
-           self.logger.info("Netlink socket initialized successfully")
-           return True
-       except Exception as e:
-           self.logger.error(f"Failed to initialize netlink socket: {str(e)}")
-           return False
+           if KERNEL_SOCKET_PATH:
+               sock.connect(KERNEL_SOCKET_PATH)
+           else:
+               sock.bind((os.getpid(), 0))
+       except OSError:
+           sock.close()
+           raise
+       return sock
+
+   def close(self):
+       self.session.close()
 
-   def create_message(self, payload, msg_type):
+   def latency_stats(self):
+       """Return {message type: LatencyStats} of the requests made so far"""
+       return dict(self.session.latencies)
+
+   def create_message(self, payload, msg_type, flags=0, seq=0):
        msg_len = len(payload) + 1 + 16
        header = struct.pack("=LHHLL",
            msg_len,
            0,
-           0,
-           0,
+           flags,
+           seq,
            os.getpid()
        )
        return header + msg_type + payload
 
+   def _sync_connection(self):
+       """Forget capabilities and applied rules learned over an earlier connection"""
+       if self._connection != self.session.connections:
+           if self._connection:
+               metrics.increment("reconnects")
+           self._connection = self.session.connections
+           self._capabilities = None
+           self._binary_supported = None
+           self.applied_keys = None
+           self.applied_digest = None
+
+   def capabilities(self):
+       """Return the kernel module capability bits, querying them once per connection"""
+       self._sync_connection()
+       if self._capabilities is None:
+           self._capabilities = self.get_capabilities()
+           self.logger.info(f"Kernel module capabilities: {self._capabilities:#x}")
+       return self._capabilities
+
+   def _report_progress(self, done, total):
+       # Closing the request drops whatever the kernel still sends for it
+       if self.cancel_event.is_set():
+           raise TransferCancelled("Transfer cancelled")
+       if self.on_progress:
+           self.on_progress(done, total)
+
+   def uses_delta(self):
+       """Whether changes can be pushed as deltas against the applied rules"""
+       return bool(self.capabilities() & self.CAP_DELTA) and self.uses_binary_format()
+
+   def uses_digest(self):
+       """Whether applied configs can be validated by comparing rule digests"""
+       return bool(self.capabilities() & self.CAP_DIGEST)
+
+   def uses_multipart(self):
+       """Whether large payloads are split into acknowledged chunks"""
+       return bool(self.capabilities() & self.CAP_MULTIPART)
+
+   def send_multipart(self, request, payload, msg_type):
+       """
+       Send payload as NLM_F_MULTI chunks of at most CHUNK_SIZE bytes.
+
+       All chunks share the sequence number of request and the kernel
+       acknowledges each with MSG_CHUNK_ACK carrying the chunk offset. Up
+       to CHUNK_WINDOW chunks are in flight at once; chunks still
+       unacknowledged after SOCKET_TIMEOUT are resent up to CHUNK_RETRIES
+       times.
+       """
+       view = memoryview(payload).cast('B')
+       total = len(view)
+       offsets = list(range(0, total, self.CHUNK_SIZE)) or [0]
+       flags = self.NLM_F_REQUEST | self.NLM_F_MULTI | self.NLM_F_ACK
+       pending = {}
+       next_chunk = 0
+       retries = 0
+       acked = 0
+       while next_chunk < len(offsets) or pending:
+           while next_chunk < len(offsets) and len(pending) < self.CHUNK_WINDOW:
+               offset = offsets[next_chunk]
+               # Scatter/gather send: the chunk is never copied into a new buffer
+               parts = [self.CHUNK_HEADER.pack(total, offset),
+                        view[offset:offset + self.CHUNK_SIZE]]
+               request.send(msg_type, parts, flags)
+               pending[offset] = parts
+               next_chunk += 1
+           try:
+               offset = self._receive_chunk_ack(request)
+           except socket.timeout:
+               if retries >= self.CHUNK_RETRIES:
+                   raise
+               retries += 1
+               metrics.increment("chunk_resends", len(pending))
+               self.logger.warning(f"Resending {len(pending)} unacknowledged chunks")
+               for parts in pending.values():
+                   request.send(msg_type, parts, flags)
+               continue
+           parts = pending.pop(offset, None)
+           if parts is not None:
+               acked += len(parts[1])
+               self._report_progress(acked, total)
+       self.logger.debug("Sent %d bytes in %d chunks", total, len(offsets))
+
+   def _receive_chunk_ack(self, request):
+       """Wait for the next chunk ack of request and return the chunk offset"""
+       while True:
+           response = request.next_message(self.SOCKET_TIMEOUT)
+           msg_type = response[16:17]
+           if msg_type == self.MSG_CHUNK_ACK and len(response) >= 17 + self.CHUNK_ACK.size:
+               return self.CHUNK_ACK.unpack_from(response, 17)[0]
+           if msg_type == self.MSG_SEND_FAIL:
+               raise ConnectionError("Kernel rejected chunk")
+
+   def receive_multipart(self, request, msg_type):
+       """
+       Reassemble the multipart reply to request, msg_type chunks
+       terminated by NLMSG_DONE, acknowledging every chunk. Returns the
+       payload.
+       """
+       buffer = None
+       received = 0
+       seen = set()
+       while True:
+           message = request.next_message(self.SOCKET_TIMEOUT)
+           length, nlmsg_type, flags, _, _ = self.NLMSG_HEADER.unpack_from(message)
+           if nlmsg_type == self.NLMSG_DONE:
+               break
+           if message[16:17] == self.MSG_SEND_FAIL:
+               raise ConnectionError("Kernel failed to send config")
+           if message[16:17] != msg_type or len(message) < 17 + self.CHUNK_HEADER.size:
+               continue
+           total, offset = self.CHUNK_HEADER.unpack_from(message, 17)
+           request.send(self.MSG_CHUNK_ACK, self.CHUNK_ACK.pack(offset))
+
+           data = memoryview(message)[17 + self.CHUNK_HEADER.size:length]
+           if buffer is None:
+               buffer = bytearray(total)
+           if offset in seen or offset + len(data) > len(buffer):
+               continue
+           buffer[offset:offset + len(data)] = data
+           seen.add(offset)
+           received += len(data)
+           self._report_progress(received, total)
+           if not flags & self.NLM_F_MULTI:
+               break
+       if buffer is None or received != len(buffer):
+           raise ConnectionError("Incomplete multipart transfer")
+       return memoryview(buffer)
+
+   def _receive_status(self, request):
+       """Return True if the kernel reports MSG_SEND_SUCCESS for request"""
+       response = request.next_message(self.SOCKET_TIMEOUT)
+       # Late acks of resent chunks may still be queued
+       while response[16:17] == self.MSG_CHUNK_ACK:
+           response = request.next_message(self.SOCKET_TIMEOUT)
+       return response[16:20] == b'\x04\x00\x00\x00'
+
+   def _receive_reply(self, request, msg_type, min_length):
+       """Return the payload of the msg_type reply to request"""
+       response = request.next_message(self.SOCKET_TIMEOUT)
+       if response[16:17] != msg_type or len(response) < 17 + min_length:
+           raise ConnectionError("Invalid reply from kernel")
+       return memoryview(response)[17:]
+
+   def get_digest(self):
+       """Return (rule count, root digest) of the kernel configuration"""
+       with self.session.request(self.MSG_GET_DIGEST) as request:
+           payload = self._receive_reply(request, self.MSG_GET_DIGEST, 4 + DIGEST_SIZE)
+       count = struct.unpack_from("<L", payload)[0]
+       return count, bytes(payload[4:4 + DIGEST_SIZE])
+
+   def get_digest_nodes(self, nodes):
+       """Return the kernel's hashes of the given (level, index) Merkle nodes"""
+       query = b''.join(self.DIGEST_NODE.pack(level, index) for level, index in nodes)
+       with self.session.request(self.MSG_GET_DIGEST, query) as request:
+           payload = self._receive_reply(request, self.MSG_GET_DIGEST, len(nodes) * DIGEST_SIZE)
+       return [bytes(payload[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]) for i in range(len(nodes))]
+
+   def validate_digest(self, config):
+       """
+       Compare the kernel's rule digest with the digest of config. On a
+       mismatch, drill down the Merkle tree to the first differing rule.
+       """
+       tree = MerkleTree.from_rules(config)
+       count, root = self.get_digest()
+       if root == tree.root:
+           self.applied_digest = root
+           return True, None
+       position = find_divergence(tree, self.get_digest_nodes)
+       if count != tree.count and position >= min(count, tree.count):
+           return False, f"Config size mismatch: sent {tree.count}, received {count}"
+       self.mismatch_rule_id = config[position].id
+       return False, f"Rule mismatch at position {position + 1}"
+
+   def confirm_digest(self, digest):
+       """
+       Return (matches, error): whether the kernel module's root digest is
+       digest, as saved with a snapshot. matches is False with no error if
+       the module cannot report digests.
+       """
+       if not self.session.connected:
+           self.logger.error("Socket not initialized")
+           return False, "Socket not initialized"
+       try:
+           if not self.uses_digest():
+               return False, None
+           return self.get_digest()[1] == digest, None
+       except socket.timeout:
+           metrics.increment("timeouts")
+           return False, "Communication timeout"
+       except Exception as e:
+           self.logger.error(f"Error getting digest: {str(e)}")
+           return False, str(e)
+
+   def _snapshot_digest(self):
+       """The kernel's digest ahead of a fetch worth snapshotting, or None"""
+       if self.snapshot_cache is None or not self.uses_digest():
+           return None
+       return self.get_digest()[1]
+
+   def _save_snapshot(self, payload, count, digest):
+       try:
+           self.snapshot_cache.save(payload, count, digest)
+           self.logger.debug("Saved snapshot of %d rules to %s", count, self.snapshot_cache.path)
+       except OSError as e:
+           self.logger.warning(f"Failed to save configuration snapshot: {str(e)}")
+
+   def _invalidate_snapshot(self):
+       if self.snapshot_cache is not None:
+           try:
+               self.snapshot_cache.invalidate()
+           except OSError as e:
+               self.logger.warning(f"Failed to remove configuration snapshot: {str(e)}")
+
+   def _send_payload(self, payload, msg_type):
+       """Send payload as a new request and return True if the kernel accepts it"""
+       multipart = self.uses_multipart()
+       self.bytes_sent += len(payload)
+       metrics.increment("bytes_sent", len(payload))
+       with self.session.open(msg_type) as request:
+           with metrics.span("kernel.send"):
+               if multipart:
+                   self.send_multipart(request, payload, msg_type)
+               else:
+                   request.send(msg_type, payload)
+           # Kernel processing time plus the status round trip
+           with metrics.span("kernel.wait_status"):
+               return self._receive_status(request)
+
+   def _request_payload(self, msg_type):
+       """Request a config and return the raw payload after the type byte, or None"""
+       with metrics.span("kernel.receive"):
+           if self.uses_multipart():
+               with self.session.request(msg_type, b'',
+                                         self.NLM_F_REQUEST | self.NLM_F_DUMP) as request:
+                   payload = self.receive_multipart(request, msg_type)
+           else:
+               with self.session.request(msg_type) as request:
+                   response = request.next_message(self.SOCKET_TIMEOUT)
+               payload = memoryview(response)[17:] if len(response) > 17 else None
+       if payload is not None:
+           metrics.increment("bytes_received", len(payload))
+       return payload
+
+   def get_capabilities(self):
+       """Ask the kernel module which optional features it supports"""
+       try:
+           with self.session.request(self.MSG_GET_CAPS) as request:
+               response = request.next_message(self.CAPS_TIMEOUT)
+       except (socket.timeout, OSError):
+           return 0
+       if len(response) >= 21 and response[16:17] == self.MSG_GET_CAPS:
+           return struct.unpack_from("<L", response, 17)[0]
+       return 0
+
+   def uses_binary_format(self):
+       """
+       Whether rules are exchanged in the packed binary format. With the
+       "auto" wire format this is negotiated once per communicator; modules
+       without the capability keep using JSON.
+       """
+       if self.wire_format == "json":
+           return False
+       if self.wire_format == "binary":
+           return True
+       if self._binary_supported is None:
+           self._binary_supported = bool(self.capabilities() & self.CAP_BINARY_RULES)
+           self.logger.info("Using %s rule encoding for kernel communication",
+                            "binary" if self._binary_supported else "JSON")
+       return self._binary_supported
+
+   def get_current_ruleset(self):
+       """Fetch the kernel configuration as a RuleSet using the binary format"""
+       if not self.session.connected:
+           self.logger.error("Socket not initialized")
+           return None, "Socket not initialized"
+
+       start = time.perf_counter()
+       try:
+           digest = self._snapshot_digest()
+           payload = self._request_payload(self.MSG_GET_CONFIG_BINARY)
+           self.logger.debug("Sent binary config request to kernel module")
+           if payload is None:
+               self.logger.error("Received response too short")
+               return None, "Invalid response from kernel"
+           try:
+               with metrics.span("decode"):
+                   ruleset = decode_ruleset(payload)
+           except WireFormatError as e:
+               self.logger.error(f"Failed to decode binary config: {str(e)}")
+               return None, "Invalid config format"
+           self.logger.info("Successfully received config from kernel module",
+                            extra=self._event("get_config", start, payload_size=len(payload)))
+           # Only if nothing was applied between the two digest requests
+           if digest is not None and self.get_digest() == (len(ruleset), digest):
+               self._save_snapshot(payload, len(ruleset), digest)
+           return ruleset, None
+
+       except socket.timeout:
+           metrics.increment("timeouts")
+           self.logger.error(f"Timeout waiting for kernel response after {self.SOCKET_TIMEOUT} seconds",
+                             extra=self._event("timeout", start))
+           return None, "Communication timeout"
+       except Exception as e:
+           self.logger.error(f"Error getting config: {str(e)}")
+           return None, str(e)
+
+   @metrics.timed("get_current_config")
    def get_current_config(self):
-       if not self.socket:
+       if not self.session.connected:
            self.logger.error("Socket not initialized")
            return None, "Socket not initialized"
 
+       if self.uses_binary_format():
+           ruleset, error = self.get_current_ruleset()
+           if error:
+               return None, error
+           metrics.increment("rules_received", len(ruleset))
+           with metrics.span("decode"):
+               return ruleset.to_dicts(), None
+
+       start = time.perf_counter()
        try:
-           message = self.create_message(b'', self.MSG_GET_CONFIG)
-           self.socket.send(message)
+           payload = self._request_payload(self.MSG_GET_CONFIG)
            self.logger.debug("Sent config request to kernel module")
 
-           response = self.socket.recv(1024 * 1024)
-           if len(response) > 17:
-               config_data = response[17:].lstrip(b'\x00').rstrip(b'\x00')
+           if payload:
+               config_data = bytes(payload).lstrip(b'\x00').rstrip(b'\x00')
                try:
-                   config = json.loads(config_data.decode('utf-8'))
-                   self.logger.info("Successfully received config from kernel module")
+                   with metrics.span("decode"):
+                       config = json.loads(config_data.decode('utf-8'))
+                   metrics.increment("rules_received", len(config))
+                   self.logger.info("Successfully received config from kernel module",
+                                    extra=self._event("get_config", start,
+                                                      payload_size=len(payload)))
                    return config, None
                except json.JSONDecodeError as e:
                    self.logger.error(f"Failed to parse config JSON: {str(e)}")
@@ -65,18 +465,35 @@ class KernelCommunicator:
                return None, "Invalid response from kernel"
 
        except socket.timeout:
-           self.logger.error(f"Timeout waiting for kernel response after {self.SOCKET_TIMEOUT} seconds")
+           metrics.increment("timeouts")
+           self.logger.error(f"Timeout waiting for kernel response after {self.SOCKET_TIMEOUT} seconds",
+                             extra=self._event("timeout", start))
            return None, "Communication timeout"
        except Exception as e:
            self.logger.error(f"Error getting config: {str(e)}")
            return None, str(e)
 
    # kernel_comm.py
-   def validate_applied_config(self, sent_config):
+   @metrics.timed("validate_applied_config")
+   def validate_applied_config(self, sent_config, sent_payload=None):
+      self.mismatch_rule_id = None
       try:
-          received_config, error = self.get_current_config()
-          if error:
-              return False, f"Failed to get config for validation: {error}"
+          if self.uses_digest():
+              return self.validate_digest(sent_config)
+          if self.uses_binary_format():
+              # Identical encodings need no field by field comparison
+              if sent_payload is None:
+                  sent_payload = encode_rules(sent_config)
+              payload = self._request_payload(self.MSG_GET_CONFIG_BINARY)
+              if payload is None:
+                  return False, "Failed to get config for validation: Invalid response from kernel"
+              if payload[:len(sent_payload)] == sent_payload:
+                  return True, None
+              received_config = decode_ruleset(payload).to_dicts()
+          else:
+              received_config, error = self.get_current_config()
+              if error:
+                  return False, f"Failed to get config for validation: {error}"
    
           sent_dicts = [rule.to_dict() for rule in sent_config]
           
@@ -86,6 +503,7 @@ class KernelCommunicator:
           for sent_rule, received_rule in zip(sent_dicts, received_config):
               for key in sent_rule:
                   if sent_rule[key] != received_rule.get(key):
+                      self.mismatch_rule_id = sent_rule['id']
                       return False, f"Rule mismatch for field {key}: sent {sent_rule[key]}, received {received_rule.get(key)}"
    
           return True, None
@@ -93,36 +511,104 @@ class KernelCommunicator:
       except Exception as e:
           return False, f"Validation error: {str(e)}"
    
+   def send_delta(self, delta, config):
+      """
+      Push delta, computed against applied_keys, with the changed rules
+      taken from config. Returns True if the kernel module applied it.
+      """
+      with metrics.span("encode"):
+          payload = encode_delta(delta, config)
+      self.logger.debug("Sending delta to kernel module: %s (%d bytes)", delta.summary(), len(payload))
+      return self._send_payload(payload, self.MSG_SEND_DELTA)
+
+   def _event(self, name, start, **fields):
+       """Event log fields for an operation that began at perf_counter() start"""
+       return event(name, latency=time.perf_counter() - start, **fields)
+
+   @metrics.timed("send_config")
    def send_config(self, config):
-      if not self.socket:
+      if not self.session.connected:
           self.logger.error("Socket not initialized")
           return False, "Socket not initialized", None
    
+      start = time.perf_counter()
+      self.bytes_sent = 0
       try:
-          config_dicts = [rule.to_dict() for rule in config]
-          config_json = json.dumps(config_dicts).encode('utf-8')
-          message = self.create_message(config_json, self.MSG_SEND_CONFIG)
-          self.socket.send(message)
-          self.logger.debug(f"Sent config to kernel module: {config_dicts}")
-   
-          response = self.socket.recv(1024)
-          if len(response) >= 20:
-              status = response[16:20]
-              if status == b'\x04\x00\x00\x00':
-                  is_valid, validation_error = self.validate_applied_config(config)
-                  if is_valid:
-                      self.logger.info("Config successfully applied and validated")
-                      return True, None, None
-                  else:
-                      self.logger.warning(f"Config validation failed: {validation_error}")
+          self._sync_connection()
+          keys = [rule_key(rule) for rule in config]
+          # Until the kernel confirms a push its rules are unknown
+          base, self.applied_keys = self.applied_keys, None
+          self.applied_digest = None
+          if base is not None and self.uses_delta():
+              delta = diff_rules(base, keys)
+              if delta is not None and delta.empty:
+                  self.applied_keys = base
+                  self.logger.info("Config unchanged since last apply, nothing sent")
+                  return True, None, None
+              if delta is not None and delta.size <= len(keys) * self.DELTA_MAX_FRACTION:
+                  metrics.increment("rules_sent", delta.size)
+                  if self.send_delta(delta, config):
+                      self.logger.info(f"Config delta applied: {delta.summary()}",
+                                       extra=self._event("apply_delta", start,
+                                                         payload_size=self.bytes_sent))
+                      # The kernel applied the delta to its own rules, which need
+                      # not be base; without digests this reads the ruleset back
+                      is_valid, validation_error = self.validate_applied_config(config)
+                      if is_valid:
+                          self.applied_keys = keys
+                          # A snapshot needs the full payload; the next start fetches it
+                          self._invalidate_snapshot()
+                          return True, None, None
+                      self.logger.warning(f"Config validation failed: {validation_error}",
+                                          extra=self._event("validation_failed", start,
+                                                            rule_id=self.mismatch_rule_id))
                       return True, None, validation_error
+                  metrics.increment("delta_fallbacks")
+                  self.logger.warning("Kernel rejected config delta, sending full config")
+
+          payload = None
+          metrics.increment("rules_sent", len(config))
+          if self.uses_binary_format():
+              with metrics.span("encode"):
+                  payload = encode_rules(config)
+              accepted = self._send_payload(payload, self.MSG_SEND_CONFIG_BINARY)
+              self.logger.debug("Sent %d rules to kernel module (%d bytes, binary)", len(config), len(payload))
+          else:
+              with metrics.span("encode"):
+                  config_dicts = [rule.to_dict() for rule in config]
+                  config_json = json.dumps(config_dicts).encode('utf-8')
+              accepted = self._send_payload(config_json, self.MSG_SEND_CONFIG)
+              # Formatted by the log writer thread, and only if a sink takes DEBUG
+              self.logger.debug("Sent config to kernel module: %s", config_dicts)
+   
+          if accepted:
+              is_valid, validation_error = self.validate_applied_config(config, payload)
+              if is_valid:
+                  self.applied_keys = keys
+                  self.logger.info("Config successfully applied and validated",
+                                   extra=self._event("apply", start, payload_size=self.bytes_sent))
+                  if self.snapshot_cache is not None:
+                      if payload is not None and self.applied_digest is not None:
+                          self._save_snapshot(payload, len(config), self.applied_digest)
+                      else:
+                          self._invalidate_snapshot()
+                  return True, None, None
               else:
-                  self.logger.error("Config processing failed")
-                  return False, "Kernel rejected configuration", None
+                  self.logger.warning(f"Config validation failed: {validation_error}",
+                                      extra=self._event("validation_failed", start,
+                                                        rule_id=self.mismatch_rule_id))
+                  return True, None, validation_error
+          else:
+              self.logger.error("Config processing failed",
+                                extra=self._event("apply_failed", start, payload_size=self.bytes_sent))
+              return False, "Kernel rejected configuration", None
    
       except socket.timeout:
-          self.logger.error(f"Timeout waiting for kernel response after {self.SOCKET_TIMEOUT} seconds")
+          metrics.increment("timeouts")
+          self.logger.error(f"Timeout waiting for kernel response after {self.SOCKET_TIMEOUT} seconds",
+                            extra=self._event("timeout", start, payload_size=self.bytes_sent))
           return False, "Communication timeout", None
       except Exception as e:
-          self.logger.error(f"Error sending config: {str(e)}")
+          self.logger.error(f"Error sending config: {str(e)}",
+                            extra=self._event("apply_failed", start, payload_size=self.bytes_sent))
           return False, str(e), None
\ No newline at end of file
@@ -1,30 +1,168 @@
+import atexit
 import logging
 import logging.handlers
+import queue
+import threading
 from pathlib import Path
 import datetime
-from PyQt6.QtCore import QObject, pyqtSignal
+from firewall_ui.config.settings import LOG_FILE, LOG_LEVEL, EVENT_LOG_FILE
+from firewall_ui.utils.event_log import EventLogHandler
 
-class QTextEditHandler(QObject, logging.Handler):
-    new_log = pyqtSignal(str)
+class BatchedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that leaves records in the stream buffer until the
+    listener finishes a batch, so a burst of records costs one write.
+    """
 
-    def __init__(self):
-        super().__init__()
-        logging.Handler.__init__(self)
+    def flush(self):
+        pass
 
-    def emit(self, record):
-        msg = self.format(record)
-        self.new_log.emit(msg)
+    def flush_batch(self):
+        super().flush()
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to an AsyncLogListener without doing any I/O.
+
+    Records are queued unformatted: their message is built on the listener
+    thread, once, and only if a sink accepts the record. Arguments must
+    therefore not be mutated after the logging call.
+
+    Under backpressure DEBUG records give way: once the queue is more than
+    SAMPLE_FRACTION full only every SAMPLE_EVERY-th one is kept and when it
+    is full they are dropped. Records of higher levels wait up to
+    PUT_TIMEOUT seconds for room and are dropped after that, so a stalled
+    writer cannot block the caller. The number of dropped records is
+    logged as a warning as soon as the queue has room again.
+    """
+    SAMPLE_FRACTION = 0.5
+    SAMPLE_EVERY = 10
+    PUT_TIMEOUT = 0.1
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._sampled = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        log_queue = self.queue
+        crowded = 0 < log_queue.maxsize * self.SAMPLE_FRACTION <= log_queue.qsize()
+        if self.dropped and not crowded:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                log_queue.put_nowait(logging.makeLogRecord({
+                    'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': "Dropped %d log records under load", 'args': (dropped,)}))
+            except queue.Full:
+                self.dropped += dropped
+        if record.levelno > logging.DEBUG:
+            try:
+                log_queue.put(record, timeout=self.PUT_TIMEOUT)
+            except queue.Full:
+                self.dropped += 1
+            return
+        if crowded:
+            self._sampled += 1
+            if self._sampled % self.SAMPLE_EVERY:
+                self.dropped += 1
+                return
+        try:
+            log_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class AsyncLogListener(logging.handlers.QueueListener):
+    """
+    Writes queued records to the sinks on a background thread.
+
+    Records are taken up to BATCH_SIZE at a time and sinks with a
+    flush_batch() method are flushed once per batch.
+    """
+    BATCH_SIZE = 256
+
+    def __init__(self, log_queue, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+
+    def handle(self, record):
+        wanted = [handler for handler in self.handlers if record.levelno >= handler.level]
+        if not wanted:
+            return
+        # Build the message once for every sink
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+        except Exception:
+            # Bad arguments for the format; report it like logging.Handler
+            # does, once, and keep the writer thread alive
+            wanted[0].handleError(record)
+            return
+        for handler in wanted:
+            try:
+                handler.handle(record)
+            except Exception:
+                handler.handleError(record)
+
+    def _monitor(self):
+        log_queue = self.queue
+        stopping = False
+        while not stopping:
+            batch = [log_queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+            for handler in self.handlers:
+                flush_batch = getattr(handler, 'flush_batch', None)
+                if flush_batch is not None:
+                    try:
+                        flush_batch()
+                    except Exception:
+                        handler.handleError(None)
+            for _ in batch:
+                log_queue.task_done()
 
 class FirewallLogger:
-    def __init__(self):
+    """
+    Process-wide logging setup driven by LOG_FILE and LOG_LEVEL in
+    config/settings.py.
+
+    Every FirewallLogger() returns the same instance; only the first one
+    creates the sinks and the writer thread, so each record reaches each
+    sink once however many components ask for the logger.
+    """
+    # Records waiting for the writer thread before DEBUG records are dropped
+    QUEUE_SIZE = 10000
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._setup()
+                cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
         # Create logs directory if it doesn't exist
-        log_dir = Path("logs")
-        log_dir.mkdir(exist_ok=True)
-        
+        log_file = Path(LOG_FILE)
+        log_dir = log_file.parent
+        log_dir.mkdir(parents=True, exist_ok=True)
+
         # Create logger
         self.logger = logging.getLogger("FirewallUI")
-        self.logger.setLevel(logging.DEBUG)
-        
+        self.logger.setLevel(LOG_LEVEL)
+
         # Create formatters
         file_formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -32,43 +170,58 @@ class FirewallLogger:
         console_formatter = logging.Formatter(
             '%(levelname)s: %(message)s'
         )
-        
+
         # File handler for all logs
-        all_logs = logging.handlers.RotatingFileHandler(
-            log_dir / "firewall.log",
+        all_logs = BatchedFileHandler(
+            log_file,
             maxBytes=10485760,  # 10MB
             backupCount=5
         )
         all_logs.setFormatter(file_formatter)
         all_logs.setLevel(logging.DEBUG)
-        
+
         # File handler for error logs
-        error_logs = logging.handlers.RotatingFileHandler(
+        error_logs = BatchedFileHandler(
             log_dir / "error.log",
             maxBytes=10485760,  # 10MB
             backupCount=5
         )
         error_logs.setFormatter(file_formatter)
         error_logs.setLevel(logging.ERROR)
-        
+
         # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(console_formatter)
         console_handler.setLevel(logging.INFO)
-        
-        # QTextEdit handler
-        self.qt_handler = QTextEditHandler()
-        self.qt_handler.setFormatter(file_formatter)
-        self.qt_handler.setLevel(logging.DEBUG)
-        
-        # Add handlers to logger
-        self.logger.addHandler(all_logs)
-        self.logger.addHandler(error_logs)
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(self.qt_handler)
-    
+
+        self.formatter = file_formatter
+        self.console_handler = console_handler
+        handlers = [all_logs, error_logs, console_handler]
+
+        # Records logged with extra=event(...) also go to the binary event log
+        if EVENT_LOG_FILE:
+            Path(EVENT_LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+            handlers.append(EventLogHandler(EVENT_LOG_FILE))
+
+        # Callers only queue records; a listener thread writes them to the sinks
+        log_queue = queue.Queue(self.QUEUE_SIZE)
+        self.listener = AsyncLogListener(log_queue, *handlers)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+        self.logger.addHandler(AsyncQueueHandler(log_queue))
+
     def get_logger(self):
         return self.logger
 
-    def get_qt_handler(self):
-        return self.qt_handler
\ No newline at end of file
+    def add_sink(self, handler):
+        """
+        Also write records to handler, on the writer thread. Handlers
+        without a formatter get the log file format.
+        """
+        if handler.formatter is None:
+            handler.setFormatter(self.formatter)
+        # The writer thread reads the tuple without a lock; swap it whole
+        self.listener.handlers = self.listener.handlers + (handler,)
+
+    def remove_sink(self, handler):
+        self.listener.handlers = tuple(h for h in self.listener.handlers if h is not handler)
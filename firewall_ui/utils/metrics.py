@@ -0,0 +1,179 @@
+"""
+In-process metrics for the kernel communication hot paths.
+
+Code is timed with spans and counted with counters on the process-wide
+registry, metrics:
+
+    with metrics.span("send_config.encode"):
+        payload = encode_rules(config)
+    metrics.increment("bytes_sent", len(payload))
+
+The Metrics tab shows a snapshot of the registry and MetricsExporter
+writes it to a file, in Prometheus text format or as JSON, for a local
+scraper to pick up.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+PROMETHEUS_PREFIX = "firewall_ui"
+
+
+@dataclass
+class LatencyStats:
+    """Count, total, maximum and last of a series of durations, in seconds"""
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    last: float = 0.0
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+        self.last = latency
+
+
+class Metrics:
+    """Thread-safe registry of counters and span timings, in seconds"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._spans = {}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._spans.setdefault(name, LatencyStats()).add(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the with block as span name, whether or not it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator timing every call of the function as span name"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def timing(self, name):
+        """Return a copy of the LatencyStats of span name"""
+        with self._lock:
+            stats = self._spans.get(name, LatencyStats())
+            return LatencyStats(stats.count, stats.total, stats.maximum, stats.last)
+
+    def snapshot(self):
+        """Return {"counters": {name: value}, "spans": {name: {count, total, ...}}}"""
+        with self._lock:
+            return {
+                "counters": dict(sorted(self._counters.items())),
+                "spans": {name: {"count": stats.count, "total": stats.total,
+                                 "average": stats.average, "maximum": stats.maximum,
+                                 "last": stats.last}
+                          for name, stats in sorted(self._spans.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._spans.clear()
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Return the snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            metric = f"{PROMETHEUS_PREFIX}_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        if snapshot["spans"]:
+            summary = f"{PROMETHEUS_PREFIX}_span_seconds"
+            maximum = f"{PROMETHEUS_PREFIX}_span_max_seconds"
+            lines.append(f"# TYPE {summary} summary")
+            for name, stats in snapshot["spans"].items():
+                lines.append(f'{summary}_count{{span="{name}"}} {stats["count"]}')
+                lines.append(f'{summary}_sum{{span="{name}"}} {stats["total"]!r}')
+            lines.append(f"# TYPE {maximum} gauge")
+            for name, stats in snapshot["spans"].items():
+                lines.append(f'{maximum}{{span="{name}"}} {stats["maximum"]!r}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Write the metrics to path, as JSON if it ends in .json and in
+        Prometheus text format otherwise. The file is replaced atomically
+        so a scraper never reads it half written.
+        """
+        text = self.to_json() if str(path).endswith(".json") else self.to_prometheus()
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as metrics_file:
+            metrics_file.write(text)
+        os.replace(temporary, path)
+
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() else "_" for c in name)
+
+
+class MetricsExporter:
+    """Writes a Metrics registry to a file every interval seconds on a daemon thread"""
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write the final values"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._export()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._export()
+
+    def _export(self):
+        try:
+            self.registry.export(self.path)
+        except OSError:
+            # A missing or read-only directory must not take the app down
+            pass
+
+
+# The registry the application records into
+metrics = Metrics()
@@ -0,0 +1,267 @@
+import os
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from firewall_ui.utils.event_log import event
+from firewall_ui.utils.metrics import LatencyStats
+
+NLMSG_HEADER = struct.Struct("=LHHLL")
+# Messages batched in one datagram start on multiples of this
+NLMSG_ALIGNTO = 4
+
+
+class PendingRequest:
+    """
+    An exchange with the kernel module identified by one sequence number.
+
+    Every message the session receives with this sequence number is queued
+    here until the request is closed; more messages can be sent under the
+    same sequence number with send(). Use as a context manager so the
+    request is always closed and its latency recorded.
+    """
+
+    def __init__(self, session, seq, msg_type):
+        self.session = session
+        self.seq = seq
+        self.msg_type = msg_type
+        self.sent_at = time.perf_counter()
+        self.replied_at = None
+        self.latency = None
+        self._messages = queue.SimpleQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def send(self, msg_type, payload=b'', flags=0):
+        self.session.send(msg_type, payload, flags, self.seq)
+
+    def next_message(self, timeout):
+        """Return the next reply; raises socket.timeout or ConnectionError"""
+        try:
+            message = self._messages.get(timeout=timeout)
+        except queue.Empty:
+            raise socket.timeout(f"No reply to request {self.seq} within {timeout} seconds")
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        self.session._finish(self)
+
+    def _deliver(self, message):
+        self.replied_at = time.perf_counter()
+        self._messages.put(message)
+
+
+class NetlinkSession:
+    """
+    Shared connection to the kernel module.
+
+    Every request gets its own sequence number and any number of requests
+    may be outstanding at once, from any thread. A reader thread receives
+    all messages and routes them to the request with the matching sequence
+    number; replies with sequence number 0, from modules that do not echo
+    it, go to the oldest outstanding request. That is only right while one
+    request is outstanding at a time, as KernelCommunicator does, so such
+    modules must not be shared by concurrent callers.
+
+    connect() must return a connected socket. When it fails, or the socket
+    breaks, outstanding requests fail with ConnectionError and the reader
+    keeps reconnecting with exponential backoff.
+    """
+    RECONNECT_MIN_DELAY = 0.1
+    RECONNECT_MAX_DELAY = 5.0
+    POLL_INTERVAL = 0.2
+    RECV_BUFFER_SIZE = 1024 * 1024 + 1024
+
+    def __init__(self, connect, logger):
+        self._connect = connect
+        self.logger = logger
+        self.socket = None
+        # Number of successful connects, so users can tell a reconnect happened
+        self.connections = 0
+        self.latencies = {}
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._seq = 0
+        self._closed = False
+        self._wakeup = threading.Event()
+        # Written to by close() so the reader leaves select() at once
+        self._close_read, self._close_write = os.pipe()
+        self._reconnect_delay = self.RECONNECT_MIN_DELAY
+        self._failures = 0
+        self._pid = os.getpid()
+
+        self._try_connect()
+        self._reader = threading.Thread(target=self._run, name="netlink-session", daemon=True)
+        self._reader.start()
+
+    @property
+    def connected(self):
+        return self.socket is not None
+
+    def open(self, msg_type=b''):
+        """Register a new request without sending anything yet"""
+        with self._lock:
+            if self.socket is None:
+                self._wakeup.set()
+                raise ConnectionError("Socket not initialized")
+            self._seq = self._seq % 0xFFFFFFFF + 1
+            request = PendingRequest(self, self._seq, msg_type)
+            self._pending[request.seq] = request
+        return request
+
+    def request(self, msg_type, payload=b'', flags=0):
+        """Send a message with a fresh sequence number and return its request"""
+        request = self.open(msg_type)
+        try:
+            request.send(msg_type, payload, flags)
+        except OSError:
+            request.close()
+            raise
+        return request
+
+    def send(self, msg_type, payload=b'', flags=0, seq=0):
+        """
+        Send one message. payload may be a bytes-like object or a list of
+        them, which is sent with scatter/gather I/O without joining.
+        """
+        parts = payload if isinstance(payload, list) else [payload]
+        length = NLMSG_HEADER.size + len(msg_type) + sum(len(part) for part in parts)
+        header = NLMSG_HEADER.pack(length, 0, flags, seq, self._pid)
+        sock = self.socket
+        if sock is None:
+            raise ConnectionError("Socket not initialized")
+        try:
+            sock.sendmsg([header, msg_type] + parts)
+        except OSError as e:
+            self._disconnect(sock, e)
+            raise ConnectionError(f"Send failed: {e}") from e
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        os.write(self._close_write, b'\0')
+        self._reader.join()
+        os.close(self._close_read)
+        os.close(self._close_write)
+        sock = self.socket
+        if sock is not None:
+            self._disconnect(sock, ConnectionError("Session closed"))
+
+    def _finish(self, request):
+        with self._lock:
+            if self._pending.pop(request.seq, None) is None:
+                return
+        if request.replied_at is not None:
+            request.latency = request.replied_at - request.sent_at
+            self.latencies.setdefault(request.msg_type, LatencyStats()).add(request.latency)
+            self.logger.debug("Request %d (type %s) took %.1f ms", request.seq,
+                              request.msg_type.hex(), request.latency * 1000,
+                              extra=event("request", latency=request.latency))
+
+    def _try_connect(self):
+        try:
+            sock = self._connect()
+        except Exception as e:
+            self._failures += 1
+            if self._failures == 1:
+                self.logger.error(f"Failed to initialize netlink socket: {str(e)}")
+            return False
+        sock.settimeout(None)
+        with self._lock:
+            self.socket = sock
+            self.connections += 1
+        if self._failures:
+            self.logger.info(f"Netlink socket reconnected after {self._failures} failed attempts")
+        else:
+            self.logger.info("Netlink socket initialized successfully")
+        self._failures = 0
+        self._reconnect_delay = self.RECONNECT_MIN_DELAY
+        return True
+
+    def _disconnect(self, sock, error):
+        with self._lock:
+            if self.socket is not sock:
+                return
+            self.socket = None
+            pending = list(self._pending.values())
+        try:
+            sock.close()
+        except OSError:
+            pass
+        if not self._closed:
+            self.logger.warning(f"Netlink socket lost: {error}")
+        for request in pending:
+            request._deliver(ConnectionError(f"Connection lost: {error}"))
+
+    def _run(self):
+        buffer = bytearray(self.RECV_BUFFER_SIZE)
+        while not self._closed:
+            sock = self.socket
+            if sock is None:
+                self._wakeup.wait(self._reconnect_delay)
+                self._wakeup.clear()
+                if not self._closed and not self._try_connect():
+                    self._reconnect_delay = min(self._reconnect_delay * 2,
+                                                self.RECONNECT_MAX_DELAY)
+                continue
+            try:
+                readable, _, _ = select.select([sock, self._close_read], [],
+                                               [], self.POLL_INTERVAL)
+                if sock not in readable:
+                    continue
+                size, _, flags, _ = sock.recvmsg_into([buffer])
+            except (OSError, ValueError) as e:
+                self._disconnect(sock, e)
+                continue
+            if not size:
+                self._disconnect(sock, ConnectionError("Closed by kernel"))
+                continue
+            self._dispatch(bytes(memoryview(buffer)[:size]), bool(flags & socket.MSG_TRUNC))
+
+    def _dispatch(self, datagram, truncated=False):
+        """
+        Route every message of a datagram; netlink may batch several in one.
+        truncated means the datagram did not fit in the receive buffer.
+        """
+        offset = 0
+        while len(datagram) - offset >= NLMSG_HEADER.size:
+            length, _, _, seq, _ = NLMSG_HEADER.unpack_from(datagram, offset)
+            end = offset + length
+            if end > len(datagram) and (truncated or end > self.RECV_BUFFER_SIZE):
+                # Fail the request now rather than let it wait for a timeout
+                error = (f"Reply of {length} bytes to request {seq} does not fit "
+                         f"the {self.RECV_BUFFER_SIZE} byte receive buffer")
+                self.logger.warning(error)
+                self._route(seq, ConnectionError(error))
+                return
+            if length < NLMSG_HEADER.size or end > len(datagram):
+                self.logger.warning(f"Dropping malformed message of length {length} "
+                                    f"at offset {offset}")
+                return
+            self._route(seq, datagram[offset:end])
+            offset += (length + NLMSG_ALIGNTO - 1) & ~(NLMSG_ALIGNTO - 1)
+        if truncated:
+            self.logger.warning(f"Dropping messages past the {self.RECV_BUFFER_SIZE} byte "
+                                "receive buffer")
+
+    def _route(self, seq, message):
+        with self._lock:
+            request = self._pending.get(seq)
+            # Only a guess with more than one request outstanding; see the class docstring
+            if request is None and seq == 0 and self._pending:
+                request = next(iter(self._pending.values()))
+        if request is None:
+            self.logger.debug("Dropping reply to unknown request %d", seq)
+            return
+        request._deliver(message)
@@ -0,0 +1,126 @@
+import struct
+from hashlib import blake2b
+from firewall_ui.models.address import parse_address
+from firewall_ui.models.rule import Protocol, Action, Direction
+
+# Canonical rule digest shared with the kernel module.
+#
+# Every rule is hashed as one little-endian record: uint32 id, then for the
+# source start/end and destination start/end addresses a uint8 IP version
+# and the address as a 16-byte big-endian integer, four uint16 ports (0 if
+# unset), a uint8 bitmask of unset ports (source start, source end,
+# destination start, destination end), the protocol, action and direction
+# as uint8 length-prefixed ASCII names, a uint8 enabled flag, and the
+# description as uint32 length plus UTF-8 bytes.
+#
+# Hashes are 16-byte BLAKE2b. A leaf is H(0x00 || record) and an inner node
+# H(0x01 || left || right); a node without a right sibling is carried up
+# unchanged. The root is H(uint64 count || top node), with H(b"") as the
+# top node of an empty list. Node (level, index) covers rules
+# [index * 2**level, (index + 1) * 2**level), so equal nodes on both sides
+# mean the rules in that range are equal.
+DIGEST_SIZE = 16
+EMPTY_NODE = bytes(DIGEST_SIZE)
+
+_RECORD = struct.Struct('<IB16sB16sB16sB16sHHHHB')
+_DESCRIPTION_LENGTH = struct.Struct('<I')
+_COUNT = struct.Struct('<Q')
+
+# Length-prefixed names of the enum fields, by member and by value
+_NAMES = {}
+for _enum in (Protocol, Action, Direction):
+    for _member in _enum:
+        _NAMES[_member] = _NAMES[_member.value] = (
+            bytes((len(_member.value),)) + _member.value.encode('ascii'))
+
+
+def _hash(data):
+    return blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def rule_record(rule):
+    """Return the canonical byte record of a rule"""
+    source_start = parse_address(rule.source_address_start)
+    source_end = parse_address(rule.source_address_end)
+    destination_start = parse_address(rule.destination_address_start)
+    destination_end = parse_address(rule.destination_address_end)
+    ports = (rule.source_port_start, rule.source_port_end,
+             rule.destination_port_start, rule.destination_port_end)
+    unset = 0
+    for bit, port in enumerate(ports):
+        if port is None:
+            unset |= 1 << bit
+    description = rule.description.encode('utf-8') if rule.description else b''
+    return b''.join((
+        _RECORD.pack(rule.id,
+                     source_start[0], source_start[1].to_bytes(16, 'big'),
+                     source_end[0], source_end[1].to_bytes(16, 'big'),
+                     destination_start[0], destination_start[1].to_bytes(16, 'big'),
+                     destination_end[0], destination_end[1].to_bytes(16, 'big'),
+                     ports[0] or 0, ports[1] or 0, ports[2] or 0, ports[3] or 0, unset),
+        _NAMES[rule.protocol], _NAMES[rule.action], _NAMES[rule.direction],
+        b'\x01' if rule.enabled else b'\x00',
+        _DESCRIPTION_LENGTH.pack(len(description)), description))
+
+
+def leaf_hash(rule):
+    return _hash(b'\x00' + rule_record(rule))
+
+
+class MerkleTree:
+    """Merkle tree over the leaf hashes of an ordered rule list"""
+
+    def __init__(self, leaves):
+        self.count = len(leaves)
+        levels = [list(leaves)]
+        while len(levels[-1]) > 1:
+            below = levels[-1]
+            level = [_hash(b'\x01' + below[i] + below[i + 1])
+                     for i in range(0, len(below) - 1, 2)]
+            if len(below) % 2:
+                level.append(below[-1])
+            levels.append(level)
+        self.levels = levels
+        top = levels[-1][0] if self.count else _hash(b'')
+        self.root = _hash(_COUNT.pack(self.count) + top)
+
+    @classmethod
+    def from_rules(cls, rules):
+        return cls([leaf_hash(rule) for rule in rules])
+
+    @property
+    def height(self):
+        return len(self.levels)
+
+    def node(self, level, index):
+        """Return the hash of node (level, index), or EMPTY_NODE if there is none"""
+        if level < len(self.levels) and index < len(self.levels[level]):
+            return self.levels[level][index]
+        return EMPTY_NODE
+
+
+def find_divergence(tree, fetch_nodes):
+    """
+    Return the position of the first rule where tree and a remote tree
+    differ, given that their roots differ.
+
+    fetch_nodes takes a list of (level, index) pairs and returns the remote
+    hashes of those nodes. The search walks down from the top of the local
+    tree, asking for the two children of the differing node at every
+    level, so it takes one call per level. Returns tree.count if every
+    local rule matches and the remote list is only longer.
+    """
+    level = tree.height - 1
+    index = 0
+    if not tree.count or tree.node(level, index) == fetch_nodes([(level, index)])[0]:
+        return tree.count
+    while level > 0:
+        level -= 1
+        left, right = fetch_nodes([(level, 2 * index), (level, 2 * index + 1)])
+        if left != tree.node(level, 2 * index):
+            index = 2 * index
+        elif right != tree.node(level, 2 * index + 1):
+            index = 2 * index + 1
+        else:
+            return tree.count
+    return index
@@ -0,0 +1,525 @@
+"""
+Streaming import and export of rule files.
+
+Three formats are supported:
+
+    json       a JSON array of rules in the format of Rule.to_dict()
+    csv        one rule per row under a header naming the Rule fields
+    iptables   iptables-save output; -A INPUT and -A OUTPUT rules of the
+               filter table using -s/-d, -p tcp/udp, --sport/--dport,
+               -m iprange, -m comment and -j ACCEPT/DROP/REJECT
+
+Files are parsed by generators, so a file is never held in memory in full:
+RuleReader yields validated batches of Rules and reports how far into the
+file it is, and write_rules() writes any iterable of Rules as it goes.
+"""
+import csv
+import io
+import json
+import os
+import re
+import shlex
+import sys
+from dataclasses import fields
+from itertools import islice
+from firewall_ui.models.address import parse_address, format_address
+from firewall_ui.models.rule import Rule, Protocol, Action, Direction
+from firewall_ui.models.validation import validate_many
+
+FORMATS = ('json', 'csv', 'iptables')
+SUFFIXES = {'.json': 'json', '.csv': 'csv', '.rules': 'iptables', '.save': 'iptables',
+            '.iptables': 'iptables'}
+
+# Rules parsed and validated at a time
+BATCH_SIZE = 5000
+# Characters read from a JSON file at a time
+JSON_CHUNK_SIZE = 1 << 16
+# Longest JSON text of one rule; anything longer is reported as invalid
+MAX_JSON_RULE = 1 << 20
+
+CSV_COLUMNS = tuple(f.name for f in fields(Rule))
+_REQUIRED_CSV_COLUMNS = ('source_address_start', 'source_address_end',
+                         'destination_address_start', 'destination_address_end',
+                         'protocol', 'action', 'direction')
+_BOOLEANS = {'': True, 'true': True, '1': True, 'yes': True,
+             'false': False, '0': False, 'no': False}
+
+_CHAINS = {'INPUT': Direction.INBOUND, 'OUTPUT': Direction.OUTBOUND}
+_CHAIN_NAMES = {direction: chain for chain, direction in _CHAINS.items()}
+_TARGETS = {'ACCEPT': Action.ACCEPT, 'DROP': Action.DROP,
+            # The kernel module has no reject action; the packet is dropped either way
+            'REJECT': Action.DROP}
+_IPTABLES_PROTOCOLS = {'tcp': Protocol.TCP, 'udp': Protocol.UDP, 'all': Protocol.ANY}
+# Match modules the options below cover; anything else cannot be expressed
+_MATCHES = {'tcp', 'udp', 'iprange', 'comment'}
+_ANY_ADDRESS = {4: ('0.0.0.0', '255.255.255.255'),
+                6: ('::', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff')}
+# Disabled rules are exported as comments, which iptables-restore skips
+DISABLED_PREFIX = '# disabled: '
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+class RuleFileError(ValueError):
+    pass
+
+
+def detect_format(path):
+    """Return the format of a rule file from its suffix, or None"""
+    return SUFFIXES.get(os.path.splitext(path)[1].lower())
+
+
+def sniff_format(text):
+    """Guess the format of a rule file from its first characters"""
+    text = text.lstrip()
+    if text.startswith('['):
+        return 'json'
+    if text.startswith(('*', '#', ':', '-A')):
+        return 'iptables'
+    return 'csv'
+
+
+def iter_json(stream, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yield the rule dicts of a JSON array read from stream, chunk by chunk.
+
+    Only the array element being decoded and the unread part of the
+    current chunk are kept, so memory does not grow with the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+        return not eof
+
+    def next_char():
+        # Skip whitespace and return the next character, '' at the end
+        nonlocal position
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or not read_more():
+                return buffer[position:position + 1]
+
+    if next_char() != '[':
+        raise RuleFileError("Expected a JSON array of rules")
+    position += 1
+    if next_char() == ']':
+        return
+    count = 0
+    while True:
+        # raw_decode() does not skip leading whitespace
+        next_char()
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Most likely the element continues in the next chunk
+            if len(buffer) - position < MAX_JSON_RULE and read_more():
+                continue
+            raise RuleFileError(f"Rule {count + 1}: invalid JSON: {e.msg}")
+        position = end
+        count += 1
+        if not isinstance(value, dict):
+            raise RuleFileError(f"Rule {count}: expected an object")
+        yield value
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise RuleFileError(f"Rule {count}: expected ',' or ']' after it")
+        position += 1
+
+
+def iter_csv(stream):
+    """Yield the rule dicts of a CSV file with a header row of Rule fields"""
+    reader = csv.DictReader(stream)
+    missing = [name for name in _REQUIRED_CSV_COLUMNS if name not in (reader.fieldnames or ())]
+    if missing:
+        raise RuleFileError(f"CSV header lacks the columns: {', '.join(missing)}")
+    for row in reader:
+        try:
+            yield {
+                'source_address_start': row['source_address_start'],
+                'source_address_end': row['source_address_end'],
+                'source_port_start': _csv_port(row.get('source_port_start')),
+                'source_port_end': _csv_port(row.get('source_port_end')),
+                'destination_address_start': row['destination_address_start'],
+                'destination_address_end': row['destination_address_end'],
+                'destination_port_start': _csv_port(row.get('destination_port_start')),
+                'destination_port_end': _csv_port(row.get('destination_port_end')),
+                'protocol': row['protocol'].upper(),
+                'action': row['action'].upper(),
+                'direction': row['direction'].upper(),
+                'enabled': _BOOLEANS[(row.get('enabled') or '').strip().lower()],
+                'description': row.get('description') or '',
+            }
+        except (ValueError, KeyError) as e:
+            raise RuleFileError(f"Line {reader.line_num}: invalid value {e}")
+
+
+def _csv_port(value):
+    return int(value) if value and value.strip() else None
+
+
+def iter_iptables(stream):
+    """
+    Yield the rule dicts of the filter table in iptables-save output.
+
+    Chain policies, other tables and comments are skipped; options the
+    rule model cannot express (interfaces, negation, state matches, other
+    chains or targets) are errors rather than being silently dropped.
+    """
+    table = None
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        enabled = True
+        if line.startswith(DISABLED_PREFIX):
+            line, enabled = line[len(DISABLED_PREFIX):], False
+        if not line or line.startswith(('#', ':')) or line == 'COMMIT':
+            continue
+        if line.startswith('*'):
+            table = line[1:]
+            continue
+        if table != 'filter':
+            continue
+        try:
+            # shlex is slow; only comments are ever quoted
+            rule = _parse_iptables_rule(shlex.split(line) if '"' in line or "'" in line
+                                        else line.split())
+        except ValueError as e:
+            raise RuleFileError(f"Line {number}: {e}")
+        rule['enabled'] = enabled
+        yield rule
+
+
+def _parse_iptables_rule(tokens):
+    options = {}
+    tokens = iter(tokens)
+    for token in tokens:
+        if token == '!':
+            raise ValueError("negated matches are not supported")
+        if token == '-m':
+            match = next(tokens, '')
+            if match not in _MATCHES:
+                raise ValueError(f"unsupported match '-m {match}'")
+            continue
+        name = _IPTABLES_OPTIONS.get(token)
+        value = next(tokens, None)
+        if name is None:
+            raise ValueError(f"unsupported option '{token}'")
+        if value is None:
+            raise ValueError(f"'{token}' needs a value")
+        options[name] = value
+
+    chain = options.get('chain')
+    if chain not in _CHAINS:
+        raise ValueError(f"unsupported chain '{chain}', only INPUT and OUTPUT rules can be imported"
+                         if chain else "not an -A rule")
+    target = options.get('target')
+    if target not in _TARGETS:
+        raise ValueError(f"unsupported target '{target}'")
+    protocol = _IPTABLES_PROTOCOLS.get(options.get('protocol', 'all').lower())
+    if protocol is None:
+        raise ValueError(f"unsupported protocol '{options['protocol']}'")
+    if protocol == Protocol.ANY and ('sport' in options or 'dport' in options):
+        raise ValueError("ports need -p tcp or -p udp")
+
+    source = _iptables_addresses(options.get('source'), options.get('src_range'))
+    destination = _iptables_addresses(options.get('destination'), options.get('dst_range'))
+    # An unspecified side matches every address of the other side's family
+    version = (source or destination or (4,))[0]
+    source = source or (version, *_ANY_ADDRESS[version])
+    destination = destination or (version, *_ANY_ADDRESS[version])
+    source_ports = _iptables_ports(options.get('sport'))
+    destination_ports = _iptables_ports(options.get('dport'))
+    return {
+        'source_address_start': source[1],
+        'source_address_end': source[2],
+        'source_port_start': source_ports[0],
+        'source_port_end': source_ports[1],
+        'destination_address_start': destination[1],
+        'destination_address_end': destination[2],
+        'destination_port_start': destination_ports[0],
+        'destination_port_end': destination_ports[1],
+        'protocol': protocol.value,
+        'action': _TARGETS[target].value,
+        'direction': _CHAINS[chain].value,
+        'description': options.get('comment', ''),
+    }
+
+
+_IPTABLES_OPTIONS = {
+    '-A': 'chain', '--append': 'chain',
+    '-s': 'source', '--source': 'source', '-d': 'destination', '--destination': 'destination',
+    '-p': 'protocol', '--protocol': 'protocol',
+    '--sport': 'sport', '--source-port': 'sport', '--dport': 'dport', '--destination-port': 'dport',
+    '--src-range': 'src_range', '--dst-range': 'dst_range',
+    '--comment': 'comment',
+    '-j': 'target', '--jump': 'target',
+}
+
+
+def _iptables_addresses(network, address_range):
+    """Return (version, first, last) of a -s/-d network or an iprange, or None"""
+    if network and address_range:
+        raise ValueError("an address and an address range for the same side")
+    if address_range:
+        start, _, end = address_range.partition('-')
+        return parse_address(start)[0], start, end or start
+    if network:
+        address, _, prefix = network.partition('/')
+        version, value = parse_address(address)
+        bits = 32 if version == 4 else 128
+        host_bits = bits - int(prefix) if prefix else 0
+        if not 0 <= host_bits <= bits:
+            raise ValueError(f"invalid prefix length in '{network}'")
+        first = value >> host_bits << host_bits
+        return (version, format_address(version, first),
+                format_address(version, first | (1 << host_bits) - 1))
+    return None
+
+
+def _iptables_ports(ports):
+    if ports is None:
+        return None, None
+    start, separator, end = ports.partition(':')
+    start = int(start) if start else 0
+    end = (int(end) if end else 65535) if separator else start
+    return start, end
+
+
+_PARSERS = {'json': iter_json, 'csv': iter_csv, 'iptables': iter_iptables}
+
+
+def iter_rules(stream, format):
+    """Yield the Rules of a rule file, unvalidated, as they are parsed"""
+    for number, data in enumerate(_PARSERS[format](stream), 1):
+        try:
+            yield Rule.from_dict(data)
+        except (ValueError, KeyError, TypeError) as e:
+            raise RuleFileError(f"Rule {number}: invalid or missing value {e}")
+
+
+def validated_batches(rules, batch_size=BATCH_SIZE):
+    """
+    Group rules into lists of batch_size and validate each with
+    validate_many(), raising RuleFileError at the first invalid batch.
+    """
+    rules = iter(rules)
+    start = 0
+    while True:
+        batch = list(islice(rules, batch_size))
+        if not batch:
+            return
+        report = validate_many(batch)
+        if not report.ok:
+            raise RuleFileError(_batch_errors(report, start))
+        yield batch
+        start += len(batch)
+
+
+def _batch_errors(report, start, limit=10):
+    lines = [f"Rule {start + index + 1}: {'; '.join(report.errors[index])}"
+             for index in sorted(report.errors)[:limit]]
+    if report.invalid_count > limit:
+        lines.append(f"... and {report.invalid_count - limit} more in rules "
+                     f"{start + 1}-{start + report.total}")
+    return "\n".join(lines)
+
+
+class RuleReader:
+    """
+    Reads a rule file ("-" for stdin) in validated batches.
+
+    Iterating yields lists of at most batch_size Rules. position and size
+    are in bytes (size is None for stdin), for progress reporting; count is
+    the number of rules yielded so far. The format is taken from the file
+    suffix when not given and guessed from the content otherwise.
+    """
+
+    def __init__(self, path, format=None, batch_size=BATCH_SIZE):
+        if format is not None and format not in FORMATS:
+            raise RuleFileError(f"Unknown rule file format '{format}'")
+        self.path = path
+        self.batch_size = batch_size
+        self.count = 0
+        if path == '-':
+            self._stream = sys.stdin
+            self.size = None
+        else:
+            try:
+                self._stream = open(path, encoding='utf-8', newline='')
+                self.size = os.fstat(self._stream.fileno()).st_size
+            except OSError as e:
+                raise RuleFileError(f"Cannot read rules from {path}: {e.strerror}")
+        self.format = format or detect_format(path)
+        if self.format is None:
+            try:
+                self._stream = _Peekable(self._stream)
+            except UnicodeDecodeError as e:
+                self.close()
+                raise RuleFileError(f"{path} is not UTF-8 text: {e.reason}")
+            self.format = sniff_format(self._stream.peek())
+
+    @property
+    def position(self):
+        try:
+            return self._stream.buffer.tell()
+        except (AttributeError, OSError, ValueError):
+            return 0
+
+    def __iter__(self):
+        try:
+            for batch in validated_batches(iter_rules(self._stream, self.format),
+                                           self.batch_size):
+                self.count += len(batch)
+                yield batch
+        except UnicodeDecodeError as e:
+            raise RuleFileError(f"{self.path} is not UTF-8 text: {e.reason}")
+
+    def read_all(self):
+        """Return every rule of the file in one list"""
+        return [rule for batch in self for rule in batch]
+
+    def close(self):
+        if self._stream is not sys.stdin:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Peekable:
+    """Text stream whose first characters can be looked at before parsing"""
+
+    def __init__(self, stream, size=512):
+        self._stream = stream
+        self._head = stream.read(size)
+        self.buffer = getattr(stream, 'buffer', None)
+
+    def peek(self):
+        return self._head
+
+    def read(self, size=-1):
+        head, self._head = self._head, ''
+        if not head:
+            return self._stream.read(size)
+        if 0 <= size <= len(head):
+            self._head = head[size:]
+            return head[:size]
+        return head + self._stream.read(size - len(head) if size > 0 else -1)
+
+    def __iter__(self):
+        # Line iteration for csv and iptables-save: finish the head's line first
+        head, self._head = self._head, ''
+        if head:
+            yield from io.StringIO(head + self._stream.readline())
+        yield from self._stream
+
+    def close(self):
+        self._stream.close()
+
+
+def write_rules(stream, rules, format):
+    """Write an iterable of Rules to a text stream; returns the count written"""
+    if format not in FORMATS:
+        raise RuleFileError(f"Unknown rule file format '{format}'")
+    return _WRITERS[format](stream, rules)
+
+
+def _write_json(stream, rules):
+    count = 0
+    stream.write('[')
+    for count, rule in enumerate(rules, 1):
+        stream.write('\n  ' if count == 1 else ',\n  ')
+        stream.write(json.dumps(rule.to_dict()))
+    stream.write('\n]\n' if count else ']\n')
+    return count
+
+
+def _write_csv(stream, rules):
+    writer = csv.writer(stream, lineterminator='\n')
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for count, rule in enumerate(rules, 1):
+        data = rule.to_dict()
+        data['enabled'] = 'true' if rule.enabled else 'false'
+        writer.writerow(['' if data[name] is None else data[name] for name in CSV_COLUMNS])
+    return count
+
+
+def _write_iptables(stream, rules):
+    stream.write("# Generated by firewall-ui\n*filter\n:INPUT ACCEPT [0:0]\n"
+                 ":OUTPUT ACCEPT [0:0]\n")
+    count = 0
+    for count, rule in enumerate(rules, 1):
+        try:
+            line = iptables_rule(rule)
+        except ValueError as e:
+            raise RuleFileError(f"Rule {count} cannot be written as an iptables rule: {e}")
+        stream.write(line if rule.enabled else DISABLED_PREFIX + line)
+        stream.write('\n')
+    stream.write("COMMIT\n")
+    return count
+
+
+def iptables_rule(rule):
+    """Return the iptables-save line of a rule"""
+    protocol = Protocol(rule.protocol)
+    has_ports = rule.source_port_start is not None or rule.destination_port_start is not None
+    if protocol == Protocol.ANY and has_ports:
+        raise ValueError("ports on a rule for any protocol")
+    parts = ['-A', _CHAIN_NAMES[Direction(rule.direction)]]
+    ranges = []
+    for flag, range_flag, start, end in (
+            ('-s', '--src-range', rule.source_address_start, rule.source_address_end),
+            ('-d', '--dst-range', rule.destination_address_start, rule.destination_address_end)):
+        network = _network(start, end)
+        if network:
+            parts += [flag, network]
+        elif network is None:
+            ranges += [range_flag, f"{start}-{end}"]
+    if protocol != Protocol.ANY:
+        parts += ['-p', protocol.value.lower()]
+    if ranges:
+        parts += ['-m', 'iprange', *ranges]
+    if has_ports:
+        parts += ['-m', protocol.value.lower()]
+        for flag, start, end in (('--sport', rule.source_port_start, rule.source_port_end),
+                                 ('--dport', rule.destination_port_start,
+                                  rule.destination_port_end)):
+            if start is not None:
+                parts += [flag, str(start) if start == end else f"{start}:{end}"]
+    if rule.description:
+        # Double quoted with backslash escapes, as iptables-save writes it
+        description = rule.description.replace('\\', '\\\\').replace('"', '\\"')
+        parts += ['-m', 'comment', '--comment', f'"{description}"']
+    parts += ['-j', Action(rule.action).value]
+    return ' '.join(parts)
+
+
+def _network(start, end):
+    """
+    Return the CIDR block spanning start-end, '' if that is every address
+    and None if the range is not a single block.
+    """
+    version, first = parse_address(start)
+    end_version, last = parse_address(end)
+    if version != end_version:
+        raise ValueError("address range mixes IPv4 and IPv6")
+    bits = 32 if version == 4 else 128
+    size = last - first + 1
+    if size <= 0 or size & (size - 1) or first % size:
+        return None
+    if size == 1 << bits:
+        return ''
+    return f"{format_address(version, first)}/{bits - size.bit_length() + 1}"
+
+
+_WRITERS = {'json': _write_json, 'csv': _write_csv, 'iptables': _write_iptables}
@@ -0,0 +1,102 @@
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from hashlib import blake2b
+from firewall_ui.models.ruleset import RuleSet
+from firewall_ui.utils.rule_digest import DIGEST_SIZE
+from firewall_ui.utils.wire_format import decode_ruleset, WireFormatError
+
+# On-disk snapshot of the kernel configuration.
+#
+# A little-endian header holds the magic, a format version, the rule count,
+# the kernel module's root digest of the rules (see rule_digest.py), a
+# BLAKE2b checksum of the payload and the payload size. The payload is the
+# rules in the binary wire format (see wire_format.py), so a snapshot is
+# read by mapping the file and decoding its columns straight out of the
+# mapping. Files of another version, with a bad checksum or that fail to
+# decode are ignored and replaced by the next save().
+MAGIC = b'FWSN'
+VERSION = 1
+HEADER = struct.Struct(f'<4sBxxxI{DIGEST_SIZE}s{DIGEST_SIZE}sQ')  # magic, version, count,
+                                                                  # digest, checksum, size
+
+
+def _checksum(payload):
+    return blake2b(payload, digest_size=DIGEST_SIZE).digest()
+
+
+@dataclass
+class Snapshot:
+    """A cached configuration and the kernel digest it was saved under"""
+    digest: bytes
+    ruleset: RuleSet
+
+    def __len__(self):
+        return len(self.ruleset)
+
+    def rule_batches(self, size):
+        """Yield the rules as lists of at most size Rule objects"""
+        for start in range(0, len(self.ruleset), size):
+            yield self.ruleset.to_rules(start, start + size)
+
+
+class SnapshotCache:
+    """
+    Snapshot of the last configuration seen in the kernel module, keyed by
+    its root digest so the module can confirm it with a single request
+    instead of sending every rule again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the cached Snapshot, or None if there is no usable one"""
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                if os.fstat(snapshot_file.fileno()).st_size < HEADER.size:
+                    return None
+                with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return self._decode(mapped)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _decode(mapped):
+        magic, version, count, digest, checksum, size = HEADER.unpack_from(mapped)
+        if magic != MAGIC or version != VERSION or HEADER.size + size != len(mapped):
+            return None
+        with memoryview(mapped) as view, view[HEADER.size:] as payload:
+            if _checksum(payload) != checksum:
+                return None
+            try:
+                ruleset = decode_ruleset(payload)
+            except WireFormatError:
+                return None
+        if len(ruleset) != count:
+            return None
+        return Snapshot(digest, ruleset)
+
+    def save(self, payload, count, digest):
+        """
+        Store count rules encoded in the binary wire format under the
+        kernel's digest of them, replacing any earlier snapshot atomically.
+        Raises OSError if the file cannot be written.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'wb') as snapshot_file:
+            snapshot_file.write(HEADER.pack(MAGIC, VERSION, count, digest,
+                                            _checksum(payload), len(payload)))
+            snapshot_file.write(payload)
+        os.replace(temporary, self.path)
+
+    def invalidate(self):
+        """Remove the snapshot, if any"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,217 @@
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from firewall_ui.models.ruleset import (RuleSet, AddressColumn, PROTOCOLS, ACTIONS,
+                                        DIRECTIONS)
+from firewall_ui.policy.diff import RuleDelta
+
+# Packed rule encoding exchanged with the kernel module.
+#
+# All integers are little-endian. A fixed header is followed by one
+# fixed-width column per rule field, each holding `count` values:
+#
+#   ids                                 uint32
+#   source start/end, destination       uint32 per address, or for a column
+#   start/end addresses                 flagged wide in the header: uint64
+#                                       high half, uint64 low half and a
+#                                       uint8 IPv6 marker (IPv4 addresses
+#                                       are stored IPv4-mapped)
+#   source/destination port start/end   uint16 each
+#   protocol, action, direction, flags  uint8 each (see models/ruleset.py)
+#
+# Descriptions follow as description_count uint32 rows, the same number of
+# uint32 end offsets and a UTF-8 heap of heap_size bytes.
+MAGIC = b'FWRS'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHIII')  # magic, version, wide flags, reserved, count,
+                                     # description_count, heap_size
+
+ADDRESS_COLUMNS = ('source_start', 'source_end', 'destination_start', 'destination_end')
+PORT_COLUMNS = ('source_port_start', 'source_port_end',
+                'destination_port_start', 'destination_port_end')
+CODE_COLUMNS = (('protocols', len(PROTOCOLS)), ('actions', len(ACTIONS)),
+                ('directions', len(DIRECTIONS)), ('flags', 256))
+
+_SWAP = sys.byteorder == 'big'
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def _little_endian(column):
+    """Return a buffer of column in wire byte order, copying only if needed"""
+    if _SWAP and isinstance(column, array) and column.itemsize > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def encode_ruleset(ruleset):
+    """Pack a RuleSet into the binary wire format"""
+    flags = 0
+    columns = [ruleset.ids]
+    for bit, name in enumerate(ADDRESS_COLUMNS):
+        column = getattr(ruleset, name)
+        if column.wide:
+            flags |= 1 << bit
+        columns.extend(column.arrays())
+    columns.extend(getattr(ruleset, name) for name in PORT_COLUMNS)
+    columns.extend(getattr(ruleset, name) for name, _ in CODE_COLUMNS)
+
+    rows = sorted(ruleset.descriptions)
+    texts = [ruleset.descriptions[row].encode('utf-8') for row in rows]
+    columns.append(array('I', rows))
+    columns.append(array('I', accumulate(len(text) for text in texts)))
+    heap = b''.join(texts)
+
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, len(ruleset), len(rows), len(heap))
+    return b''.join([header] + [_little_endian(column) for column in columns] + [heap])
+
+
+def encode_rules(rules):
+    """Pack a list of Rule objects into the binary wire format"""
+    return encode_ruleset(rules if isinstance(rules, RuleSet) else RuleSet(rules))
+
+
+class _Reader:
+    """Sequential reader of typed columns from a memoryview"""
+
+    def __init__(self, view, offset):
+        self.view = view
+        self.offset = offset
+
+    def take(self, size):
+        end = self.offset + size
+        if end > len(self.view):
+            raise WireFormatError("Truncated rule payload")
+        chunk = self.view[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def array(self, typecode, count):
+        column = array(typecode)
+        column.frombytes(self.take(count * column.itemsize))
+        if _SWAP and column.itemsize > 1:
+            column.byteswap()
+        return column
+
+
+def is_binary_payload(buffer):
+    return bytes(buffer[:len(MAGIC)]) == MAGIC
+
+
+def decode_ruleset(buffer):
+    """
+    Unpack the binary wire format into a RuleSet.
+
+    buffer may be any bytes-like object; columns are sliced out of a
+    memoryview and copied straight into their arrays.
+    """
+    view = memoryview(buffer).cast('B')
+    if len(view) < HEADER.size:
+        raise WireFormatError("Rule payload shorter than its header")
+    magic, version, flags, _, count, description_count, heap_size = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise WireFormatError("Not a binary rule payload")
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported rule payload version {version}")
+
+    reader = _Reader(view, HEADER.size)
+    ruleset = RuleSet()
+    ruleset.ids = reader.array('I', count)
+    for bit, name in enumerate(ADDRESS_COLUMNS):
+        if flags & (1 << bit):
+            column = AddressColumn.from_arrays(
+                hi=reader.array('Q', count), lo=reader.array('Q', count),
+                v6=bytearray(reader.take(count)))
+        else:
+            column = AddressColumn.from_arrays(v4=reader.array('I', count))
+        setattr(ruleset, name, column)
+    for name in PORT_COLUMNS:
+        setattr(ruleset, name, reader.array('H', count))
+    for name, limit in CODE_COLUMNS:
+        column = reader.array('B', count)
+        # Deleting every valid code leaves only the invalid ones
+        if limit < 256 and column.tobytes().translate(None, bytes(range(limit))):
+            raise WireFormatError(f"Invalid value in {name} column")
+        setattr(ruleset, name, column)
+
+    rows = reader.array('I', description_count)
+    ends = reader.array('I', description_count)
+    heap = reader.take(heap_size)
+    if description_count and ends[-1] != heap_size:
+        raise WireFormatError("Description heap size mismatch")
+    start = 0
+    for row, end in zip(rows, ends):
+        if row >= count or end < start:
+            raise WireFormatError("Invalid description table")
+        ruleset.descriptions[row] = str(heap[start:end], 'utf-8')
+        start = end
+    return ruleset
+
+
+def decode_rules(buffer):
+    """Unpack the binary wire format into a list of Rule objects"""
+    return decode_ruleset(buffer).to_rules()
+
+
+# Delta payload: a header with the base and new lengths and the number of
+# each kind of change, uint32 position columns (deletes, update base and
+# new positions, move base and new positions, inserts) and finally the
+# updated then inserted rules as a rule payload.
+DELTA_MAGIC = b'FWRD'
+DELTA_HEADER = struct.Struct('<4sBxxxIIIIII')  # magic, version, base_length, length,
+                                               # deletes, updates, moves, inserts
+
+
+def encode_delta(delta, rules):
+    """Pack a RuleDelta whose new positions index into rules"""
+    update_sources = [source for source, _ in delta.updates]
+    update_targets = [target for _, target in delta.updates]
+    move_sources = [source for source, _ in delta.moves]
+    move_targets = [target for _, target in delta.moves]
+    columns = [array('I', positions) for positions in (
+        delta.deletes, update_sources, update_targets, move_sources, move_targets,
+        delta.inserts)]
+    changed = RuleSet(rules[position] for position in update_targets + delta.inserts)
+    header = DELTA_HEADER.pack(DELTA_MAGIC, VERSION, delta.base_length, delta.length,
+                               len(delta.deletes), len(delta.updates), len(delta.moves),
+                               len(delta.inserts))
+    return b''.join([header] + [_little_endian(column) for column in columns]
+                    + [encode_ruleset(changed)])
+
+
+def decode_delta(buffer):
+    """
+    Unpack a delta payload. Returns the RuleDelta and a dict of new
+    position -> Rule for every updated and inserted rule, as apply_delta
+    expects.
+    """
+    view = memoryview(buffer).cast('B')
+    if len(view) < DELTA_HEADER.size:
+        raise WireFormatError("Delta payload shorter than its header")
+    (magic, version, base_length, length,
+     deletes, updates, moves, inserts) = DELTA_HEADER.unpack_from(view)
+    if magic != DELTA_MAGIC:
+        raise WireFormatError("Not a delta payload")
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported delta payload version {version}")
+
+    reader = _Reader(view, DELTA_HEADER.size)
+    delete_positions = reader.array('I', deletes)
+    update_sources = reader.array('I', updates)
+    update_targets = reader.array('I', updates)
+    move_sources = reader.array('I', moves)
+    move_targets = reader.array('I', moves)
+    insert_positions = reader.array('I', inserts)
+    changed = decode_ruleset(view[reader.offset:])
+    if len(changed) != updates + inserts:
+        raise WireFormatError("Delta rule count mismatch")
+
+    delta = RuleDelta(base_length, length, list(delete_positions),
+                      list(zip(update_sources, update_targets)),
+                      list(zip(move_sources, move_targets)), list(insert_positions))
+    targets = list(update_targets) + list(insert_positions)
+    return delta, dict(zip(targets, changed.to_rules()))